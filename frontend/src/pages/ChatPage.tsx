@@ -1536,6 +1536,24 @@ export function ChatPage() {
         })
       }
 
+      if (msg.type === 'messages_deleted') {
+        // Coalesced form: one frame carrying every id from a deletion burst
+        const deletedIds = new Set(msg.message_ids)
+        const store = useAppStore.getState()
+        Object.keys(store.messagesByContext).forEach((key) => {
+          const messages = store.messagesByContext[key]
+          const filteredMessages = messages.filter((m) => !deletedIds.has(m.id))
+          if (filteredMessages.length !== messages.length) {
+            useAppStore.setState({
+              messagesByContext: {
+                ...store.messagesByContext,
+                [key]: filteredMessages,
+              },
+            })
+          }
+        })
+      }
+
       if (msg.type === 'reaction_added' || msg.type === 'reaction_removed') {
         const { message_id, reactions } = msg
         // Update reactions for the message in all contexts
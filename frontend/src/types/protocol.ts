@@ -523,6 +523,11 @@ export type WsMessageDeleted = {
   context_id: string | null
 }
 
+export type WsMessagesDeleted = {
+  type: 'messages_deleted'
+  message_ids: number[]
+}
+
 export type WsReactionAdded = {
   type: 'reaction_added'
   message_id: number
@@ -737,6 +742,7 @@ export type WsMessage =
   | WsServerEmojis
   | WsMessageEdited
   | WsMessageDeleted
+  | WsMessagesDeleted
   | WsReactionAdded
   | WsReactionRemoved
   | WsInboundLicenseInfo
@@ -4,6 +4,7 @@ REST API endpoints for Decentra Chat Server
 Provides HTTP REST API for future desktop application integration
 """
 
+import asyncio
 import json
 import os
 import uuid
@@ -11,6 +12,7 @@ import base64
 import re
 import secrets
 import hashlib
+from collections import OrderedDict
 from aiohttp import web
 import bcrypt
 from license_validator import check_limit, check_feature_access
@@ -33,6 +35,28 @@ get_or_create_dm_func = None
 get_avatar_data_func = None
 
 
+# Small in-memory LRU of decoded attachments: {attachment_id: (bytes, content_type, filename)}
+# Attachment content is immutable for a given ID, so entries never go stale;
+# deleted attachments simply age out of the LRU.
+_ATTACHMENT_CACHE = OrderedDict()
+_ATTACHMENT_CACHE_MAX_ENTRIES = 256
+_ATTACHMENT_CACHE_MAX_BYTES = 256 * 1024  # skip caching payloads larger than this
+
+# Recognized soundboard audio extensions and the extension to append for a
+# given content-type marker (ordered; 'opus' must be checked before 'ogg'
+# would otherwise shadow it)
+_AUDIO_EXTENSIONS = frozenset(('.mp3', '.wav', '.ogg', '.opus'))
+_AUDIO_EXTENSION_FOR_TYPE = (
+    ('mp3', '.mp3'),
+    ('wav', '.wav'),
+    ('opus', '.ogg'),
+    ('ogg', '.ogg'),
+)
+
+# Single byte-range spec: "bytes=start-end", "bytes=start-", or "bytes=-suffix"
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
 def sanitize_filename(filename):
     """Sanitize filename for safe use in headers."""
     # Remove any path separators and control characters
@@ -56,9 +80,14 @@ def sanitize_content_type(content_type):
     return content_type
 
 
+_BCRYPT_ROUNDS = 12
+
+
 def verify_password(password, password_hash):
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    """Verify a password against its hash (str or bytes)."""
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash)
 
 
 async def api_auth(request):
@@ -93,7 +122,7 @@ async def api_auth(request):
             }, status=400)
         
         user = db.get_user(username)
-        if not user or not verify_password(password, user['password_hash']):
+        if not user or not await asyncio.to_thread(verify_password, password, user['password_hash']):
             return web.json_response({
                 'success': False,
                 'error': 'Invalid username or password'
@@ -500,7 +529,7 @@ async def api_upload_attachment(request):
         elif username and password:
             # Password-based authentication
             user = db.get_user(username)
-            if not user or not verify_password(password, user['password_hash']):
+            if not user or not await asyncio.to_thread(verify_password, password, user['password_hash']):
                 return web.json_response({
                     'success': False,
                     'error': 'Invalid credentials'
@@ -553,7 +582,7 @@ async def api_upload_attachment(request):
         attachment_id = f"att_{uuid.uuid4().hex[:16]}"
         
         # Encode file data as base64
-        file_data_b64 = base64.b64encode(file_data).decode('utf-8')
+        file_data_b64 = (await asyncio.to_thread(base64.b64encode, file_data)).decode('utf-8')
         
         # Save attachment
         db.save_attachment(
@@ -600,29 +629,84 @@ async def api_download_attachment(request):
                 'error': 'Attachment ID is required'
             }, status=400)
         
-        # Get attachment
-        attachment = db.get_attachment(attachment_id)
-        if not attachment:
-            return web.json_response({
-                'success': False,
-                'error': 'Attachment not found'
-            }, status=404)
-        
-        # Decode base64 file data
-        file_data = base64.b64decode(attachment['file_data'])
+        # Attachment content is immutable per ID, so the ID is a valid strong
+        # ETag — warm clients get a 304 with no DB fetch or decode at all
+        etag = f'"attachment-{attachment_id}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        
+        # Serve small, frequently-fetched attachments straight from memory
+        cached = _ATTACHMENT_CACHE.get(attachment_id)
+        if cached is not None:
+            _ATTACHMENT_CACHE.move_to_end(attachment_id)
+            file_data, safe_content_type, safe_filename = cached
+        else:
+            # Get attachment
+            attachment = db.get_attachment(attachment_id)
+            if not attachment:
+                return web.json_response({
+                    'success': False,
+                    'error': 'Attachment not found'
+                }, status=404)
+            
+            # Decode base64 file data off the event loop — attachments can be
+            # multiple MB and a synchronous decode would stall every connection
+            file_data = await asyncio.to_thread(base64.b64decode, attachment['file_data'])
+            
+            # Sanitize headers to prevent injection
+            safe_content_type = sanitize_content_type(attachment['content_type'])
+            safe_filename = sanitize_filename(attachment['filename'])
+            
+            if len(file_data) <= _ATTACHMENT_CACHE_MAX_BYTES:
+                _ATTACHMENT_CACHE[attachment_id] = (file_data, safe_content_type, safe_filename)
+                while len(_ATTACHMENT_CACHE) > _ATTACHMENT_CACHE_MAX_ENTRIES:
+                    _ATTACHMENT_CACHE.popitem(last=False)
+        
+        headers = {
+            'Content-Disposition': f'attachment; filename="{safe_filename}"',
+            'ETag': etag,
+            'Cache-Control': 'private, max-age=86400',
+            'Accept-Ranges': 'bytes'
+        }
         
-        # Sanitize headers to prevent injection
-        safe_content_type = sanitize_content_type(attachment['content_type'])
-        safe_filename = sanitize_filename(attachment['filename'])
+        # Byte-range support so <video>/<audio> can seek and aborted downloads
+        # can resume. If-Range with a stale validator falls back to the full body.
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and (not if_range or if_range == etag):
+            match = _RANGE_RE.match(range_header)
+            if match:
+                size = len(file_data)
+                start_s, end_s = match.groups()
+                if start_s:
+                    start = int(start_s)
+                    end = min(int(end_s), size - 1) if end_s else size - 1
+                elif end_s:
+                    # Suffix range: the last N bytes
+                    start = max(size - int(end_s), 0)
+                    end = size - 1
+                else:
+                    start, end = 0, -1
+                if 0 <= start <= end:
+                    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+                    headers['Content-Length'] = str(end - start + 1)
+                    return web.Response(
+                        status=206,
+                        body=file_data[start:end + 1],
+                        content_type=safe_content_type,
+                        headers=headers
+                    )
+                return web.Response(
+                    status=416,
+                    headers={'Content-Range': f'bytes */{size}'}
+                )
         
         # Return file with appropriate headers
+        headers['Content-Length'] = str(len(file_data))
         return web.Response(
             body=file_data,
             content_type=safe_content_type,
-            headers={
-                'Content-Disposition': f'attachment; filename="{safe_filename}"',
-                'Content-Length': str(len(file_data))
-            }
+            headers=headers
         )
     except Exception as e:
         return web.json_response({
@@ -736,7 +820,9 @@ async def api_reset_password(request):
             }, status=400)
         
         # Hash the new password
-        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # bcrypt is intentionally slow; keep it off the event loop
+        password_hash = await asyncio.to_thread(
+            lambda: bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt(_BCRYPT_ROUNDS)).decode('utf-8'))
         
         # Update user password
         username = token_info['username']
@@ -950,7 +1036,7 @@ async def api_upload_soundboard_sound(request):
             
             # Generate sound ID and save
             sound_id = f"snd_{uuid.uuid4().hex[:16]}"
-            file_data_b64 = base64.b64encode(file_data).decode('utf-8')
+            file_data_b64 = (await asyncio.to_thread(base64.b64encode, file_data)).decode('utf-8')
             
             success = db.save_server_soundboard_sound(
                 sound_id=sound_id,
@@ -988,7 +1074,7 @@ async def api_upload_soundboard_sound(request):
             
             # Generate sound ID and save
             sound_id = f"snd_{uuid.uuid4().hex[:16]}"
-            file_data_b64 = base64.b64encode(file_data).decode('utf-8')
+            file_data_b64 = (await asyncio.to_thread(base64.b64encode, file_data)).decode('utf-8')
             
             success = db.save_user_soundboard_sound(
                 sound_id=sound_id,
@@ -1116,6 +1202,12 @@ async def api_download_soundboard_sound(request):
                 'error': 'Sound ID is required'
             }, status=400)
         
+        # Sound content is immutable per ID — same ETag/304 strategy as
+        # attachment downloads
+        etag = f'"sound-{sound_id}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        
         # Get sound
         sound = db.get_soundboard_sound(sound_id)
         if not sound:
@@ -1124,21 +1216,21 @@ async def api_download_soundboard_sound(request):
                 'error': 'Sound not found'
             }, status=404)
         
-        # Decode base64 audio data
-        audio_data = base64.b64decode(sound['audio_data'])
+        # Decode base64 audio data off the event loop (sounds can be ~1MB)
+        audio_data = await asyncio.to_thread(base64.b64decode, sound['audio_data'])
         
         # Sanitize content type
         safe_content_type = sanitize_content_type(sound['content_type'])
         safe_filename = sanitize_filename(sound['name'])
         
-        # Add appropriate extension if not present
-        if not any(safe_filename.endswith(ext) for ext in ['.mp3', '.wav', '.ogg', '.opus']):
-            if 'mp3' in safe_content_type:
-                safe_filename += '.mp3'
-            elif 'wav' in safe_content_type:
-                safe_filename += '.wav'
-            elif 'ogg' in safe_content_type or 'opus' in safe_content_type:
-                safe_filename += '.ogg'
+        # Add appropriate extension if not present (single extension parse +
+        # table lookup instead of a chain of substring scans)
+        ext = os.path.splitext(safe_filename)[1].lower()
+        if ext not in _AUDIO_EXTENSIONS:
+            for marker, audio_ext in _AUDIO_EXTENSION_FOR_TYPE:
+                if marker in safe_content_type:
+                    safe_filename += audio_ext
+                    break
         
         # Return audio file
         return web.Response(
@@ -1146,7 +1238,9 @@ async def api_download_soundboard_sound(request):
             content_type=safe_content_type,
             headers={
                 'Content-Disposition': f'inline; filename="{safe_filename}"',
-                'Content-Length': str(len(audio_data))
+                'Content-Length': str(len(audio_data)),
+                'ETag': etag,
+                'Cache-Control': 'private, max-age=86400'
             }
         )
     
@@ -3122,6 +3216,25 @@ async def api_bot_audit_log(request):
         return web.json_response({'error': str(e)}, status=500)
 
 
+# Content types worth gzipping; media attachments are already compressed
+_COMPRESSIBLE_TYPES = frozenset(('application/json', 'text/plain', 'text/html', 'image/svg+xml'))
+_COMPRESSION_MIN_SIZE = 1024
+
+
+@web.middleware
+async def compression_middleware(request, handler):
+    """Gzip large text/JSON API responses for clients that accept it."""
+    response = await handler(request)
+    if (isinstance(response, web.Response)
+            and response.content_length is not None
+            and response.content_length >= _COMPRESSION_MIN_SIZE
+            and response.content_type in _COMPRESSIBLE_TYPES
+            and 'Content-Disposition' not in response.headers):
+        # enable_compression negotiates against Accept-Encoding itself
+        response.enable_compression()
+    return response
+
+
 def setup_api_routes(app, database, jwt_verify_func, broadcast_func, send_user_func, create_dm_func, avatar_func, jwt_generate_func=None):
     """Setup REST API routes on the aiohttp application."""
     global db, verify_jwt_token, broadcast_to_server_func, send_to_user_func, get_or_create_dm_func, get_avatar_data_func, generate_jwt_token_func
@@ -3132,6 +3245,7 @@ def setup_api_routes(app, database, jwt_verify_func, broadcast_func, send_user_f
     send_to_user_func = send_user_func
     get_or_create_dm_func = create_dm_func
     get_avatar_data_func = avatar_func
+    app.middlewares.append(compression_middleware)
     app.router.add_post('/api/auth', api_auth)
     app.router.add_post('/api/reset-password', api_reset_password)
     app.router.add_get('/api/servers', api_servers)
@@ -6,6 +6,7 @@ Provides functions for validating audio files and extracting metadata.
 
 import io
 import logging
+import os
 from typing import Tuple, Optional
 
 try:
@@ -47,15 +48,9 @@ def validate_audio_format(filename: str, content_type: str) -> bool:
     # Normalize content type
     content_type = content_type.lower().split(';')[0].strip()
     
-    # Get file extension
-    filename_lower = filename.lower()
-    file_ext = None
-    for ext in ['.mp3', '.wav', '.ogg', '.opus']:
-        if filename_lower.endswith(ext):
-            file_ext = ext
-            break
-    
-    if not file_ext:
+    # Get file extension (single parse instead of one tail scan per candidate)
+    file_ext = os.path.splitext(filename.lower())[1]
+    if file_ext not in ('.mp3', '.wav', '.ogg', '.opus'):
         return False
     
     # Check if content type is allowed
@@ -6,6 +6,8 @@ Provides persistent storage using PostgreSQL
 
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+import hashlib
 import json
 import os
 import time
@@ -16,6 +18,16 @@ from typing import List, Dict, Set, Optional, Tuple
 from encryption_utils import get_encryption_manager
 
 
+def _hash_reset_token(token: str) -> str:
+    """SHA-256 hex digest of a password reset token.
+
+    Reset tokens are stored and looked up by digest so a database or memory
+    dump never exposes a live token; the raw value only ever travels in the
+    reset email.
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
 class Database:
     """Database handler for persistent storage."""
     
@@ -28,12 +40,22 @@ class Database:
         # Uses a shared encryption key for all messages to allow new users
         # to read server message history when they join
         self.encryption_manager = get_encryption_manager()
+        # Reuse connections instead of paying a TCP + auth handshake per
+        # query. ThreadedConnectionPool is safe for both the event loop and
+        # the asyncio.to_thread workers the server offloads heavy reads to.
+        pool_size = int(os.getenv('DB_POOL_SIZE', '8'))
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn=1, maxconn=pool_size, dsn=self.db_url)
         self.init_database()
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections."""
-        conn = psycopg2.connect(self.db_url)
+        """Context manager for pooled database connections."""
+        conn = self._pool.getconn()
+        # Discard connections the server closed while they sat idle
+        while conn.closed:
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
         conn.cursor_factory = psycopg2.extras.RealDictCursor
         try:
             yield conn
@@ -42,7 +64,11 @@ class Database:
             conn.rollback()
             raise
         finally:
-            conn.close()
+            try:
+                self._pool.putconn(conn)
+            except psycopg2.pool.PoolError:
+                # Pool already closed (shutdown path); drop the connection
+                conn.close()
     
     def init_database(self):
         """Initialize database schema with retry logic."""
@@ -174,6 +200,44 @@ class Database:
                         )
                     ''')
                     
+                    # Collapse duplicate conversations left behind by the old
+                    # SELECT-then-INSERT race before enforcing uniqueness:
+                    # keep the oldest row per pair, fold the duplicates'
+                    # messages into it, and drop the duplicates. Read cursors
+                    # for dropped dm_ids are deleted rather than repointed
+                    # (repointing could collide with an existing row; the cost
+                    # is a stale unread badge once).
+                    cursor.execute('''
+                        SELECT user1, user2,
+                               array_agg(dm_id ORDER BY created_at, dm_id) as dm_ids
+                        FROM direct_messages
+                        GROUP BY user1, user2
+                        HAVING COUNT(*) > 1
+                    ''')
+                    for dup in cursor.fetchall():
+                        keep_id = dup['dm_ids'][0]
+                        extra_ids = dup['dm_ids'][1:]
+                        cursor.execute('''
+                            UPDATE messages SET context_id = %s
+                            WHERE context_type = 'dm' AND context_id = ANY(%s)
+                        ''', (keep_id, extra_ids))
+                        cursor.execute('''
+                            DELETE FROM message_read_status
+                            WHERE context_type = 'dm' AND context_id = ANY(%s)
+                        ''', (extra_ids,))
+                        cursor.execute('''
+                            DELETE FROM direct_messages WHERE dm_id = ANY(%s)
+                        ''', (extra_ids,))
+                        print(f"Merged duplicate DM conversations {extra_ids} into "
+                              f"{keep_id} for pair ({dup['user1']}, {dup['user2']})")
+
+                    # One conversation per user pair (pairs are stored sorted);
+                    # also the conflict target for upsert_dm
+                    cursor.execute('''
+                        CREATE UNIQUE INDEX IF NOT EXISTS idx_dm_user_pair
+                        ON direct_messages(user1, user2)
+                    ''')
+                    
                     # Invite codes table
                     cursor.execute('''
                         CREATE TABLE IF NOT EXISTS invite_codes (
@@ -533,6 +597,16 @@ class Database:
                         ON message_read_status(username)
                     ''')
                     
+                    # ID counters table
+                    # Single source of truth for server_N/channel_N/... IDs so
+                    # concurrent handlers can allocate IDs atomically
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS id_counters (
+                            name VARCHAR(50) PRIMARY KEY,
+                            value BIGINT NOT NULL DEFAULT 0
+                        )
+                    ''')
+                    
                     # Add notification_mode column if it doesn't exist (migration)
                     cursor.execute('''
                         DO $$ 
@@ -1664,6 +1738,31 @@ class Database:
                 raise
     
     # User operations
+    def next_counter_value(self, name: str) -> int:
+        """Atomically increment and return the named ID counter."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO id_counters (name, value) VALUES (%s, 1)
+                ON CONFLICT (name) DO UPDATE SET value = id_counters.value + 1
+                RETURNING value
+            ''', (name,))
+            return cursor.fetchone()['value']
+    
+    def seed_counter_value(self, name: str, value: int) -> None:
+        """Raise the named counter to at least value (no-op if already higher).
+        
+        Used at startup to migrate installs whose IDs predate the
+        id_counters table.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO id_counters (name, value) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE
+                SET value = GREATEST(id_counters.value, EXCLUDED.value)
+            ''', (name, value))
+    
     def ensure_webhook_system_user(self) -> None:
         """Ensure the webhook system user exists. This user is used for all webhook messages."""
         webhook_user = self.get_user('__webhook__')
@@ -1688,6 +1787,17 @@ class Database:
         except psycopg2.IntegrityError:
             return False
     
+    def get_users_bulk(self, usernames: List[str]) -> Dict[str, Dict]:
+        """Fetch multiple user rows in one query, keyed by username."""
+        if not usernames:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM users WHERE username = ANY(%s)
+            ''', (list(usernames),))
+            return {row['username']: dict(row) for row in cursor.fetchall()}
+    
     def get_user(self, username: str) -> Optional[Dict]:
         """Get user data."""
         with self.get_connection() as conn:
@@ -1708,6 +1818,17 @@ class Database:
                 return dict(row)
             return None
     
+    def get_user_by_username_or_email(self, identifier: str) -> Optional[Dict]:
+        """Get user data matching either the username or email address."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE username = %s OR email = %s',
+                           (identifier, identifier))
+            row = cursor.fetchone()
+            if row:
+                return dict(row)
+            return None
+    
     def get_all_users(self) -> List[str]:
         """Get all usernames."""
         with self.get_connection() as conn:
@@ -1715,6 +1836,19 @@ class Database:
             cursor.execute('SELECT username FROM users')
             return [row['username'] for row in cursor.fetchall()]
     
+    def search_usernames(self, query: str, exclude_username: str, limit: int = 20) -> List[str]:
+        """Find usernames containing the query, filtered and limited in SQL."""
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT username FROM users
+                WHERE username ILIKE %s AND username != %s
+                ORDER BY username
+                LIMIT %s
+            ''', (pattern, exclude_username, limit))
+            return [row['username'] for row in cursor.fetchall()]
+    
     def get_all_users_detailed(self) -> List[Dict]:
         """Get all users with detailed information (username, email, created_at)."""
         with self.get_connection() as conn:
@@ -2041,7 +2175,7 @@ class Database:
                 cursor.execute('''
                     INSERT INTO password_reset_tokens (token, username, created_at, expires_at, used)
                     VALUES (%s, %s, CURRENT_TIMESTAMP, %s, %s)
-                ''', (token, username, expires_at, False))
+                ''', (_hash_reset_token(token), username, expires_at, False))
                 return True
         except Exception:
             return False
@@ -2052,10 +2186,11 @@ class Database:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT token, username, created_at::text as created_at, 
-                       expires_at::text as expires_at, used
+                       expires_at::text as expires_at, used,
+                       (expires_at <= CURRENT_TIMESTAMP) AS expired
                 FROM password_reset_tokens
                 WHERE token = %s
-            ''', (token,))
+            ''', (_hash_reset_token(token),))
             result = cursor.fetchone()
             return dict(result) if result else None
     
@@ -2068,7 +2203,7 @@ class Database:
                     UPDATE password_reset_tokens 
                     SET used = TRUE
                     WHERE token = %s
-                ''', (token,))
+                ''', (_hash_reset_token(token),))
                 return True
         except Exception:
             return False
@@ -2391,6 +2526,59 @@ class Database:
         except psycopg2.IntegrityError:
             return False
     
+    def get_servers_bulk(self, server_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch multiple server rows in one query, keyed by server_id."""
+        if not server_ids:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM servers WHERE server_id = ANY(%s)
+            ''', (list(server_ids),))
+            return {row['server_id']: dict(row) for row in cursor.fetchall()}
+    
+    def get_channels_bulk(self, server_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Fetch channels for multiple servers in one query, grouped by server."""
+        grouped = {server_id: [] for server_id in server_ids}
+        if not server_ids:
+            return grouped
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM channels WHERE server_id = ANY(%s)
+                ORDER BY position, channel_id
+            ''', (list(server_ids),))
+            for row in cursor.fetchall():
+                grouped[row['server_id']].append(dict(row))
+        return grouped
+    
+    def get_categories_bulk(self, server_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Fetch categories for multiple servers in one query, grouped by server."""
+        grouped = {server_id: [] for server_id in server_ids}
+        if not server_ids:
+            return grouped
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM categories WHERE server_id = ANY(%s)
+                ORDER BY position, category_id
+            ''', (list(server_ids),))
+            for row in cursor.fetchall():
+                grouped[row['server_id']].append(dict(row))
+        return grouped
+    
+    def get_memberships_bulk(self, server_ids: List[str], username: str) -> Dict[str, Dict]:
+        """Fetch one user's membership rows across servers in one query."""
+        if not server_ids:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM server_members
+                WHERE username = %s AND server_id = ANY(%s)
+            ''', (username, list(server_ids)))
+            return {row['server_id']: dict(row) for row in cursor.fetchall()}
+    
     def get_server_channels(self, server_id: str) -> List[Dict]:
         """Get all channels for a server."""
         with self.get_connection() as conn:
@@ -2534,6 +2722,16 @@ class Database:
             ''', (username,))
             return [row['server_id'] for row in cursor.fetchall()]
     
+    def get_server_member(self, server_id: str, username: str) -> Optional[Dict]:
+        """Get one member's row for a server (single indexed lookup)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM server_members WHERE server_id = %s AND username = %s
+            ''', (server_id, username))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
     def is_server_member(self, username: str, server_id: str) -> bool:
         """Check if a user is a member of a server."""
         with self.get_connection() as conn:
@@ -3073,11 +3271,43 @@ class Database:
             result = cursor.fetchone()
             return result['id']
     
-    def get_messages(self, context_type: str, context_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
-        """Get messages for a context. Message content is decrypted before returning."""
+    def get_messages(self, context_type: str, context_id: Optional[str] = None, limit: int = 100,
+                     with_reactions: bool = False, since_id: Optional[int] = None) -> List[Dict]:
+        """Get messages for a context. Message content is decrypted before returning.
+
+        With with_reactions=True, each row carries its reactions aggregated
+        in SQL (a 'reactions' list), saving the separate bulk reactions
+        query and the Python merge on the history paths.
+
+        With since_id set, only messages with a larger id are returned, so
+        reconnecting clients that already hold history receive a delta
+        instead of the full window (and only pay the reactions join for the
+        new rows).
+        """
+        reactions_column = ''
+        reactions_join = ''
+        if with_reactions:
+            reactions_column = """,
+                       COALESCE(r.reactions, '[]'::json) as reactions"""
+            reactions_join = '''
+                LEFT JOIN LATERAL (
+                    SELECT json_agg(json_build_object(
+                               'username', mr.username,
+                               'emoji', mr.emoji,
+                               'emoji_type', mr.emoji_type,
+                               'created_at', mr.created_at::text)
+                           ORDER BY mr.created_at) as reactions
+                    FROM message_reactions mr
+                    WHERE mr.message_id = m.id
+                ) r ON TRUE'''
+        since_filter = ''
+        params = (context_type, context_id, limit)
+        if since_id is not None:
+            since_filter = ' AND m.id > %s'
+            params = (context_type, context_id, since_id, limit)
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT m.id, m.username, m.content, 
                        m.timestamp::text as timestamp,
                        m.context_type, m.context_id,
@@ -3088,14 +3318,14 @@ class Database:
                        rm.id as reply_msg_id,
                        rm.username as reply_username,
                        rm.content as reply_content,
-                       rm.deleted as reply_deleted
+                       rm.deleted as reply_deleted{reactions_column}
                 FROM messages m
                 LEFT JOIN users u ON m.username = u.username
-                LEFT JOIN messages rm ON m.reply_to = rm.id
-                WHERE m.context_type = %s AND m.context_id = %s
+                LEFT JOIN messages rm ON m.reply_to = rm.id{reactions_join}
+                WHERE m.context_type = %s AND m.context_id = %s{since_filter}
                 ORDER BY m.timestamp DESC
                 LIMIT %s
-            ''', (context_type, context_id, limit))
+            ''', params)
             # Decrypt message content and reverse to get chronological order
             messages = []
             for row in reversed(cursor.fetchall()):
@@ -3678,6 +3908,25 @@ class Database:
         except psycopg2.IntegrityError:
             return False
     
+    def upsert_dm(self, dm_id: str, user1: str, user2: str) -> str:
+        """Get the DM between two users, creating it as dm_id if absent.
+        
+        Runs as one atomic statement: the no-op DO UPDATE lets RETURNING
+        yield the existing row's dm_id when the pair already has a
+        conversation (the freshly allocated dm_id is simply discarded,
+        like a skipped sequence value).
+        """
+        sorted_users = sorted([user1, user2])
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO direct_messages (dm_id, user1, user2, created_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user1, user2) DO UPDATE SET user1 = EXCLUDED.user1
+                RETURNING dm_id
+            ''', (dm_id, sorted_users[0], sorted_users[1], datetime.now()))
+            return cursor.fetchone()['dm_id']
+    
     def get_dm(self, user1: str, user2: str) -> Optional[str]:
         """Get DM ID for two users."""
         sorted_users = sorted([user1, user2])
@@ -3702,6 +3951,21 @@ class Database:
             ''', (username, username))
             return [dict(row) for row in cursor.fetchall()]
     
+    def get_dm_if_participant(self, username: str, dm_id: str) -> Optional[Dict]:
+        """Get a DM by id, but only if the user is a participant.
+
+        Single indexed lookup instead of fetching every DM the user has and
+        scanning the list in Python.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT dm_id, user1, user2 FROM direct_messages 
+                WHERE dm_id = %s AND (user1 = %s OR user2 = %s)
+            ''', (dm_id, username, username))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
     # Invite code operations
     def create_invite_code(self, code: str, creator: str, code_type: str = 'global', 
                           server_id: Optional[str] = None, max_uses: Optional[int] = None, 
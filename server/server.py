@@ -6,6 +6,7 @@ A simple WebSocket-based chat server for decentralized communication.
 
 import asyncio
 import json
+import socket
 import logging
 import websockets
 from datetime import datetime, timedelta, timezone
@@ -18,6 +19,7 @@ from aiohttp import web
 import os
 import base64
 import hashlib
+import hmac
 import hmac as _hmac_mod
 import time
 import jwt
@@ -25,6 +27,31 @@ import pyotp
 import qrcode
 import io
 import traceback
+import functools
+import heapq
+from collections import deque, OrderedDict
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
 from database import Database
 from api import setup_api_routes
 from email_utils import EmailSender
@@ -33,6 +60,9 @@ from license_validator import license_validator, check_feature_access, check_lim
 from bot_scopes import has_scope, has_intent, get_effective_scopes, EVENT_INTENT_MAP, \
     SCOPE_SEND_MESSAGES, SCOPE_READ_MESSAGES, SCOPE_MANAGE_MESSAGES, SCOPE_ADMINISTRATOR
 
+# Directory this module lives in, resolved once at import time
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -60,7 +90,7 @@ def _load_jwt_secret_key() -> str:
     if env_key:
         return env_key
 
-    secret_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jwt_secret_key")
+    secret_file = os.path.join(SERVER_DIR, ".jwt_secret_key")
     try:
         with open(secret_file, "r", encoding="utf-8") as f:
             file_key = f.read().strip()
@@ -84,6 +114,8 @@ def _load_jwt_secret_key() -> str:
     return new_key
 
 JWT_SECRET_KEY = _load_jwt_secret_key()
+# PyJWT re-encodes str keys to bytes on every sign/verify; do it once here
+JWT_SECRET_KEY_BYTES = JWT_SECRET_KEY.encode('utf-8')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24  # Token expires after 24 hours
 
@@ -101,6 +133,16 @@ LIVEKIT_URL        = os.environ.get('LIVEKIT_URL', 'ws://localhost:7880')
 COTURN_SECRET = os.environ.get('COTURN_SECRET', '')
 COTURN_URL    = os.environ.get('COTURN_URL', 'turn:localhost:3478')
 COTURN_REALM  = os.environ.get('COTURN_REALM', 'decentra.local')
+# ── Trusted reverse proxies ─────────────────────────────────────────────────
+# X-Forwarded-For is only honored when the TCP peer is one of these
+# addresses. The WS port is reachable without going through nginx, so an
+# untrusted peer could otherwise spoof the header to dodge per-IP rate
+# limits (or poison another address's bucket). Set TRUSTED_PROXY_IPS to
+# your proxy's address (comma-separated for several).
+TRUSTED_PROXY_IPS = frozenset(
+    ip.strip()
+    for ip in (os.environ.get('TRUSTED_PROXY_IPS') or '127.0.0.1,::1').split(',')
+    if ip.strip())
 # ────────────────────────────────────────────────────────────────────────────
 
 # Store pending signups temporarily (in-memory)
@@ -108,21 +150,111 @@ COTURN_REALM  = os.environ.get('COTURN_REALM', 'decentra.local')
 # NOTE: This is an in-memory store and will be cleared on server restart.
 # For production environments with multiple server instances, consider using Redis or a database table.
 pending_signups = {}
+# Expiry bookkeeping for pending_signups: heap of (expires_at, username)
+# using time.monotonic(), so abandoned signups cannot grow the dict forever
+_pending_signup_expiry = []
+PENDING_SIGNUP_TTL = 900  # Seconds; matches the email verification window
+PENDING_SIGNUP_MAX = 10000  # Hard cap against slow signup floods
 
 # Rate limiting for password reset requests (in-memory)
 # Format: {identifier: [timestamp1, timestamp2, ...]}
 # NOTE: This is an in-memory store and will be cleared on server restart.
 # For production environments with multiple server instances, consider using Redis or a database table.
+# {identifier: deque of time.monotonic() floats, bounded at the max attempt count}
 password_reset_attempts = {}
 PASSWORD_RESET_MAX_ATTEMPTS = 3  # Maximum attempts per time window
 PASSWORD_RESET_TIME_WINDOW = 3600  # Time window in seconds (1 hour)
 
+# Optional Redis-backed rate limiting for multi-instance deployments.
+# Set REDIS_URL (e.g. redis://localhost:6379/0) to move the password reset
+# limiter into Redis so it survives restarts and is shared across instances.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+_redis_client = None
+
+# Rolling-window limiter as a single atomic round-trip: evict expired
+# entries, reject if at the cap, otherwise record this attempt.
+_RATE_LIMIT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[1] - ARGV[2])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+# Admin settings cache: these change almost never but were re-read from the
+# database on most auth and message paths. Entries live for a few seconds as
+# a safety net; writers invalidate explicitly.
+_admin_settings_cache = {'data': None, 'expires_at': 0.0}
+_ADMIN_SETTINGS_TTL = 5.0
+
+
+def get_cached_admin_settings():
+    """Return admin settings, served from cache when fresh."""
+    if _admin_settings_cache['data'] is not None and _admin_settings_cache['expires_at'] > time.monotonic():
+        return _admin_settings_cache['data']
+    settings = db.get_admin_settings()
+    _admin_settings_cache['data'] = settings
+    _admin_settings_cache['expires_at'] = time.monotonic() + _ADMIN_SETTINGS_TTL
+    return settings
+
+
+def invalidate_admin_settings_cache():
+    """Drop the cached admin settings after a write."""
+    _admin_settings_cache['data'] = None
+
+
+# Shared EmailSender, rebuilt lazily after admin settings change
+_email_sender = None
+_email_sender_version = -1
+_email_settings_version = 0
+
+
+def get_email_sender():
+    """Return the shared EmailSender, rebuilding it only after settings change."""
+    global _email_sender, _email_sender_version
+    if _email_sender is None or _email_sender_version != _email_settings_version:
+        _email_sender = EmailSender(get_cached_admin_settings() or {})
+        _email_sender_version = _email_settings_version
+    return _email_sender
+
+
+def invalidate_email_sender():
+    """Rebuild the shared EmailSender on next use (admin settings changed)."""
+    global _email_settings_version
+    _email_settings_version += 1
+
+
+def get_redis():
+    """Return the shared Redis client, or None when Redis is not configured."""
+    global _redis_client
+    if _redis_client is None and aioredis is not None and REDIS_URL:
+        _redis_client = aioredis.from_url(REDIS_URL)
+    return _redis_client
+
 # Store connected clients: {websocket: username}
 clients = {}
-# Store message history (deprecated - now per server/channel)
-messages = []
+# Reverse index for O(1) per-user sends: {username: websocket}
+username_to_ws = {}
 MAX_HISTORY = 100
+# Store message history (deprecated - now per server/channel).
+# deque(maxlen=...) evicts the oldest entry in O(1) instead of pop(0)'s
+# full-array shift.
+messages = deque(maxlen=MAX_HISTORY)
 MAX_AVATAR_SIZE = 2 * 1024 * 1024  # 2MB
+# Hard cap on a single WebSocket frame, enforced by aiohttp before the frame
+# is ever buffered in full or JSON-decoded. Oversized frames (e.g. flooded
+# base64 avatar uploads) close the connection instead of reaching handlers.
+WS_MAX_MSG_SIZE = 4 * 1024 * 1024  # 4MB (aiohttp default, made explicit)
+
+# Binary WebSocket codec for high-frequency signaling frames. Clients that
+# offer this subprotocol at the handshake exchange msgpack binary frames on
+# the hot signaling paths; everyone else keeps JSON text frames.
+MSGPACK_SUBPROTOCOL = 'decentra-msgpack-v1'
+# Sockets that negotiated the msgpack subprotocol
+binary_sockets = set()
 
 # Periodic cleanup intervals (in seconds)
 CLEANUP_INTERVAL_HOURLY = 3600  # 1 hour
@@ -137,6 +269,36 @@ voice_states = {}
 voice_members = {}
 # Store soundboard play cooldowns: {username: last_play_timestamp}
 soundboard_cooldowns = {}
+# Cached permission sets: {(server_id, username): frozenset(permissions)}
+# '*' marks owner/administrator (all permissions). Invalidated whenever roles
+# or server membership change for the user/server.
+perm_cache = {}
+# Cached signaling peers per user: {username: set(friend_usernames)}
+# WebRTC signaling messages arrive dozens of times per call setup, so friendship
+# is checked against this cache instead of hitting the database per message.
+# Also used as the friends index for broadcast fan-out.
+allowed_peers = {}
+# Cached server membership per user: {username: set(server_ids)}
+# Mirrors db.get_user_servers; invalidated on create/join/kick/ban.
+user_servers_cache = {}
+# Cached member usernames per server: {server_id: set(usernames)}
+# Resolved on every server broadcast, so kept out of the database.
+server_members_cache = {}
+
+# Pre-built per-server init entries: {(server_id, username_or_None): dict}.
+# The owner's entry carries no permissions block and is stored under None;
+# other members get their own entry. Entries are shallow-copied on read so
+# the reconnect path can attach unread counts without poisoning the cache.
+_server_init_cache = {}
+_SERVER_INIT_CACHE_MAX = 10000
+
+# Voice flag toggles (mute/video/screen share) share one parametric handler:
+# {msg_type: (voice_state_field, broadcast_update_type)}
+VOICE_FLAG_UPDATES = {
+    'voice_mute': ('muted', 'voice_mute_update'),
+    'voice_video': ('video', 'voice_video_update'),
+    'voice_screen_share': ('screen_sharing', 'voice_screen_share_update'),
+}
 
 # Typing indicators: {context_key: {username: asyncio.TimerHandle}}
 typing_states: dict = {}
@@ -148,26 +310,65 @@ bot_clients = {}
 bot_rate_limits = {}
 
 # Helper counters for IDs (load from database on startup)
-server_counter = 0
-channel_counter = 0
-category_counter = 0
-dm_counter = 0
-role_counter = 0
-thread_counter = 0
+# Entity IDs (server_N, channel_N, ...) are allocated atomically from the
+# id_counters table; see get_next_server_id and friends.
+
+
+# Reusable JSON encoder for hot-path serialization. orjson (optional) is a
+# C extension and considerably faster; the stdlib fallback still avoids
+# re-initializing encoder state on every json.dumps call.
+def _json_default(obj):
+    """Encode datetimes inline so payload builders don't pre-format them."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+_JSON_ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False,
+                                 default=_json_default)
+
+# Memoized voice flag update frames: {(update_type, username, value): str}
+# Flag values are booleans, so this stays bounded at a few entries per user.
+voice_update_frames = {}
+
+
+def json_encode(obj):
+    """Serialize an object to a JSON string for WS transmission (hot path)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default).decode('utf-8')
+    return _JSON_ENCODER.encode(obj)
+
+
+def encode_voice_update(update_type, username, field, value):
+    """Return a cached serialized frame for a voice flag update."""
+    key = (update_type, username, value)
+    frame = voice_update_frames.get(key)
+    if frame is None:
+        frame = json_encode({'type': update_type, 'username': username, field: value})
+        voice_update_frames[key] = frame
+    return frame
+
+
+# Explicit bcrypt work factor; pinning it avoids re-deriving the default on
+# every gensalt() call and keeps the cost stable across library upgrades.
+_BCRYPT_ROUNDS = 12
 
 
 def hash_password(password):
     """Hash a password using bcrypt."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(_BCRYPT_ROUNDS)).decode('utf-8')
 
 
 def serialize_role(role):
-    """Serialize a role dict for JSON transmission, converting datetime to string."""
+    """Normalize a role dict for JSON transmission.
+
+    Only reshapes structure; datetime fields are left alone since the
+    JSON encoders format them natively in C (orjson) or via _json_default.
+    Callers must serialize the result with json_encode.
+    """
     if not role:
         return None
-    serialized = role.copy()
-    if 'created_at' in serialized and serialized['created_at']:
-        serialized['created_at'] = serialized['created_at'].isoformat()
+    serialized = dict(role)
     # Map role_id to id for frontend compatibility
     if 'role_id' in serialized:
         serialized['id'] = serialized['role_id']
@@ -181,9 +382,32 @@ def serialize_role(role):
     return serialized
 
 
+# Verified against when a login names an unknown user, so the response takes
+# the same bcrypt time either way and doesn't reveal which usernames exist
+_DUMMY_PASSWORD_HASH = bcrypt.hashpw(secrets.token_bytes(32),
+                                     bcrypt.gensalt(_BCRYPT_ROUNDS)).decode('utf-8')
+
+
 def verify_password(password, password_hash):
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    """Verify a password against its hash (str or bytes)."""
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash)
+
+
+async def hash_password_async(password):
+    """Hash a password in a worker thread.
+
+    bcrypt takes hundreds of milliseconds per call by design; running it on
+    the event loop would stall every connected client for that long. The C
+    extension releases the GIL, so a thread is enough to keep the loop live.
+    """
+    return await asyncio.to_thread(hash_password, password)
+
+
+async def verify_password_async(password, password_hash):
+    """Verify a password in a worker thread (see hash_password_async)."""
+    return await asyncio.to_thread(verify_password, password, password_hash)
 
 
 def generate_2fa_secret():
@@ -191,14 +415,30 @@ def generate_2fa_secret():
     return pyotp.random_base32()
 
 
+_CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+
+def _random_code(length=8):
+    """Build a random uppercase-alphanumeric code from batched CSPRNG reads.
+
+    Per-character secrets.choice costs one getrandom() syscall per
+    character; reading the randomness in one token_bytes call and
+    rejection-sampling (accept < 252 = 7 * 36) keeps the distribution
+    uniform at a fraction of the syscalls.
+    """
+    chars = []
+    while len(chars) < length:
+        for b in secrets.token_bytes(length * 2):
+            if b < 252:
+                chars.append(_CODE_ALPHABET[b % 36])
+                if len(chars) == length:
+                    break
+    return ''.join(chars)
+
+
 def generate_backup_codes(count=10):
     """Generate backup codes for 2FA."""
-    codes = []
-    for _ in range(count):
-        # Generate 8-character alphanumeric code
-        code = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
-        codes.append(code)
-    return codes
+    return [_random_code(8) for _ in range(count)]
 
 
 def verify_2fa_token(secret, token):
@@ -208,13 +448,14 @@ def verify_2fa_token(secret, token):
     return totp.verify(token, valid_window=1)
 
 
-def generate_qr_code_base64(username, secret, issuer_name="Decentra"):
-    """Generate a QR code for 2FA setup."""
-    # Create provisioning URI
-    totp = pyotp.TOTP(secret)
-    uri = totp.provisioning_uri(name=username, issuer_name=issuer_name)
-    
-    # Generate QR code
+@functools.lru_cache(maxsize=256)
+def _qr_png_base64(uri):
+    """Render a provisioning URI as a base64 PNG data URL.
+
+    Memoized: the output is a pure function of the URI, and QR encoding
+    plus PNG compression is the expensive part of 2FA setup, so retries
+    and re-displays of the same secret hit the cache.
+    """
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(uri)
     qr.make(fit=True)
@@ -230,6 +471,14 @@ def generate_qr_code_base64(username, secret, issuer_name="Decentra"):
     return f"data:image/png;base64,{img_base64}"
 
 
+def generate_qr_code_base64(username, secret, issuer_name="Decentra"):
+    """Generate a QR code for 2FA setup."""
+    # Create provisioning URI
+    totp = pyotp.TOTP(secret)
+    uri = totp.provisioning_uri(name=username, issuer_name=issuer_name)
+    return _qr_png_base64(uri)
+
+
 def generate_jwt_token(username):
     """Generate a JWT token for a user."""
     now = datetime.now(timezone.utc)
@@ -238,7 +487,7 @@ def generate_jwt_token(username):
         'exp': now + timedelta(hours=JWT_EXPIRATION_HOURS),
         'iat': now
     }
-    token = jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+    token = jwt.encode(payload, JWT_SECRET_KEY_BYTES, algorithm=JWT_ALGORITHM)
     return token
 
 
@@ -251,27 +500,53 @@ def log_admin_check(username, first_user, is_admin, context=""):
         is_admin: Boolean result of admin check
         context: Optional context string (e.g., "init message" or "check_admin")
     """
-    prefix = f"[{datetime.now().strftime('%H:%M:%S')}]"
     context_str = f" ({context})" if context else ""
-    print(f"{prefix} Admin check for {username}{context_str}: first_user={first_user}, is_admin={is_admin}")
-    
+    logger.info("Admin check for %s%s: first_user=%s, is_admin=%s",
+                username, context_str, first_user, is_admin)
+
     # Log detailed type and value information for debugging
-    username_type = type(username).__name__
-    first_user_type = type(first_user).__name__ if first_user else 'NoneType'
-    print(f"{prefix} Debug{context_str}: username='{username}' (type: {username_type}), "
-          f"first_user='{first_user}' (type: {first_user_type})")
+    if logger.isEnabledFor(logging.DEBUG):
+        username_type = type(username).__name__
+        first_user_type = type(first_user).__name__ if first_user else 'NoneType'
+        logger.debug("Debug%s: username='%s' (type: %s), first_user='%s' (type: %s)",
+                     context_str, username, username_type, first_user, first_user_type)
+
 
 
+# Recently verified JWTs: {sha256(token) prefix: (username, expires_at)}.
+# Reconnect storms re-present the token the server verified seconds ago, so
+# short-circuit the HMAC verification. Entries never outlive the token's own
+# exp claim, and the db.get_user check after lookup keeps revocation working.
+_JWT_VERIFY_CACHE = OrderedDict()
+_JWT_VERIFY_CACHE_MAX = 10000
+_JWT_VERIFY_CACHE_TTL = 30  # Seconds
+
 
 def verify_jwt_token(token):
     """Verify a JWT token and return the username if valid."""
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    cached = _JWT_VERIFY_CACHE.get(key)
+    if cached is not None:
+        cached_username, expires_at = cached
+        if time.time() < expires_at:
+            _JWT_VERIFY_CACHE.move_to_end(key)
+            return cached_username
+        del _JWT_VERIFY_CACHE[key]
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload.get('username')
+        payload = jwt.decode(token, JWT_SECRET_KEY_BYTES, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         return None  # Token has expired
     except jwt.InvalidTokenError:
         return None  # Invalid token
+    token_username = payload.get('username')
+    if token_username:
+        # Cache positive results only; failures must always re-verify
+        expires_at = min(time.time() + _JWT_VERIFY_CACHE_TTL,
+                         payload.get('exp', float('inf')))
+        _JWT_VERIFY_CACHE[key] = (token_username, expires_at)
+        if len(_JWT_VERIFY_CACHE) > _JWT_VERIFY_CACHE_MAX:
+            _JWT_VERIFY_CACHE.popitem(last=False)
+    return token_username
 
 
 def generate_livekit_token(room_name: str, participant_identity: str, participant_name: str = '') -> str | None:
@@ -297,13 +572,23 @@ def generate_livekit_token(room_name: str, participant_identity: str, participan
             'canPublish': True,
             'canSubscribe': True,
         },
-        'metadata': json.dumps({'room': room_name}),
+        'metadata': json_encode({'room': room_name}),
     }
     if participant_name:
         claims['name'] = participant_name
     return jwt.encode(claims, LIVEKIT_API_SECRET, algorithm='HS256')
 
 
+def evict_expired_signups():
+    """Drop pending signups whose verification window has passed."""
+    now = time.monotonic()
+    while _pending_signup_expiry and _pending_signup_expiry[0][0] <= now:
+        _, name = heapq.heappop(_pending_signup_expiry)
+        entry = pending_signups.get(name)
+        if entry is not None and entry.get('expires_at', 0) <= now:
+            del pending_signups[name]
+
+
 def check_password_reset_rate_limit(identifier: str) -> bool:
     """
     Check if a password reset request should be allowed based on rate limiting.
@@ -314,85 +599,184 @@ def check_password_reset_rate_limit(identifier: str) -> bool:
     Returns:
         True if request is allowed, False if rate limit exceeded
     """
-    current_time = datetime.now(timezone.utc)
+    now = time.monotonic()
+    attempts = password_reset_attempts.setdefault(
+        identifier, deque(maxlen=PASSWORD_RESET_MAX_ATTEMPTS))
     
-    # Clean up old attempts outside the time window
-    if identifier in password_reset_attempts:
-        password_reset_attempts[identifier] = [
-            timestamp for timestamp in password_reset_attempts[identifier]
-            if (current_time - timestamp).total_seconds() < PASSWORD_RESET_TIME_WINDOW
-        ]
-        
-        # Remove empty lists to keep memory clean
-        if not password_reset_attempts[identifier]:
-            del password_reset_attempts[identifier]
+    # Evict attempts outside the time window; the deque is already ordered
+    while attempts and now - attempts[0] > PASSWORD_RESET_TIME_WINDOW:
+        attempts.popleft()
     
     # Check if rate limit is exceeded
-    attempts = password_reset_attempts.get(identifier, [])
     if len(attempts) >= PASSWORD_RESET_MAX_ATTEMPTS:
         return False
     
     # Record this attempt
-    if identifier not in password_reset_attempts:
-        password_reset_attempts[identifier] = []
-    password_reset_attempts[identifier].append(current_time)
+    attempts.append(now)
     
     return True
 
 
+# (max attempts, window seconds) per auth action; checked before any bcrypt
+# work so rejected floods cost a dict/Redis lookup instead of ~400ms of CPU
+AUTH_RATE_LIMITS = {
+    'login': (10, 300),
+    'signup': (5, 900),
+}
+# In-memory fallback store, same shape as password_reset_attempts
+auth_attempts = {}
+
+
+async def check_auth_rate_limit(kind: str, identifier: str) -> bool:
+    """Rate-limit a signup/login attempt before the expensive bcrypt call.
+
+    Uses Redis INCR+EXPIRE when REDIS_URL is configured (shared across
+    instances), falling back to an in-memory rolling window otherwise.
+    """
+    limit, window = AUTH_RATE_LIMITS[kind]
+    key = f'rl:auth:{kind}:{identifier}'
+    client = get_redis()
+    if client is not None:
+        try:
+            count = await client.incr(key)
+            if count == 1:
+                await client.expire(key, window)
+            return count <= limit
+        except Exception:
+            logger.exception("Redis auth rate limit failed; using in-memory limiter")
+    now = time.monotonic()
+    attempts = auth_attempts.setdefault(key, deque(maxlen=limit))
+    while attempts and now - attempts[0] > window:
+        attempts.popleft()
+    if len(attempts) >= limit:
+        return False
+    attempts.append(now)
+    return True
+
+
+async def check_password_reset_rate_limit_async(identifier: str) -> bool:
+    """Rate-limit a password reset request.
+
+    Uses the atomic Redis rolling-window limiter when REDIS_URL is
+    configured, falling back to the in-memory limiter otherwise (and on
+    Redis errors, so an outage degrades rather than locks out resets).
+    """
+    client = get_redis()
+    if client is None:
+        return check_password_reset_rate_limit(identifier)
+    try:
+        allowed = await client.eval(
+            _RATE_LIMIT_LUA, 1, f'rl:pwreset:{identifier}',
+            time.time(), PASSWORD_RESET_TIME_WINDOW,
+            PASSWORD_RESET_MAX_ATTEMPTS, secrets.token_hex(8))
+        return bool(allowed)
+    except Exception:
+        logger.exception("Redis rate limit check failed; using in-memory limiter")
+        return check_password_reset_rate_limit(identifier)
+
+
+# Basic email format check (restrictive subset of RFC 5322; does not support all valid addresses).
+# Compiled once at import so signup attempts skip the re cache lookup.
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+
+def is_password_strong(password):
+    """Check password strength: 8+ chars with lower, upper, digit, symbol.
+
+    Single pass with early exit instead of four full regex scans.
+    """
+    if len(password) < 8:
+        return False
+    has_lower = has_upper = has_digit = has_symbol = False
+    for ch in password:
+        if ch.islower():
+            has_lower = True
+        elif ch.isupper():
+            has_upper = True
+        elif ch.isdigit():
+            has_digit = True
+        else:
+            has_symbol = True
+        if has_lower and has_upper and has_digit and has_symbol:
+            return True
+    return False
+
+
 def is_valid_email(email):
     """Validate email address format using regex."""
-    # Basic email format check (restrictive subset of RFC 5322; does not support all valid addresses)
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(email_pattern, email) is not None
+    return _EMAIL_RE.fullmatch(email) is not None
+
+
+def _validate_reset_token(token):
+    """Look up and validate a password reset token.
+
+    Returns (token_data, None) when the token is valid, or (None, error_message)
+    otherwise. Expiry is evaluated in SQL against CURRENT_TIMESTAMP so there is
+    no datetime parsing here. Shared by validate_reset_token and reset_password
+    so the two auth branches cannot drift apart.
+    """
+    token_data = db.get_password_reset_token(token)
+    if not token_data:
+        return None, 'Invalid or expired reset token'
+    if token_data.get('used'):
+        return None, 'This reset link has already been used'
+    if token_data.get('expired'):
+        return None, 'This reset link has expired'
+    return token_data, None
 
 
 def generate_invite_code():
     """Generate a random invite code."""
-    alphabet = string.ascii_uppercase + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(8))
+    return _random_code(8)
 
 
 def get_next_server_id():
     """Get next server ID."""
-    global server_counter
-    server_counter += 1
-    return f"server_{server_counter}"
+    return f"server_{db.next_counter_value('server')}"
 
 
 def get_next_channel_id():
     """Get next channel ID."""
-    global channel_counter
-    channel_counter += 1
-    return f"channel_{channel_counter}"
+    return f"channel_{db.next_counter_value('channel')}"
 
 
 def get_next_category_id():
     """Get next category ID."""
-    global category_counter
-    category_counter += 1
-    return f"category_{category_counter}"
+    return f"category_{db.next_counter_value('category')}"
 
 
 def get_next_role_id():
     """Get next role ID."""
-    global role_counter
-    role_counter += 1
-    return f"role_{role_counter}"
+    return f"role_{db.next_counter_value('role')}"
 
 
 def get_next_thread_id():
     """Get next thread ID."""
-    global thread_counter
-    thread_counter += 1
-    return f"thread_{thread_counter}"
+    return f"thread_{db.next_counter_value('thread')}"
 
 
 def get_next_dm_id():
     """Get next DM ID."""
-    global dm_counter
-    dm_counter += 1
-    return f"dm_{dm_counter}"
+    return f"dm_{db.next_counter_value('dm')}"
+
+
+_last_ts_ms = 0
+_last_ts_iso = ''
+
+
+def utc_now_isoformat():
+    """ISO-8601 UTC timestamp for outgoing messages, memoized per millisecond.
+
+    Messages created within the same millisecond reuse the formatted string
+    instead of re-running tz-aware datetime construction and isoformat()
+    per message.
+    """
+    global _last_ts_ms, _last_ts_iso
+    ms = time.time_ns() // 1_000_000
+    if ms != _last_ts_ms:
+        _last_ts_iso = datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec='milliseconds')
+        _last_ts_ms = ms
+    return _last_ts_iso
 
 
 def create_message_object(username, msg_content, context, context_id, user_profile, message_key=None, message_id=None, reply_data=None):
@@ -416,7 +800,7 @@ def create_message_object(username, msg_content, context, context_id, user_profi
         'type': 'message',
         'username': username,
         'content': msg_content,
-        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'timestamp': utc_now_isoformat(),
         'context': context,
         'context_id': context_id,
         'avatar': user_profile.get('avatar', '👤') if user_profile else '👤',
@@ -464,70 +848,48 @@ def create_message_object(username, msg_content, context, context_id, user_profi
 
 
 def init_counters_from_db():
-    """Initialize ID counters from database."""
-    global server_counter, channel_counter, category_counter, dm_counter, role_counter
-    
-    # Get highest server ID
-    servers = db.get_all_servers()
-    if servers:
-        max_server = max([int(s['server_id'].split('_')[1]) for s in servers] + [0])
-        server_counter = max_server
-    
-    # Get highest channel ID
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT channel_id FROM channels')
-        channel_ids = [row['channel_id'] for row in cursor.fetchall()]
-        if channel_ids:
-            max_channel = max([int(c.split('_')[1]) for c in channel_ids] + [0])
-            channel_counter = max_channel
-    
-    # Get highest category ID
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT category_id FROM categories')
-        category_ids = [row['category_id'] for row in cursor.fetchall()]
-        if category_ids:
-            max_category = max([int(c.split('_')[1]) for c in category_ids] + [0])
-            category_counter = max_category
-    
-    # Get highest DM ID
-    dms = db.get_user_dms('')  # Empty string won't match, but we get all DMs
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT dm_id FROM direct_messages')
-        dm_ids = [row['dm_id'] for row in cursor.fetchall()]
-        if dm_ids:
-            max_dm = max([int(d.split('_')[1]) for d in dm_ids] + [0])
-            dm_counter = max_dm
-    
-    # Get highest role ID
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT role_id FROM server_roles')
-        role_ids = [row['role_id'] for row in cursor.fetchall()]
-        if role_ids:
-            # Handle both formats: "role_1" and "role_server_1_server_2"
-            max_role = 0
-            for rid in role_ids:
-                parts = rid.split('_')
-                # If it's the new format "role_N", get the number
-                if len(parts) == 2 and parts[1].isdigit():
-                    max_role = max(max_role, int(parts[1]))
-                # If it's the old format "role_server_X_server_Y", get the last number
-                elif len(parts) > 2 and parts[-1].isdigit():
-                    max_role = max(max_role, int(parts[-1]))
-            role_counter = max_role
-
-    # Get highest thread ID
-    global thread_counter
+    """Seed the id_counters table from existing entity IDs.
+
+    Migrates installs whose data predates atomic counter allocation. Each
+    maximum is computed inside PostgreSQL with a single aggregate instead
+    of pulling every ID into Python; the seed only ever raises a counter,
+    so rerunning it is harmless.
+    """
+    # (counter name, table, ID column) for IDs in the uniform "<prefix>_N" form
+    uniform_id_sources = [
+        ('server', 'servers', 'server_id'),
+        ('channel', 'channels', 'channel_id'),
+        ('category', 'categories', 'category_id'),
+        ('dm', 'direct_messages', 'dm_id'),
+        ('thread', 'threads', 'thread_id'),
+    ]
+    seed_sql = '''
+        INSERT INTO id_counters (name, value) VALUES (%s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET value = GREATEST(id_counters.value, EXCLUDED.value)
+    '''
+    # One connection for all of startup seeding; opening a fresh connection
+    # per counter just repeats TCP + auth setup for six tiny statements
     with db.get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT thread_id FROM threads')
-        t_ids = [row['thread_id'] for row in cursor.fetchall()]
-        if t_ids:
-            max_thread = max([int(t.split('_')[1]) for t in t_ids if len(t.split('_')) == 2 and t.split('_')[1].isdigit()] + [0])
-            thread_counter = max_thread
+        for name, table, column in uniform_id_sources:
+            cursor.execute(
+                f"""SELECT COALESCE(MAX(CAST(split_part({column}, '_', 2) AS BIGINT)), 0) AS max_id
+                    FROM {table} WHERE {column} ~ '^{name}_[0-9]+$'"""
+            )
+            max_id = cursor.fetchone()['max_id']
+            if max_id:
+                cursor.execute(seed_sql, (name, max_id))
+        
+        # Roles have two historical formats ("role_N" and "role_server_X_N"),
+        # so take the trailing number in either case
+        cursor.execute(
+            """SELECT COALESCE(MAX(CAST(substring(role_id FROM '[0-9]+$') AS BIGINT)), 0) AS max_id
+               FROM server_roles WHERE role_id ~ '[0-9]+$'"""
+        )
+        max_role = cursor.fetchone()['max_id']
+        if max_role:
+            cursor.execute(seed_sql, ('role', max_role))
 
 
 def get_next_call_id():
@@ -537,20 +899,12 @@ def get_next_call_id():
 
 def get_or_create_dm(user1, user2):
     """Get existing DM or create new one between two users."""
-    # Check if DM exists in database
-    dm_id = db.get_dm(user1, user2)
-    if dm_id:
-        return dm_id
-    
-    # Create new DM
-    dm_id = get_next_dm_id()
-    db.create_dm(dm_id, user1, user2)
-    return dm_id
+    # Single round-trip: the upsert returns the existing dm_id on conflict
+    return db.upsert_dm(get_next_dm_id(), user1, user2)
 
 
-def get_avatar_data(username):
-    """Get avatar data for a user."""
-    user = db.get_user(username)
+def _avatar_fields(user):
+    """Extract avatar fields from a user row (None for missing users)."""
     if not user:
         return {'avatar': '👤', 'avatar_type': 'emoji', 'avatar_data': None}
     
@@ -561,9 +915,8 @@ def get_avatar_data(username):
     }
 
 
-def get_profile_data(username):
-    """Get profile data (bio and status) for a user."""
-    user = db.get_user(username)
+def _profile_fields(user):
+    """Extract bio/status fields from a user row (None for missing users)."""
     if not user:
         return {'bio': '', 'status_message': ''}
     
@@ -573,9 +926,50 @@ def get_profile_data(username):
     }
 
 
+# Briefly cached user rows for display data (avatar/profile/status):
+# {username: (expires_at, row)}. The same users are re-read on every
+# reconnect, broadcast, and message; explicit invalidation on mutation
+# keeps updates immediate while the TTL bounds staleness for the rest.
+_user_card_cache = {}
+_USER_CARD_TTL = 60  # Seconds
+_USER_CARD_MAX = 5000
+
+
+def _cache_user_card(username, user):
+    if len(_user_card_cache) >= _USER_CARD_MAX:
+        _user_card_cache.clear()
+    _user_card_cache[username] = (time.monotonic() + _USER_CARD_TTL, user)
+
+
+def _get_user_card(username):
+    """Get a user row for display purposes, served from cache when fresh."""
+    entry = _user_card_cache.get(username)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    user = db.get_user(username)
+    _cache_user_card(username, user)
+    return user
+
+
+def invalidate_user_card(*usernames):
+    """Drop cached display rows after avatar/profile/status changes."""
+    for name in usernames:
+        _user_card_cache.pop(name, None)
+
+
+def get_avatar_data(username):
+    """Get avatar data for a user."""
+    return _avatar_fields(_get_user_card(username))
+
+
+def get_profile_data(username):
+    """Get profile data (bio and status) for a user."""
+    return _profile_fields(_get_user_card(username))
+
+
 def get_user_status(username):
     """Get user status for a user."""
-    user = db.get_user(username)
+    user = _get_user_card(username)
     if not user:
         return 'online'
     
@@ -583,15 +977,44 @@ def get_user_status(username):
 
 
 def build_user_servers_data(username):
-    """Build server list data for a user including categories, channels and permissions."""
+    """Build server list data for a user including categories, channels and permissions.
+
+    All per-server data is fetched with bulk queries — one each for
+    servers, channels, categories, and this user's membership rows —
+    instead of three-plus queries per server on the connect path.
+    """
     user_servers = []
     user_server_ids = db.get_user_servers(username)
     
+    # Serve pre-built entries where possible; only the misses hit the
+    # bulk queries below.
+    cached_entries = {}
+    miss_ids = []
+    for server_id in user_server_ids:
+        entry = _server_init_cache.get((server_id, username))
+        if entry is None:
+            owner_entry = _server_init_cache.get((server_id, None))
+            if owner_entry is not None and owner_entry['owner'] == username:
+                entry = owner_entry
+        if entry is not None:
+            cached_entries[server_id] = entry
+        else:
+            miss_ids.append(server_id)
+    
+    servers_by_id = db.get_servers_bulk(miss_ids)
+    channels_by_server = db.get_channels_bulk(miss_ids)
+    categories_by_server = db.get_categories_bulk(miss_ids)
+    memberships = db.get_memberships_bulk(miss_ids, username)
+    
     for server_id in user_server_ids:
-        server_data = db.get_server(server_id)
+        cached = cached_entries.get(server_id)
+        if cached is not None:
+            user_servers.append(dict(cached))
+            continue
+        server_data = servers_by_id.get(server_id)
         if server_data:
-            channels = db.get_server_channels(server_id)
-            categories = db.get_server_categories(server_id)
+            channels = channels_by_server.get(server_id, [])
+            categories = categories_by_server.get(server_id, [])
             server_info = {
                 'id': server_id,
                 'name': server_data['name'],
@@ -616,24 +1039,26 @@ def build_user_servers_data(username):
             }
             # Add permissions if user is not owner
             if username != server_data['owner']:
-                members = db.get_server_members(server_id)
-                for member in members:
-                    if member['username'] == username:
-                        server_info['permissions'] = {
-                            'can_create_channel': member.get('can_create_channel', False),
-                            'can_edit_channel': member.get('can_edit_channel', False),
-                            'can_delete_channel': member.get('can_delete_channel', False),
-                            'can_edit_messages': member.get('can_edit_messages', False),
-                            'can_delete_messages': member.get('can_delete_messages', False)
-                        }
-                        # Check rules_pending status
-                        if not member.get('rules_accepted', True):
-                            server_settings = db.get_server_settings(server_id)
-                            if server_settings and server_settings.get('rules_enabled'):
-                                server_info['rules_pending'] = True
-                                server_info['rules_text'] = server_settings.get('rules_text', '')
-                        break
-            user_servers.append(server_info)
+                member = memberships.get(server_id)
+                if member:
+                    server_info['permissions'] = {
+                        'can_create_channel': member.get('can_create_channel', False),
+                        'can_edit_channel': member.get('can_edit_channel', False),
+                        'can_delete_channel': member.get('can_delete_channel', False),
+                        'can_edit_messages': member.get('can_edit_messages', False),
+                        'can_delete_messages': member.get('can_delete_messages', False)
+                    }
+                    # Check rules_pending status
+                    if not member.get('rules_accepted', True):
+                        server_settings = db.get_server_settings(server_id)
+                        if server_settings and server_settings.get('rules_enabled'):
+                            server_info['rules_pending'] = True
+                            server_info['rules_text'] = server_settings.get('rules_text', '')
+            if len(_server_init_cache) >= _SERVER_INIT_CACHE_MAX:
+                _server_init_cache.clear()
+            cache_key = (server_id, None if username == server_data['owner'] else username)
+            _server_init_cache[cache_key] = server_info
+            user_servers.append(dict(server_info))
     
     return user_servers
 
@@ -643,15 +1068,19 @@ def build_user_dms_data(username):
     user_dms = []
     dm_list = db.get_user_dms(username)
     
-    for dm in dm_list:
-        other_user = dm['user2'] if dm['user1'] == username else dm['user1']
-        avatar_data = get_avatar_data(other_user)
-        user_status = get_user_status(other_user)
+    other_users = [dm['user2'] if dm['user1'] == username else dm['user1']
+                   for dm in dm_list]
+    users_by_name = db.get_users_bulk(other_users)
+    for name, row in users_by_name.items():
+        _cache_user_card(name, row)
+    
+    for dm, other_user in zip(dm_list, other_users):
+        user = users_by_name.get(other_user)
         user_dms.append({
             'id': dm['dm_id'],
             'username': other_user,
-            **avatar_data,
-            'user_status': user_status
+            **_avatar_fields(user),
+            'user_status': user.get('user_status', 'online') if user else 'online'
         })
     
     return user_dms
@@ -660,16 +1089,18 @@ def build_user_dms_data(username):
 def build_user_friends_data(username):
     """Build friends list data for a user including avatar and profile data."""
     friends_list = []
+    friends = db.get_friends(username)
+    users_by_name = db.get_users_bulk(friends)
+    for name, row in users_by_name.items():
+        _cache_user_card(name, row)
     
-    for friend in db.get_friends(username):
-        avatar_data = get_avatar_data(friend)
-        profile_data = get_profile_data(friend)
-        user_status = get_user_status(friend)
+    for friend in friends:
+        user = users_by_name.get(friend)
         friends_list.append({
             'username': friend,
-            **avatar_data,
-            **profile_data,
-            'user_status': user_status
+            **_avatar_fields(user),
+            **_profile_fields(user),
+            'user_status': user.get('user_status', 'online') if user else 'online'
         })
     
     return friends_list
@@ -677,69 +1108,129 @@ def build_user_friends_data(username):
 
 def build_friend_requests_data(username):
     """Build friend request lists for a user."""
-    friend_requests_sent = []
-    for requested_user in db.get_friend_requests_sent(username):
-        avatar_data = get_avatar_data(requested_user)
-        profile_data = get_profile_data(requested_user)
-        friend_requests_sent.append({
+    sent_users = db.get_friend_requests_sent(username)
+    received_users = db.get_friend_requests_received(username)
+    users_by_name = db.get_users_bulk(set(sent_users) | set(received_users))
+    for name, row in users_by_name.items():
+        _cache_user_card(name, row)
+    
+    friend_requests_sent = [
+        {
             'username': requested_user,
-            **avatar_data,
-            **profile_data
-        })
+            **_avatar_fields(users_by_name.get(requested_user)),
+            **_profile_fields(users_by_name.get(requested_user))
+        }
+        for requested_user in sent_users
+    ]
     
-    friend_requests_received = []
-    for requester_user in db.get_friend_requests_received(username):
-        avatar_data = get_avatar_data(requester_user)
-        profile_data = get_profile_data(requester_user)
-        friend_requests_received.append({
+    friend_requests_received = [
+        {
             'username': requester_user,
-            **avatar_data,
-            **profile_data
-        })
+            **_avatar_fields(users_by_name.get(requester_user)),
+            **_profile_fields(users_by_name.get(requester_user))
+        }
+        for requester_user in received_users
+    ]
     
     return friend_requests_sent, friend_requests_received
 
 
-def has_permission(server_id, username, permission):
-    """Check if user has specific permission in a server through roles.
-    Owner always has all permissions.
-    Admin role always has all permissions.
-    Permission can be: 'administrator', 'manage_server', 'create_invite', 'create_channel', 
-                       'manage_channels', 'delete_messages', 'edit_messages', 'send_files', 
-                       'ban_members', 'manage_roles', 'access_settings'
+def _compute_user_permissions(server_id, username):
+    """Resolve the full permission set for a user in a server from the database.
+
+    Returns a frozenset of granted permission names. The special entry '*'
+    means all permissions (owner or administrator role).
     """
     server = db.get_server(server_id)
     if not server:
-        return False
-    
+        return frozenset()
+
     # Owner has all permissions
     if server['owner'] == username:
-        return True
-    
-    # Check user's roles for the permission
+        return frozenset(('*',))
+
+    granted = set()
+
+    # Collect permissions from the user's roles
     user_roles = db.get_user_roles(server_id, username)
     for role in user_roles:
         perms = role.get('permissions', {})
         # Coerce legacy array format to dict
         if isinstance(perms, list):
             perms = {k: True for k in perms}
-        
+
         # Administrator role has all permissions
         if perms.get('administrator', False):
+            return frozenset(('*',))
+
+        granted.update(k for k, v in perms.items() if v)
+
+    # Legacy: old per-member permission flags for backward compatibility
+    member = db.get_server_member(server_id, username)
+    if member:
+        for legacy_perm in ('can_create_channel', 'can_edit_channel', 'can_delete_channel'):
+            if member.get(legacy_perm, False):
+                granted.add(legacy_perm)
+
+    return frozenset(granted)
+
+
+def has_permission(server_id, username, permission):
+    """Check if user has specific permission in a server through roles.
+    Owner always has all permissions.
+    Admin role always has all permissions.
+    Permission can be: 'administrator', 'manage_server', 'create_invite', 'create_channel',
+                       'manage_channels', 'delete_messages', 'edit_messages', 'send_files',
+                       'ban_members', 'manage_roles', 'access_settings'
+
+    Results are cached per (server_id, username) and invalidated via
+    invalidate_perm_cache when roles or membership change.
+    """
+    key = (server_id, username)
+    perms = perm_cache.get(key)
+    if perms is None:
+        perms = _compute_user_permissions(server_id, username)
+        perm_cache[key] = perms
+    return '*' in perms or permission in perms
+
+
+def invalidate_perm_cache(server_id, username=None):
+    """Drop cached permission sets after a role or membership change.
+
+    With a username, drops only that user's entry; without, drops every
+    entry for the server (role update/delete affects all holders).
+    """
+    if username is not None:
+        perm_cache.pop((server_id, username), None)
+    else:
+        for key in [k for k in perm_cache if k[0] == server_id]:
+            del perm_cache[key]
+
+
+def check_message_permission(username, message, action):
+    """Check whether a user may edit or delete a message (or its attachments).
+
+    Own messages are always allowed. In servers, the owner can always act;
+    otherwise 'delete' consults the role-aware delete_messages permission
+    and 'edit' the member's can_edit_messages flag. Shared by the
+    edit_message, delete_message, and delete_attachment branches so the
+    cascade exists once.
+    """
+    if message['username'] == username:
+        return True
+    if message['context_type'] == 'server' and message['context_id']:
+        server_id = message['context_id'].split('/')[0]
+        server = db.get_server(server_id)
+        if not server:
+            return False
+        if username == server['owner']:
             return True
-        
-        # Check if role has the requested permission
-        if perms.get(permission, False):
+        if action == 'delete' and has_permission(server_id, username, 'delete_messages'):
             return True
-    
-    # Legacy: Check old permission system for backward compatibility
-    if permission in ['can_create_channel', 'can_edit_channel', 'can_delete_channel']:
-        members = db.get_server_members(server_id)
-        for member in members:
-            if member['username'] == username:
-                return member.get(permission, False)
-    
-    # Default: no permission
+        member = db.get_server_member(server_id, username)
+        if member:
+            flag = 'can_delete_messages' if action == 'delete' else 'can_edit_messages'
+            return member.get(flag, False)
     return False
 
 
@@ -796,65 +1287,135 @@ def get_admin_permissions():
 
 
 
+async def _send_text_frame(client_ws, payload):
+    """Send a pre-encoded UTF-8 TEXT frame.
+
+    Fanning the same message out with send_str re-encodes it to bytes once
+    per recipient; encoding once and writing the bytes at the frame level
+    does the work a single time per broadcast.
+    """
+    writer = getattr(client_ws, '_writer', None)
+    if writer is not None:
+        await writer.send(payload, binary=False)
+    else:
+        await client_ws.send_str(payload.decode('utf-8'))
+
+
+# Fan-out batch size: bounds how long one broadcast can hold the event loop
+# before unrelated websockets get a chance to run.
+_BROADCAST_BATCH_SIZE = 50
+
+
+async def _gather_in_batches(tasks):
+    """Run send tasks in bounded batches, yielding the loop between batches."""
+    for i in range(0, len(tasks), _BROADCAST_BATCH_SIZE):
+        await asyncio.gather(*tasks[i:i + _BROADCAST_BATCH_SIZE], return_exceptions=True)
+        if i + _BROADCAST_BATCH_SIZE < len(tasks):
+            await asyncio.sleep(0)
+
+
 async def broadcast(message, exclude=None):
     """Broadcast a message to all connected clients except the excluded one."""
     if clients:
+        payload = message.encode('utf-8')
         tasks = []
         for client_ws, client_username in clients.items():
             if client_ws != exclude:
-                tasks.append(client_ws.send_str(message))
+                tasks.append(_send_text_frame(client_ws, payload))
         if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+            await _gather_in_batches(tasks)
 
 
 async def broadcast_to_server(server_id, message, exclude=None, channel_id=None):
     """Broadcast a message to all members of a server, or to all users if server_id is None.
     If channel_id is provided, only members with view_channel permission for that channel receive it.
     """
+    payload = message.encode('utf-8')
     if server_id is None:
         # Broadcast to all connected users (for instance webhooks)
         tasks = []
         for client_ws, client_username in clients.items():
             if client_ws != exclude:
-                tasks.append(client_ws.send_str(message))
+                tasks.append(_send_text_frame(client_ws, payload))
         if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+            await _gather_in_batches(tasks)
     else:
-        # Broadcast to specific server members
-        server_members_data = db.get_server_members(server_id)
-        server_members = {m['username'] for m in server_members_data}
+        # Broadcast to specific server members; walk the (usually much
+        # smaller) member set against the reverse index instead of scanning
+        # every connected client.
+        server_members = get_cached_server_members(server_id)
+        
+        # The server row and channel overrides do not vary by recipient;
+        # fetch them once instead of inside the loop
+        owner = None
+        overrides = None
+        if channel_id:
+            server = db.get_server(server_id)
+            owner = server['owner'] if server else None
+            overrides = db.get_channel_all_overrides(channel_id)
         
         tasks = []
-        for client_ws, client_username in clients.items():
-            if client_username in server_members and client_ws != exclude:
+        for client_username in server_members:
+            client_ws = username_to_ws.get(client_username)
+            if client_ws is not None and client_ws != exclude:
                 # If channel_id provided, enforce view_channel permission
-                if channel_id:
-                    server = db.get_server(server_id)
-                    # Owners always see all channels
-                    if server and server['owner'] == client_username:
-                        tasks.append(client_ws.send_str(message))
-                        continue
-                    # Check channel overrides — if any override exists, enforce
-                    overrides = db.get_channel_all_overrides(channel_id)
-                    if overrides:
-                        if db.has_channel_permission(server_id, client_username, channel_id, 'view_channel'):
-                            tasks.append(client_ws.send_str(message))
-                    else:
-                        # No overrides set — default allow
-                        tasks.append(client_ws.send_str(message))
+                # (owners always see all channels; no overrides = default allow)
+                if channel_id and overrides and client_username != owner:
+                    if db.has_channel_permission(server_id, client_username, channel_id, 'view_channel'):
+                        tasks.append(_send_text_frame(client_ws, payload))
                 else:
-                    tasks.append(client_ws.send_str(message))
+                    tasks.append(_send_text_frame(client_ws, payload))
         if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+            await _gather_in_batches(tasks)
+
 
 
+async def _close_superseded_session(username, websocket):
+    """Close a user's previous socket before registering a new one.
+
+    The reverse index keeps one socket per user, so a second login
+    supersedes the first. Closing the old socket enforces that, instead of
+    leaving it connected but unreachable for directed sends and broadcasts.
+    """
+    old_ws = username_to_ws.get(username)
+    if old_ws is None or old_ws is websocket:
+        return
+    clients.pop(old_ws, None)
+    try:
+        await old_ws.close()
+    except Exception:
+        pass
+
 
 async def send_to_user(username, message):
     """Send a message to a specific user."""
-    for client_ws, client_username in clients.items():
-        if client_username == username:
-            await client_ws.send_str(message)
-            break
+    client_ws = username_to_ws.get(username)
+    if client_ws is not None:
+        await client_ws.send_str(message)
+
+
+def decode_ws_message(websocket, msg):
+    """Decode an incoming WS frame using the socket's negotiated codec."""
+    if msg.type == web.WSMsgType.BINARY:
+        if MSGPACK_AVAILABLE and websocket in binary_sockets:
+            return msgpack.unpackb(msg.data, raw=False)
+        raise ValueError('Unexpected binary frame on JSON connection')
+    return json.loads(msg.data)
+
+
+async def send_payload(websocket, payload):
+    """Send a payload dict on a socket using its negotiated codec."""
+    if websocket in binary_sockets:
+        await websocket.send_bytes(msgpack.packb(payload, use_bin_type=True))
+    else:
+        await websocket.send_str(json_encode(payload))
+
+
+async def send_payload_to_user(username, payload):
+    """Send a payload dict to a specific user using their negotiated codec."""
+    client_ws = username_to_ws.get(username)
+    if client_ws is not None:
+        await send_payload(client_ws, payload)
 
 
 def check_bot_rate_limit(bot_id: str, limit_type: str, limit: int, window: int = 10, channel_id: str = None) -> tuple:
@@ -870,8 +1431,7 @@ def check_bot_rate_limit(bot_id: str, limit_type: str, limit: int, window: int =
     Returns:
         (allowed: bool, retry_after: float)
     """
-    import time as _time
-    now = _time.time()
+    now = time.time()
     
     if bot_id not in bot_rate_limits:
         bot_rate_limits[bot_id] = {}
@@ -904,7 +1464,7 @@ async def deliver_bot_event(event_name: str, data: dict, server_id: str = None,
     if not bot_clients:
         return
     
-    event_msg = json.dumps({
+    event_msg = json_encode({
         'type': 'bot_event',
         'event': event_name,
         'data': data,
@@ -934,13 +1494,54 @@ async def broadcast_to_dm_participants(username, dm_id, message):
         dm_id: The DM identifier
         message: The message to broadcast
     """
-    user_dms = db.get_user_dms(username)
-    for dm in user_dms:
-        if dm['dm_id'] == dm_id:
-            participants = [dm['user1'], dm['user2']]
-            for participant in participants:
-                await send_to_user(participant, message)
-            break
+    dm_row = db.get_dm_if_participant(username, dm_id)
+    if not dm_row:
+        return
+    # Encode once and reuse the frame for both participants
+    payload = message.encode('utf-8')
+    tasks = []
+    for participant in (dm_row['user1'], dm_row['user2']):
+        client_ws = username_to_ws.get(participant)
+        if client_ws is not None:
+            tasks.append(_send_text_frame(client_ws, payload))
+    if tasks:
+        # Overlap the two writes; one closing socket must not block the other
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Coalesced deletion broadcasts: deletions landing within the flush window
+# (bulk moderation sweeps) go out as one messages_deleted frame per context
+# instead of one frame per message.
+_DELETION_FLUSH_DELAY = 0.05
+_pending_deletions = {}
+_deletion_flush_task = None
+
+
+def queue_deletion_broadcast(context_key, message_id):
+    """Queue a deletion for the next coalesced broadcast.
+
+    context_key is ('server', server_id) or ('dm', username, dm_id).
+    """
+    global _deletion_flush_task
+    _pending_deletions.setdefault(context_key, []).append(message_id)
+    if _deletion_flush_task is None or _deletion_flush_task.done():
+        _deletion_flush_task = asyncio.create_task(_flush_deletion_broadcasts())
+
+
+async def _flush_deletion_broadcasts():
+    """Drain queued deletions and broadcast one frame per context."""
+    await asyncio.sleep(_DELETION_FLUSH_DELAY)
+    pending = dict(_pending_deletions)
+    _pending_deletions.clear()
+    for key, message_ids in pending.items():
+        payload = json_encode({
+            'type': 'messages_deleted',
+            'message_ids': message_ids
+        })
+        if key[0] == 'server':
+            await broadcast_to_server(key[1], payload)
+        else:
+            await broadcast_to_dm_participants(key[1], key[2], payload)
 
 
 async def cleanup_voice_state(username, reason=''):
@@ -963,7 +1564,7 @@ async def cleanup_voice_state(username, reason=''):
     
     # Notify if in direct call
     if old_state.get('direct_call_peer'):
-        await send_to_user(old_state['direct_call_peer'], json.dumps({
+        await send_to_user(old_state['direct_call_peer'], json_encode({
             'type': 'direct_call_ended',
             'from': username,
             'reason': reason or 'ended'
@@ -984,6 +1585,114 @@ async def cleanup_voice_state(username, reason=''):
     return False
 
 
+def get_allowed_peers(username):
+    """Get the cached set of users this user is allowed to signal (their friends).
+
+    Computed from the database on first use and invalidated whenever a
+    friendship changes (see invalidate_allowed_peers).
+    """
+    peers = allowed_peers.get(username)
+    if peers is None:
+        peers = set(db.get_friends(username))
+        allowed_peers[username] = peers
+    return peers
+
+
+def invalidate_allowed_peers(*usernames):
+    """Drop cached signaling peer sets after a friendship change."""
+    for name in usernames:
+        allowed_peers.pop(name, None)
+
+
+# Pending friend requests: {username: (sent_set, received_set)}
+friend_request_sets_cache = {}
+
+
+def get_friend_request_sets(username):
+    """Get the cached (sent, received) friend-request sets for a user.
+
+    Computed from the database on first use and invalidated whenever a
+    request is sent, accepted, denied or cancelled.
+    """
+    sets = friend_request_sets_cache.get(username)
+    if sets is None:
+        sets = (set(db.get_friend_requests_sent(username)),
+                set(db.get_friend_requests_received(username)))
+        friend_request_sets_cache[username] = sets
+    return sets
+
+
+def invalidate_friend_requests(*usernames):
+    """Drop cached friend-request sets after a request state change."""
+    for name in usernames:
+        friend_request_sets_cache.pop(name, None)
+
+
+def get_cached_user_servers(username):
+    """Get the cached set of server IDs the user is a member of.
+
+    Computed from the database on first use and invalidated whenever the
+    user's server membership changes (see invalidate_user_servers).
+    """
+    server_ids = user_servers_cache.get(username)
+    if server_ids is None:
+        server_ids = set(db.get_user_servers(username))
+        user_servers_cache[username] = server_ids
+    return server_ids
+
+
+def invalidate_user_servers(*usernames):
+    """Drop cached server membership sets after a membership change."""
+    for name in usernames:
+        user_servers_cache.pop(name, None)
+
+
+def get_cached_server_members(server_id):
+    """Get the cached set of member usernames for a server.
+
+    Computed from the database on first use and invalidated whenever the
+    server's membership changes (see invalidate_server_members).
+    """
+    members = server_members_cache.get(server_id)
+    if members is None:
+        members = {m['username'] for m in db.get_server_members(server_id)}
+        server_members_cache[server_id] = members
+    return members
+
+
+def invalidate_server_members(server_id):
+    """Drop the cached member set after a server membership change."""
+    server_members_cache.pop(server_id, None)
+
+
+def invalidate_server_init(server_id, username=None):
+    """Drop pre-built init entries after server/channel/permission changes.
+
+    With a username, drops only that member's entry; without, drops every
+    entry for the server (structure changes affect all members).
+    """
+    if username is not None:
+        _server_init_cache.pop((server_id, username), None)
+        return
+    for key in [k for k in _server_init_cache if k[0] == server_id]:
+        del _server_init_cache[key]
+
+
+def can_signal(username, target_user):
+    """Check whether WebRTC signaling from username to target_user is allowed.
+
+    Signaling is allowed between friends (direct calls) and between users
+    currently in the same voice channel (channel calls connect non-friends).
+    """
+    if target_user in get_allowed_peers(username):
+        return True
+    state = voice_states.get(username)
+    if state and state.get('server_id') and state.get('channel_id'):
+        voice_key = f"{state['server_id']}/{state['channel_id']}"
+        return target_user in voice_members.get(voice_key, ())
+    return False
+
+
 def create_voice_state(direct_call_peer=None, server_id=None, channel_id=None):
     """Create a voice state dictionary with consistent structure.
     
@@ -1012,7 +1721,7 @@ def create_voice_state(direct_call_peer=None, server_id=None, channel_id=None):
     return state
 
 
-async def handler(websocket):
+async def handler(websocket, peer_ip=None):
     """Handle client connections."""
     username = None
     authenticated = False
@@ -1026,43 +1735,45 @@ async def handler(websocket):
         # Authentication loop
         while not authenticated:
             msg = await websocket.receive()
-            if msg.type == web.WSMsgType.TEXT:
-                auth_data = json.loads(msg.data)
+            if msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                auth_data = decode_ws_message(websocket, msg)
             elif msg.type == web.WSMsgType.ERROR:
-                print(f'WebSocket connection closed with exception {websocket.exception()}')
+                logger.error('WebSocket connection closed with exception %s', websocket.exception())
                 break
             else:
                 break
             
+            # Single type lookup drives the whole dispatch chain below
+            auth_type = auth_data.get('type')
+            
             # Respond to keepalive pings during auth phase
-            if auth_data.get('type') == 'ping':
-                await websocket.send_str(json.dumps({'type': 'pong'}))
+            if auth_type == 'ping':
+                await websocket.send_str(json_encode({'type': 'pong'}))
                 continue
             
             # Handle bot authentication
-            if auth_data.get('type') == 'bot_auth':
+            if auth_type == 'bot_auth':
                 bot_token = auth_data.get('token', '')
                 if not bot_token:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Bot token is required'
                     }))
                     continue
                 
                 # Hash the token and look up the bot
-                import hashlib
                 token_hash = hashlib.sha256(bot_token.encode()).hexdigest()
                 bot = db.get_bot_by_token_hash(token_hash)
                 
                 if not bot:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid bot token'
                     }))
                     continue
                 
                 if not bot.get('is_active', True):
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Bot is deactivated'
                     }))
@@ -1085,11 +1796,13 @@ async def handler(websocket):
                     'rate_limit_api': bot.get('rate_limit_api', 120)
                 }
                 bot_clients[websocket] = bot_info
+                await _close_superseded_session(username, websocket)
                 clients[websocket] = username
+                username_to_ws[username] = websocket
                 authenticated = True
                 
                 # Send bot auth success
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'bot_auth_success',
                     'bot_id': bot['bot_id'],
                     'name': bot['name'],
@@ -1100,25 +1813,32 @@ async def handler(websocket):
                 }))
                 
                 db.log_bot_action(bot['bot_id'], 'connected', detail={'servers': server_ids})
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] Bot '{bot['name']}' ({bot['username']}) connected")
+                logger.info("Bot '%s' (%s) connected", bot['name'], bot['username'])
                 continue
             
             # Handle signup
-            if auth_data.get('type') == 'signup':
+            if auth_type == 'signup':
                 username = auth_data.get('username', '').strip()
                 password = auth_data.get('password', '')
                 email = auth_data.get('email', '').strip()
                 invite_code = auth_data.get('invite_code', '').strip()
                 
+                if not await check_auth_rate_limit('signup', f'{peer_ip}'):
+                    await websocket.send_str(json_encode({
+                        'type': 'auth_error',
+                        'message': 'Too many signup attempts. Please try again later.'
+                    }))
+                    continue
+                
                 # Get admin settings
-                admin_settings = db.get_admin_settings()
+                admin_settings = get_cached_admin_settings()
                 allow_registration = admin_settings.get('allow_registration', True)
                 require_invite = admin_settings.get('require_invite', False)
                 require_email_verification = admin_settings.get('require_email_verification', False)
                 
                 # Check if registration is disabled
                 if not allow_registration:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Registration is currently disabled'
                     }))
@@ -1126,7 +1846,7 @@ async def handler(websocket):
                 
                 # Validation
                 if not username or not password or not email:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Username, password, and email are required'
                     }))
@@ -1134,14 +1854,14 @@ async def handler(websocket):
                 
                 # Email validation
                 if not is_valid_email(email):
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid email address format'
                     }))
                     continue
                 
                 if db.get_user(username):
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Username already exists'
                     }))
@@ -1149,7 +1869,7 @@ async def handler(websocket):
                 
                 # Check if email is already registered
                 if db.get_user_by_email(email):
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Email address already registered'
                     }))
@@ -1160,7 +1880,7 @@ async def handler(websocket):
 
                 # Check license user limit
                 if not enforce_limit(len(all_users), 'max_users'):
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': f'User limit reached ({check_limit("max_users")}). Instance admin can upgrade the license.'
                     }))
@@ -1170,33 +1890,34 @@ async def handler(websocket):
 
                 # Require invite if admin setting is enabled OR if users already exist (legacy behavior)
                 if (require_invite or all_users) and not invite_data:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Valid invite code required'
                     }))
                     continue
                 
                 # Determine if email verification should be used
-                email_sender = EmailSender(admin_settings)
+                email_sender = get_email_sender()
                 should_verify_email = require_email_verification and email_sender.is_configured()
                 
                 if should_verify_email:
                     # Email verification is enabled and SMTP is configured
                     # Generate verification code (6-digit number)
-                    verification_code = ''.join(secrets.choice(string.digits) for _ in range(6))
+                    verification_code = f'{secrets.randbelow(10**6):06d}'
                     
                     # Store verification code with 15 minute expiration
                     expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
                     if not db.create_email_verification_code(email, username, verification_code, expires_at):
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'auth_error',
                             'message': 'Failed to generate verification code'
                         }))
                         continue
                     
                     # Send verification email
-                    if not email_sender.send_verification_email(email, username, verification_code):
-                        await websocket.send_str(json.dumps({
+                    if not await asyncio.to_thread(
+                            email_sender.send_verification_email, email, username, verification_code):
+                        await websocket.send_str(json_encode({
                             'type': 'auth_error',
                             'message': 'Failed to send verification email. Please check SMTP settings.'
                         }))
@@ -1204,8 +1925,16 @@ async def handler(websocket):
                         continue
                     
                     # Check for race condition - prevent overwriting existing pending signup
+                    evict_expired_signups()
+                    if len(pending_signups) >= PENDING_SIGNUP_MAX:
+                        await websocket.send_str(json_encode({
+                            'type': 'auth_error',
+                            'message': 'Too many signups in progress. Please try again later.'
+                        }))
+                        db.delete_email_verification_code(email, username)
+                        continue
                     if username in pending_signups:
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'auth_error',
                             'message': 'A signup is already in progress for this username. Please wait or use a different username.'
                         }))
@@ -1214,14 +1943,17 @@ async def handler(websocket):
                     
                     # Store signup data temporarily for verification step
                     inviter_username = invite_data['creator'] if invite_data else None
+                    signup_expires_at = time.monotonic() + PENDING_SIGNUP_TTL
                     pending_signups[username] = {
-                        'password_hash': hash_password(password),
+                        'password_hash': await hash_password_async(password),
                         'email': email,
                         'invite_code': invite_code,
-                        'inviter_username': inviter_username
+                        'inviter_username': inviter_username,
+                        'expires_at': signup_expires_at
                     }
+                    heapq.heappush(_pending_signup_expiry, (signup_expires_at, username))
                     
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'verification_required',
                         'message': 'Verification code sent to your email'
                     }))
@@ -1229,8 +1961,8 @@ async def handler(websocket):
                 else:
                     # Email verification is disabled or SMTP not configured - create account immediately
                     # Create user account in database (email not verified)
-                    if not db.create_user(username, hash_password(password), email, email_verified=False):
-                        await websocket.send_str(json.dumps({
+                    if not db.create_user(username, await hash_password_async(password), email, email_verified=False):
+                        await websocket.send_str(json_encode({
                             'type': 'auth_error',
                             'message': 'Failed to create account'
                         }))
@@ -1242,6 +1974,8 @@ async def handler(websocket):
                         # Add mutual friendship
                         db.add_friend_request(inviter_username, username)
                         db.accept_friend_request(inviter_username, username)
+                        invalidate_allowed_peers(inviter_username, username)
+                        invalidate_friend_requests(inviter_username, username)
                         # Log invite usage
                         if invite_code:
                             db.log_invite_usage(invite_code, username, invite_data.get('server_id'))
@@ -1258,7 +1992,7 @@ async def handler(websocket):
                     # Get user preferences
                     prefs = db.get_user_preferences(username) or {}
                     
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_success',
                         'message': 'Account created successfully',
                         'token': token,
@@ -1266,15 +2000,17 @@ async def handler(websocket):
                         'keybinds': prefs.get('keybinds', {})
                     }))
                     authenticated = True
+                    await _close_superseded_session(username, websocket)
                     clients[websocket] = username
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] New user registered: {username}")
+                    username_to_ws[username] = websocket
+                    logger.info("New user registered: %s", username)
                     
                     # Notify instance admin of new signup if enabled
-                    admin_settings = db.get_admin_settings()
+                    admin_settings = get_cached_admin_settings()
                     if admin_settings.get('notify_admin_on_signup', True):
                         first_user = db.get_first_user()
                         if first_user and first_user != username:
-                            await send_to_user(first_user, json.dumps({
+                            await send_to_user(first_user, json_encode({
                                 'type': 'admin_signup_notification',
                                 'username': username,
                                 'email': email if email else None,
@@ -1284,28 +2020,29 @@ async def handler(websocket):
                     # Notify inviter that they are now friends
                     if inviter_username:
                         new_user_avatar = get_avatar_data(username)
-                        await send_to_user(inviter_username, json.dumps({
+                        await send_to_user(inviter_username, json_encode({
                             'type': 'friend_added',
                             'username': username,
                             **new_user_avatar
                         }))
             
             # Handle email verification
-            elif auth_data.get('type') == 'verify_email':
+            elif auth_type == 'verify_email':
                 username = auth_data.get('username', '').strip()
                 code = auth_data.get('code', '').strip()
                 
                 # Validate verification code format (must be exactly 6 digits)
                 if not code or not code.isdigit() or len(code) != 6:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid verification code format'
                     }))
                     continue
                 
-                # Check if we have pending signup data
+                # Check if we have pending signup data (expired ones count as absent)
+                evict_expired_signups()
                 if username not in pending_signups:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'No pending signup found. Please start signup again.'
                     }))
@@ -1316,8 +2053,8 @@ async def handler(websocket):
                 
                 # Verify the code
                 verification_data = db.get_email_verification_code(email, username)
-                if not verification_data or verification_data['code'] != code:
-                    await websocket.send_str(json.dumps({
+                if not verification_data or not hmac.compare_digest(verification_data['code'], code):
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid or expired verification code'
                     }))
@@ -1329,7 +2066,7 @@ async def handler(websocket):
                     db.delete_email_verification_code(email, username)
                     if username in pending_signups:
                         del pending_signups[username]
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Failed to create account. Please restart signup.'
                     }))
@@ -1345,6 +2082,8 @@ async def handler(websocket):
                     # Add mutual friendship
                     db.add_friend_request(inviter_username, username)
                     db.accept_friend_request(inviter_username, username)
+                    invalidate_friend_requests(inviter_username, username)
+                    invalidate_allowed_peers(inviter_username, username)
                     # Log invite usage
                     if pending['invite_code']:
                         invite_data = db.get_invite_code(pending['invite_code'])
@@ -1363,7 +2102,7 @@ async def handler(websocket):
                 # Get user preferences
                 prefs = db.get_user_preferences(username) or {}
                 
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'auth_success',
                     'message': 'Account created successfully',
                     'token': token,
@@ -1371,15 +2110,17 @@ async def handler(websocket):
                     'keybinds': prefs.get('keybinds', {})
                 }))
                 authenticated = True
+                await _close_superseded_session(username, websocket)
                 clients[websocket] = username
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] New user registered: {username}")
+                username_to_ws[username] = websocket
+                logger.info("New user registered: %s", username)
                 
                 # Notify instance admin of new signup if enabled
-                admin_settings = db.get_admin_settings()
+                admin_settings = get_cached_admin_settings()
                 if admin_settings.get('notify_admin_on_signup', True):
                     first_user = db.get_first_user()
                     if first_user and first_user != username:
-                        await send_to_user(first_user, json.dumps({
+                        await send_to_user(first_user, json_encode({
                             'type': 'admin_signup_notification',
                             'username': username,
                             'email': email if email else None,
@@ -1389,35 +2130,45 @@ async def handler(websocket):
                 # Notify inviter that they are now friends
                 if inviter_username:
                     new_user_avatar = get_avatar_data(username)
-                    await send_to_user(inviter_username, json.dumps({
+                    await send_to_user(inviter_username, json_encode({
                         'type': 'friend_added',
                         'username': username,
                         **new_user_avatar
                     }))
             
             # Handle login
-            elif auth_data.get('type') == 'login':
+            elif auth_type == 'login':
                 username = auth_data.get('username', '').strip()
                 password = auth_data.get('password', '')
                 totp_code = auth_data.get('totp_code', '').strip()  # Optional 2FA code
                 
                 if not username or not password:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Username and password are required'
                     }))
                     continue
                 
+                if not await check_auth_rate_limit('login', f'{peer_ip}:{username}'):
+                    await websocket.send_str(json_encode({
+                        'type': 'auth_error',
+                        'message': 'Too many login attempts. Please try again later.'
+                    }))
+                    continue
+                
                 user = db.get_user(username)
                 if not user:
-                    await websocket.send_str(json.dumps({
+                    # Burn the same bcrypt cost as a real check; skipping it
+                    # leaks username existence through response latency
+                    await verify_password_async(password, _DUMMY_PASSWORD_HASH)
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid username or password'
                     }))
                     continue
                 
-                if not verify_password(password, user['password_hash']):
-                    await websocket.send_str(json.dumps({
+                if not await verify_password_async(password, user['password_hash']):
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid username or password'
                     }))
@@ -1428,15 +2179,19 @@ async def handler(websocket):
                 if twofa_data and twofa_data.get('enabled'):
                     # 2FA is enabled, need to verify code
                     if not totp_code:
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': '2fa_required',
                             'message': 'Two-factor authentication code required'
                         }))
                         continue
                     
-                    # Validate TOTP code format (6 digits) or backup code format (8 alphanumeric)
-                    if not (totp_code.isdigit() and len(totp_code) == 6) and not (totp_code.isalnum() and len(totp_code) == 8):
-                        await websocket.send_str(json.dumps({
+                    # Classify the code format once: TOTP (6 digits) or backup
+                    # code (8 alphanumeric). The previous version re-ran the
+                    # isdigit/isalnum/len checks three times per login.
+                    is_totp_format = len(totp_code) == 6 and totp_code.isdigit()
+                    is_backup_format = len(totp_code) == 8 and totp_code.isalnum()
+                    if not is_totp_format and not is_backup_format:
+                        await websocket.send_str(json_encode({
                             'type': 'auth_error',
                             'message': 'Invalid two-factor authentication code format'
                         }))
@@ -1444,19 +2199,24 @@ async def handler(websocket):
                     
                     # Verify 2FA token or backup code
                     valid_code = False
-                    if totp_code.isdigit() and len(totp_code) == 6:
+                    if is_totp_format:
                         # Try TOTP verification
                         if verify_2fa_token(twofa_data['secret'], totp_code):
                             valid_code = True
+                    else:
+                        # Backup-code path: run a TOTP check that cannot match
+                        # so response timing does not reveal which code format
+                        # was supplied.
+                        verify_2fa_token(twofa_data['secret'], '000000')
                     
-                    if not valid_code and totp_code.isalnum() and len(totp_code) == 8:
+                    if not valid_code and is_backup_format:
                         # Try backup code
                         if db.use_backup_code(username, totp_code):
                             valid_code = True
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} used backup code for 2FA")
+                            logger.info("User %s used backup code for 2FA", username)
                     
                     if not valid_code:
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'auth_error',
                             'message': 'Invalid two-factor authentication code'
                         }))
@@ -1468,7 +2228,7 @@ async def handler(websocket):
                 # Get user preferences
                 prefs = db.get_user_preferences(username) or {}
                 
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'auth_success',
                     'message': 'Login successful',
                     'token': token,
@@ -1476,15 +2236,17 @@ async def handler(websocket):
                     'keybinds': prefs.get('keybinds', {})
                 }))
                 authenticated = True
+                await _close_superseded_session(username, websocket)
                 clients[websocket] = username
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] User logged in: {username}")
+                username_to_ws[username] = websocket
+                logger.info("User logged in: %s", username)
             
             # Handle token-based authentication
-            elif auth_data.get('type') == 'token':
+            elif auth_type == 'token':
                 token = auth_data.get('token', '')
                 
                 if not token:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Token is required'
                     }))
@@ -1493,7 +2255,7 @@ async def handler(websocket):
                 # Verify the token and extract username
                 username = verify_jwt_token(token)
                 if not username:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Invalid or expired token'
                     }))
@@ -1502,7 +2264,7 @@ async def handler(websocket):
                 # Verify user still exists in database
                 user = db.get_user(username)
                 if not user:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'User not found'
                     }))
@@ -1514,7 +2276,7 @@ async def handler(websocket):
                 # Get user preferences
                 prefs = db.get_user_preferences(username) or {}
                 
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'auth_success',
                     'message': 'Token authentication successful',
                     'token': new_token,
@@ -1522,33 +2284,33 @@ async def handler(websocket):
                     'keybinds': prefs.get('keybinds', {})
                 }))
                 authenticated = True
+                await _close_superseded_session(username, websocket)
                 clients[websocket] = username
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] User authenticated via token: {username}")
+                username_to_ws[username] = websocket
+                logger.info("User authenticated via token: %s", username)
             
             # Handle password reset request
-            elif auth_data.get('type') == 'request_password_reset':
+            elif auth_type == 'request_password_reset':
                 identifier = auth_data.get('identifier', '').strip()  # Can be username or email
                 
                 if not identifier:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Username or email is required'
                     }))
                     continue
                 
                 # Check rate limiting to prevent abuse
-                if not check_password_reset_rate_limit(identifier):
-                    await websocket.send_str(json.dumps({
+                if not await check_password_reset_rate_limit_async(identifier):
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Too many password reset requests. Please try again later.'
                     }))
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Rate limit exceeded for password reset: {identifier}")
+                    logger.info("Rate limit exceeded for password reset: %s", identifier)
                     continue
                 
-                # Try to find user by username or email
-                user = db.get_user(identifier)
-                if not user:
-                    user = db.get_user_by_email(identifier)
+                # Try to find user by username or email in one query
+                user = db.get_user_by_username_or_email(identifier)
                 
                 # Always return success to prevent username/email enumeration
                 if user and user.get('email'):
@@ -1559,146 +2321,118 @@ async def handler(websocket):
                     # Save token to database
                     if db.create_password_reset_token(user['username'], reset_token, expires_at):
                         # Send password reset email
-                        email_sender = EmailSender(db.get_admin_settings())
+                        email_sender = get_email_sender()
                         try:
-                            if email_sender.send_password_reset_email(
-                                user['email'], 
-                                user['username'], 
+                            # SMTP I/O off the event loop
+                            if await asyncio.to_thread(
+                                email_sender.send_password_reset_email,
+                                user['email'],
+                                user['username'],
                                 reset_token
                             ):
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset email sent to {user['username']} at {user['email']}")
+                                logger.info("Password reset email sent to %s at %s", user['username'], user['email'])
                             else:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to send password reset email to {user['username']} at {user['email']}")
+                                logger.info("Failed to send password reset email to %s at %s", user['username'], user['email'])
                         except Exception as e:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Error sending password reset email to {user['username']}: {e}")
+                            logger.info("Error sending password reset email to %s: %s", user['username'], e)
                             traceback.print_exc()
                     else:
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create password reset token for {user['username']}")
+                        logger.info("Failed to create password reset token for %s", user['username'])
                 else:
                     if not user:
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset requested for unknown identifier: {identifier}")
+                        logger.info("Password reset requested for unknown identifier: %s", identifier)
                     elif not user.get('email'):
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] User {user.get('username')} has no email address registered")
+                        logger.info("User %s has no email address registered", user.get('username'))
                 
                 # Always return success to prevent enumeration attacks
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'password_reset_requested',
                     'message': 'If an account exists with that email, a password reset link has been sent.'
                 }))
             
             # Handle password reset validation
-            elif auth_data.get('type') == 'validate_reset_token':
+            elif auth_type == 'validate_reset_token':
                 token = auth_data.get('token', '').strip()
                 
                 if not token:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Reset token is required'
                     }))
                     continue
                 
-                # Get token from database
-                token_data = db.get_password_reset_token(token)
-                
-                if not token_data:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'Invalid or expired reset token'
-                    }))
-                    continue
-                
-                # Check if token is expired or used
-                if token_data.get('used'):
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'This reset link has already been used'
-                    }))
-                    continue
+                # Get and validate token
+                token_data, token_error = _validate_reset_token(token)
                 
-                expires_at = datetime.fromisoformat(token_data['expires_at'])
-                if datetime.now(timezone.utc) > expires_at:
-                    await websocket.send_str(json.dumps({
+                if token_error:
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
-                        'message': 'This reset link has expired'
+                        'message': token_error
                     }))
                     continue
                 
                 # Token is valid
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'reset_token_valid',
                     'username': token_data['username']
                 }))
             
             # Handle password reset completion
-            elif auth_data.get('type') == 'reset_password':
+            elif auth_type == 'reset_password':
                 token = auth_data.get('token', '').strip()
                 new_password = auth_data.get('new_password', '')
                 
                 if not token or not new_password:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Token and new password are required'
                     }))
                     continue
                 
                 # Validate password strength
-                if (
-                    len(new_password) < 8
-                    or not re.search(r"[a-z]", new_password)
-                    or not re.search(r"[A-Z]", new_password)
-                    or not re.search(r"[0-9]", new_password)
-                    or not re.search(r"[^A-Za-z0-9]", new_password)
-                ):
-                    await websocket.send_str(json.dumps({
+                if not is_password_strong(new_password):
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Password must be at least 8 characters and include lowercase, uppercase, number, and special character'
                     }))
                     continue
                 
                 # Get and validate token
-                token_data = db.get_password_reset_token(token)
+                token_data, token_error = _validate_reset_token(token)
                 
-                if not token_data or token_data.get('used'):
-                    await websocket.send_str(json.dumps({
+                if token_error:
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
-                        'message': 'Invalid or expired reset token'
-                    }))
-                    continue
-                
-                expires_at = datetime.fromisoformat(token_data['expires_at'])
-                if datetime.now(timezone.utc) > expires_at:
-                    await websocket.send_str(json.dumps({
-                        'type': 'auth_error',
-                        'message': 'This reset link has expired'
+                        'message': token_error
                     }))
                     continue
                 
                 # Update password
-                password_hash = hash_password(new_password)
+                password_hash = await hash_password_async(new_password)
                 if db.update_user_password(token_data['username'], password_hash):
                     # Mark token as used
                     db.mark_reset_token_used(token)
                     
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'password_reset_success',
                         'message': 'Password has been reset successfully'
                     }))
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset for user: {token_data['username']}")
+                    logger.info("Password reset for user: %s", token_data['username'])
                 else:
-                    await websocket.send_str(json.dumps({
+                    await websocket.send_str(json_encode({
                         'type': 'auth_error',
                         'message': 'Failed to reset password'
                     }))
             
             else:
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'auth_error',
                     'message': 'Invalid authentication request'
                 }))
         
         # Check if authentication was successful
         if not authenticated or not username:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Authentication failed or connection closed before completion")
+            logger.info("Authentication failed or connection closed before completion")
             return
         
         # Send user data to authenticated client using helper functions
@@ -1738,7 +2472,9 @@ async def handler(websocket):
             first_user = db.get_first_user()
             is_admin = (username == first_user)
             log_admin_check(username, first_user, is_admin, context="init message")
-            user_data = json.dumps({
+            # The init frame is the largest payload the server builds;
+            # json_encode routes it through orjson when available
+            user_data = json_encode({
                 'type': 'init',
                 'username': username,
                 **current_avatar,
@@ -1757,7 +2493,7 @@ async def handler(websocket):
             await websocket.send_str(user_data)
             
             # Send announcement data and server settings
-            admin_settings = db.get_admin_settings() or {}
+            admin_settings = get_cached_admin_settings() or {}
             set_at = admin_settings.get('announcement_set_at')
             announcement_data = {
                 'type': 'announcement_update',
@@ -1767,48 +2503,54 @@ async def handler(websocket):
                 'set_at': set_at.isoformat() if set_at and hasattr(set_at, 'isoformat') else None,
                 'max_message_length': admin_settings.get('max_message_length', 2000)
             }
-            await websocket.send_str(json.dumps(announcement_data))
+            await websocket.send_str(json_encode(announcement_data))
             
-            # Notify others about new user joining
-            join_message = json.dumps({
-                'type': 'system',
-                'content': f'{username} joined the chat',
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
-            await broadcast(join_message, exclude=websocket)
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} joined chat")
+            # Notify others about the new user joining. The global system
+            # message is legacy UI, so scope it to the user's friends instead
+            # of every connected socket — login latency no longer scales with
+            # total connection count — and skip it when the user presents as
+            # offline.
+            if get_user_status(username) != 'offline':
+                join_message = json_encode({
+                    'type': 'system',
+                    'content': f'{username} joined the chat',
+                    'timestamp': utc_now_isoformat()
+                })
+                friends_online = [f for f in get_allowed_peers(username) if f in username_to_ws]
+                if friends_online:
+                    await asyncio.gather(
+                        *(send_to_user(friend, join_message) for friend in friends_online),
+                        return_exceptions=True)
+            logger.info("%s joined chat", username)
         except Exception as e:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] ERROR: Failed to send init message to {username}: {e}", flush=True)
+            logger.error("ERROR: Failed to send init message to %s: %s", username, e)
             traceback.print_exc()
             # Send error message to client
             try:
-                await websocket.send_str(json.dumps({
+                await websocket.send_str(json_encode({
                     'type': 'error',
                     'message': 'Connection error. Please refresh the page and try again.'
                 }))
             except Exception as send_error:
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] ERROR: Could not send error message: {send_error}", flush=True)
+                logger.error("ERROR: Could not send error message: %s", send_error)
             # Close connection to force client to reconnect
             await websocket.close()
             return
         
         # Handle messages from this client
         async for msg in websocket:
-            if msg.type == web.WSMsgType.TEXT:
+            if msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
                 try:
-                    data = json.loads(msg.data)
+                    data = decode_ws_message(websocket, msg)
                     msg_type = data.get('type')
                     
                     # Respond to client-level keepalive pings immediately
                     if msg_type == 'ping':
-                        await websocket.send_str(json.dumps({'type': 'pong'}))
+                        await websocket.send_str(json_encode({'type': 'pong'}))
                         continue
                     
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Received message type: {msg_type}", flush=True)
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Full data: {data}", flush=True)
-                    
-                    if msg_type == 'request_password_reset':
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: MATCHED request_password_reset at top of handler!")
+                    # Deferred %-formatting: no string is built unless DEBUG is on
+                    logger.debug("Received message type %s: %r", msg_type, data)
                     
                     # ── Slash command handling ──────────────────────────────
                     if msg_type == 'slash_command':
@@ -1818,7 +2560,7 @@ async def handler(websocket):
                         cmd_channel_id = data.get('channel_id', '')
                         
                         if not command_name or not cmd_server_id or not cmd_channel_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid slash command'
                             }))
@@ -1833,14 +2575,14 @@ async def handler(websocket):
                                 break
                         
                         if not matched_cmd:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': f'Unknown command: /{command_name}'
                             }))
                             continue
                         
                         # Send ack to the invoking user
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'slash_command_ack',
                             'command': command_name,
                             'channel_id': cmd_channel_id,
@@ -1859,22 +2601,23 @@ async def handler(websocket):
                         
                         # Send to the specific bot that owns this command
                         target_bot_id = matched_cmd['bot_id']
+                        bot_event_payload = json_encode({
+                            'type': 'bot_event',
+                            'event': 'slash_command',
+                            'data': event_data,
+                            'server_id': cmd_server_id,
+                            'channel_id': cmd_channel_id
+                        })
                         for ws, bi in bot_clients.items():
                             if bi.get('bot_id') == target_bot_id and has_intent(bi.get('intents', []), 'slash_command'):
-                                await ws.send_str(json.dumps({
-                                    'type': 'bot_event',
-                                    'event': 'slash_command',
-                                    'data': event_data,
-                                    'server_id': cmd_server_id,
-                                    'channel_id': cmd_channel_id
-                                }))
+                                await ws.send_str(bot_event_payload)
                                 break
                         
                         db.log_bot_action(target_bot_id, 'slash_command_received',
                                           server_id=cmd_server_id,
                                           detail={'command': command_name, 'user': username})
                         
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Slash command /{command_name} invoked by {username} in {cmd_server_id}/{cmd_channel_id}")
+                        logger.info("Slash command /%s invoked by %s in %s/%s", command_name, username, cmd_server_id, cmd_channel_id)
                         continue
                     
                     if msg_type == 'message':
@@ -1888,18 +2631,19 @@ async def handler(websocket):
                         nonce = data.get('nonce')  # Extract nonce for delivery confirmation
                         
                         # Get admin settings and enforce max message length
-                        admin_settings = db.get_admin_settings()
+                        admin_settings = get_cached_admin_settings()
                         max_length = admin_settings.get('max_message_length', 2000)
                         
                         if len(msg_content) > max_length:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': f'Message exceeds maximum length of {max_length} characters'
                             }))
                             continue
                         
-                        # Get user profile for avatar info
-                        user_profile = db.get_user(username)
+                        # Get user profile for avatar info (cached display row;
+                        # avoids a DB query per sent message)
+                        user_profile = _get_user_card(username)
                         
                         # Fetch reply data if replying to a message
                         reply_data = None
@@ -1923,8 +2667,7 @@ async def handler(websocket):
                                 # Verify server and channel exist and user is member
                                 server = db.get_server(server_id)
                                 if server:
-                                    members = db.get_server_members(server_id)
-                                    member_usernames = {m['username'] for m in members}
+                                    member_usernames = get_cached_server_members(server_id)
                                     if username in member_usernames:
                                         # Enforce send_messages permission (channel override aware)
                                         channel_overrides = db.get_channel_all_overrides(channel_id)
@@ -1933,7 +2676,7 @@ async def handler(websocket):
                                             # Overrides exist — check explicitly
                                             can_send = db.has_channel_permission(server_id, username, channel_id, 'send_messages')
                                         if not can_send and server['owner'] != username:
-                                            await websocket.send_str(json.dumps({
+                                            await websocket.send_str(json_encode({
                                                 'type': 'error',
                                                 'message': 'You do not have permission to send messages in this channel'
                                             }))
@@ -1949,34 +2692,35 @@ async def handler(websocket):
                                                 db.add_mentions(message_id, valid_mentions)
                                                 
                                                 # Send mention notifications
+                                                notification = json_encode({
+                                                    'type': 'mention_notification',
+                                                    'message_id': message_id,
+                                                    'mentioned_by': username,
+                                                    'content': msg_content[:100],  # First 100 chars
+                                                    'context_type': 'server',
+                                                    'context_id': context_id
+                                                })
                                                 for mentioned_user in valid_mentions:
-                                                    notification = {
-                                                        'type': 'mention_notification',
-                                                        'message_id': message_id,
-                                                        'mentioned_by': username,
-                                                        'content': msg_content[:100],  # First 100 chars
-                                                        'context_type': 'server',
-                                                        'context_id': context_id
-                                                    }
-                                                    await send_to_user(mentioned_user, json.dumps(notification))
+                                                    await send_to_user(mentioned_user, notification)
                                         
                                         # Process role mentions — notify all members of each mentioned role
                                         if role_mentions and message_id:
                                             already_notified = set(valid_mentions) if mentions else set()
                                             for role_mention_id in role_mentions:
                                                 role_members = db.get_role_members(role_mention_id)
+                                                role_notification = json_encode({
+                                                    'type': 'role_mention_notification',
+                                                    'message_id': message_id,
+                                                    'mentioned_by': username,
+                                                    'role_id': role_mention_id,
+                                                    'content': msg_content[:100],
+                                                    'context_type': 'server',
+                                                    'context_id': context_id
+                                                })
                                                 for role_member in role_members:
                                                     if role_member != username and role_member not in already_notified and role_member in member_usernames:
                                                         already_notified.add(role_member)
-                                                        await send_to_user(role_member, json.dumps({
-                                                            'type': 'role_mention_notification',
-                                                            'message_id': message_id,
-                                                            'mentioned_by': username,
-                                                            'role_id': role_mention_id,
-                                                            'content': msg_content[:100],
-                                                            'context_type': 'server',
-                                                            'context_id': context_id
-                                                        }))
+                                                        await send_to_user(role_member, role_notification)
                                         
                                         # Send reply notification
                                         if reply_to and replied_to_user and replied_to_user != username:
@@ -1989,7 +2733,7 @@ async def handler(websocket):
                                                 'context_id': context_id,
                                                 'original_message_id': reply_to
                                             }
-                                            await send_to_user(replied_to_user, json.dumps(notification))
+                                            await send_to_user(replied_to_user, json_encode(notification))
                                         
                                         # Create message object with ID and messageKey
                                         msg_obj = create_message_object(
@@ -2014,28 +2758,25 @@ async def handler(websocket):
                                         if nonce:
                                             msg_obj['nonce'] = nonce
                                         
-                                        # Broadcast to server members (filtered by view_channel if overrides set)
-                                        await broadcast_to_server(server_id, json.dumps(msg_obj), channel_id=channel_id)
+                                        # Broadcast to server members (filtered by view_channel
+                                        # if overrides set), serialized once for all recipients
+                                        await broadcast_to_server(server_id, json_encode(msg_obj), channel_id=channel_id)
                                         
                                         # Deliver bot event for message_create
                                         await deliver_bot_event('message_create', msg_obj, server_id=server_id, channel_id=channel_id)
                                         
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} sent message in {server_id}/{channel_id}")
+                                        logger.info("%s sent message in %s/%s", username, server_id, channel_id)
                         
                         elif context == 'dm' and context_id:
                             # Direct message - verify DM exists and user is participant
-                            dm_users = db.get_user_dms(username)
-                            dm_ids = [dm['dm_id'] for dm in dm_users]
-                            if context_id in dm_ids:
+                            # (single indexed lookup instead of scanning every DM)
+                            dm_row = db.get_dm_if_participant(username, context_id)
+                            if dm_row:
                                 # Save message to database and get ID
                                 message_id = db.save_message(username, msg_content, 'dm', context_id, reply_to)
                                 
                                 # Get DM participants
-                                participants = []
-                                for dm in dm_users:
-                                    if dm['dm_id'] == context_id:
-                                        participants = [dm['user1'], dm['user2']]
-                                        break
+                                participants = [dm_row['user1'], dm_row['user2']]
                                 
                                 # Save mentions if any (only DM participants can be mentioned)
                                 if mentions and message_id and participants:
@@ -2044,16 +2785,16 @@ async def handler(websocket):
                                         db.add_mentions(message_id, valid_mentions)
                                         
                                         # Send mention notifications
+                                        notification = json_encode({
+                                            'type': 'mention_notification',
+                                            'message_id': message_id,
+                                            'mentioned_by': username,
+                                            'content': msg_content[:100],  # First 100 chars
+                                            'context_type': 'dm',
+                                            'context_id': context_id
+                                        })
                                         for mentioned_user in valid_mentions:
-                                            notification = {
-                                                'type': 'mention_notification',
-                                                'message_id': message_id,
-                                                'mentioned_by': username,
-                                                'content': msg_content[:100],  # First 100 chars
-                                                'context_type': 'dm',
-                                                'context_id': context_id
-                                            }
-                                            await send_to_user(mentioned_user, json.dumps(notification))
+                                            await send_to_user(mentioned_user, notification)
                                 
                                 # Send reply notification
                                 if reply_to and replied_to_user and replied_to_user != username:
@@ -2066,7 +2807,7 @@ async def handler(websocket):
                                         'context_id': context_id,
                                         'original_message_id': reply_to
                                     }
-                                    await send_to_user(replied_to_user, json.dumps(notification))
+                                    await send_to_user(replied_to_user, json_encode(notification))
                                 
                                 # Create message object with ID and messageKey
                                 msg_obj = create_message_object(
@@ -2088,11 +2829,12 @@ async def handler(websocket):
                                 if nonce:
                                     msg_obj['nonce'] = nonce
                                 
-                                # Send to both participants
+                                # Send to both participants (serialized once)
+                                dm_payload = json_encode(msg_obj)
                                 for participant in participants:
-                                    await send_to_user(participant, json.dumps(msg_obj))
+                                    await send_to_user(participant, dm_payload)
                                 
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] DM from {username} in {context_id}")
+                                logger.info("DM from %s in %s", username, context_id)
                         
                         else:
                             # Global chat (backward compatibility)
@@ -2106,16 +2848,14 @@ async def handler(websocket):
                             )
                             
                             messages.append(msg_obj)
-                            if len(messages) > MAX_HISTORY:
-                                messages.pop(0)
-                            await broadcast(json.dumps(msg_obj))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} sent global message")
+                            await broadcast(json_encode(msg_obj))
+                            logger.info("%s sent global message", username)
                     
-                    elif data.get('type') == 'create_server':
+                    elif msg_type == 'create_server':
                         server_name = data.get('name', '').strip()
                         if server_name:
                             # Get admin settings for server limits
-                            admin_settings = db.get_admin_settings()
+                            admin_settings = get_cached_admin_settings()
                             max_servers_per_user = admin_settings.get('max_servers_per_user', 100)
 
                             # Apply license ceiling
@@ -2127,7 +2867,7 @@ async def handler(websocket):
                             if max_servers_per_user > 0:
                                 user_servers = db.get_user_servers(username)
                                 if len(user_servers) >= max_servers_per_user:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': f'Maximum servers per user ({max_servers_per_user}) reached'
                                     }))
@@ -2137,6 +2877,8 @@ async def handler(websocket):
                             
                             # Create server in database
                             db.create_server(server_id, server_name, username)
+                            invalidate_user_servers(username)
+                            invalidate_server_members(server_id)
                             
                             # Create default "General" category
                             category_id = get_next_category_id()
@@ -2161,8 +2903,9 @@ async def handler(websocket):
                             )
                             # Assign admin role to server owner
                             db.assign_role(server_id, username, admin_role_id)
+                            invalidate_perm_cache(server_id, username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'server_created',
                                 'server': {
                                     'id': server_id,
@@ -2182,14 +2925,14 @@ async def handler(websocket):
                                     ]
                                 }
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created server: {server_name} with Admin role")
+                            logger.info("%s created server: %s with Admin role", username, server_name)
                     
-                    elif data.get('type') == 'join_server':
+                    elif msg_type == 'join_server':
                         server_id = data.get('server_id', '')
                         if server_id in servers:
                             servers[server_id]['members'].add(username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'server_joined',
                                 'server': {
                                     'id': server_id,
@@ -2202,27 +2945,31 @@ async def handler(websocket):
                                 }
                             }))
                     
-                    elif data.get('type') == 'get_channel_history':
+                    elif msg_type == 'get_channel_history':
                         server_id = data.get('server_id', '')
                         channel_id = data.get('channel_id', '')
-                        
+                        # Optional cursor: clients that already hold history send
+                        # the highest message id they have and get a delta back
+                        since_id = data.get('since_id')
+                        if not isinstance(since_id, int):
+                            since_id = None
+
                         # Verify user is member of server
-                        members = db.get_server_members(server_id)
-                        member_usernames = {m['username'] for m in members}
-                        if username in member_usernames:
+                        if username in get_cached_server_members(server_id):
                             # Get messages from database
                             context_id = f"{server_id}/{channel_id}"
-                            channel_messages = db.get_messages('server', context_id, MAX_HISTORY)
+                            channel_messages = await asyncio.to_thread(
+                                db.get_messages, 'server', context_id, MAX_HISTORY,
+                                with_reactions=True, since_id=since_id)
                             
-                            # Get reactions, attachments, and mentions for all messages
+                            # Get attachments and mentions for all messages
+                            # (reactions arrive aggregated in the same query)
                             if channel_messages:
                                 message_ids = [msg['id'] for msg in channel_messages]
-                                reactions_map = db.get_reactions_for_messages(message_ids)
-                                mentions_map = db.get_mentions_for_messages(message_ids)
+                                mentions_map = await asyncio.to_thread(db.get_mentions_for_messages, message_ids)
                                 
-                                # Add reactions, attachments, mentions, role colors, and user status to each message
+                                # Add attachments, mentions, role colors, and user status to each message
                                 for msg in channel_messages:
-                                    msg['reactions'] = reactions_map.get(msg['id'], [])
                                     msg['attachments'] = db.get_message_attachments(msg['id'])
                                     msg['mentions'] = mentions_map.get(msg['id'], [])
                                     msg['user_status'] = get_user_status(msg['username'])
@@ -2231,44 +2978,52 @@ async def handler(websocket):
                                     if role_color:
                                         msg['role_color'] = role_color
                             
-                            await websocket.send_str(json.dumps({
+                            history_frame = {
                                 'type': 'channel_history',
                                 'server_id': server_id,
                                 'channel_id': channel_id,
                                 'messages': channel_messages
-                            }))
+                            }
+                            if since_id is not None:
+                                history_frame['since_id'] = since_id
+                            await websocket.send_str(json_encode(history_frame))
                     
-                    elif data.get('type') == 'get_dm_history':
+                    elif msg_type == 'get_dm_history':
                         dm_id = data.get('dm_id', '')
-                        
+                        since_id = data.get('since_id')
+                        if not isinstance(since_id, int):
+                            since_id = None
+
                         # Verify user is participant in DM
-                        user_dms = db.get_user_dms(username)
-                        dm_ids = [dm['dm_id'] for dm in user_dms]
-                        if dm_id in dm_ids:
+                        if db.get_dm_if_participant(username, dm_id):
                             # Get messages from database
-                            dm_messages = db.get_messages('dm', dm_id, MAX_HISTORY)
+                            dm_messages = await asyncio.to_thread(
+                                db.get_messages, 'dm', dm_id, MAX_HISTORY,
+                                with_reactions=True, since_id=since_id)
                             
-                            # Get reactions, attachments, and mentions for all messages
+                            # Get attachments and mentions for all messages
+                            # (reactions arrive aggregated in the same query)
                             if dm_messages:
                                 message_ids = [msg['id'] for msg in dm_messages]
-                                reactions_map = db.get_reactions_for_messages(message_ids)
-                                mentions_map = db.get_mentions_for_messages(message_ids)
+                                mentions_map = await asyncio.to_thread(db.get_mentions_for_messages, message_ids)
                                 
-                                # Add reactions, attachments, mentions, and user status to each message
+                                # Add attachments, mentions, and user status to each message
                                 for dm_msg in dm_messages:
-                                    dm_msg['reactions'] = reactions_map.get(dm_msg['id'], [])
                                     dm_msg['attachments'] = db.get_message_attachments(dm_msg['id'])
                                     dm_msg['mentions'] = mentions_map.get(dm_msg['id'], [])
                                     dm_msg['user_status'] = get_user_status(dm_msg['username'])
                             
-                            await websocket.send_str(json.dumps({
+                            history_frame = {
                                 'type': 'dm_history',
                                 'dm_id': dm_id,
                                 'messages': dm_messages
-                            }))
+                            }
+                            if since_id is not None:
+                                history_frame['since_id'] = since_id
+                            await websocket.send_str(json_encode(history_frame))
 
                     # ── Typing indicators ──────────────────────────────────────────
-                    elif data.get('type') == 'typing_start':
+                    elif msg_type == 'typing_start':
                         t_context = data.get('context', 'global')
                         t_context_id = data.get('context_id')
                         ctx_key = f"{t_context}:{t_context_id}" if t_context_id else t_context
@@ -2296,7 +3051,7 @@ async def handler(websocket):
                                 old_handle.cancel()
 
                         user_avatar = get_avatar_data(username)
-                        typing_payload = json.dumps({
+                        typing_payload = json_encode({
                             'type': 'user_typing',
                             'username': username,
                             'context': t_context,
@@ -2308,7 +3063,7 @@ async def handler(websocket):
                                                  tc=t_context, tcid=t_context_id):
                             await asyncio.sleep(5)
                             typing_states.pop((u, ck), None)
-                            stop_payload = json.dumps({
+                            stop_payload = json_encode({
                                 'type': 'user_stopped_typing',
                                 'username': u,
                                 'context': tc,
@@ -2323,7 +3078,7 @@ async def handler(websocket):
                         for r in recipients:
                             await send_to_user(r, typing_payload)
 
-                    elif data.get('type') == 'typing_stop':
+                    elif msg_type == 'typing_stop':
                         t_context = data.get('context', 'global')
                         t_context_id = data.get('context_id')
                         ctx_key = f"{t_context}:{t_context_id}" if t_context_id else t_context
@@ -2346,7 +3101,7 @@ async def handler(websocket):
                                     break
                         else:
                             recipients = set()
-                        stop_payload = json.dumps({
+                        stop_payload = json_encode({
                             'type': 'user_stopped_typing',
                             'username': username,
                             'context': t_context,
@@ -2355,8 +3110,116 @@ async def handler(websocket):
                         for r in recipients:
                             await send_to_user(r, stop_payload)
 
+                    elif msg_type == 'mark_as_read':
+                        # Mark messages as read in a specific context
+                        context_type = data.get('context_type')
+                        context_id = data.get('context_id')
+                        
+                        if context_type and context_id:
+                            # Mark messages as read
+                            success = db.mark_messages_as_read(username, context_type, context_id)
+                            
+                            if success:
+                                logger.info("%s marked messages as read in %s:%s", username, context_type, context_id)
+                    
+                    # Message reaction handlers
+                    elif msg_type == 'add_reaction':
+                        message_id = data.get('message_id')
+                        emoji = data.get('emoji', '')
+                        emoji_type = data.get('emoji_type', 'standard')  # 'standard' or 'custom'
+                        
+                        if message_id and emoji:
+                            # Get message to verify authorization and determine context
+                            message = db.get_message(message_id)
+                            if not message:
+                                # Message doesn't exist, silently continue
+                                continue
+                            
+                            # Verify user has access to the message
+                            has_access = False
+                            if message['context_type'] == 'server' and message['context_id']:
+                                server_id = message['context_id'].split('/')[0]
+                                has_access = username in get_cached_server_members(server_id)
+                            elif message['context_type'] == 'dm' and message['context_id']:
+                                dm_row = db.get_dm_if_participant(username, message['context_id'])
+                                has_access = dm_row is not None
+                            
+                            if not has_access:
+                                # User doesn't have access, silently continue
+                                continue
+                            
+                            # Add the reaction
+                            reaction_added = db.add_reaction(message_id, username, emoji, emoji_type)
+                            
+                            # Get all reactions for this message (for both new and duplicate cases)
+                            reactions = db.get_message_reactions(message_id)
+                            
+                            reaction_update = {
+                                'type': 'reaction_added',
+                                'message_id': message_id,
+                                'reactions': reactions
+                            }
+                            
+                            # Broadcast to appropriate context (even for duplicates to keep clients in sync)
+                            if message['context_type'] == 'server' and message['context_id']:
+                                server_id = message['context_id'].split('/')[0]
+                                await broadcast_to_server(server_id, json_encode(reaction_update))
+                            elif message['context_type'] == 'dm' and message['context_id']:
+                                # Send to the DM participants fetched during the access check
+                                reaction_payload = json_encode(reaction_update)
+                                for participant in (dm_row['user1'], dm_row['user2']):
+                                    await send_to_user(participant, reaction_payload)
+                            
+                            if reaction_added:
+                                logger.info("%s added reaction %s to message %s", username, emoji, message_id)
+                    
+                    elif msg_type == 'remove_reaction':
+                        message_id = data.get('message_id')
+                        emoji = data.get('emoji', '')
+                        
+                        if message_id and emoji:
+                            # Get the message first to verify existence and access
+                            message = db.get_message(message_id)
+                            if not message:
+                                # Message does not exist; do not reveal this to the client
+                                continue
+
+                            # For DMs, ensure the user is a participant in the DM thread
+                            dm_row = None
+                            if message.get('context_type') == 'dm' and message.get('context_id'):
+                                dm_row = db.get_dm_if_participant(username, message['context_id'])
+                                if not dm_row:
+                                    # User is not part of this DM; do not allow reaction removal
+                                    continue
+                            
+                            # Remove the reaction only after authorization checks
+                            if db.remove_reaction(message_id, username, emoji):
+                                # Get all reactions for this message
+                                reactions = db.get_message_reactions(message_id)
+                                
+                                reaction_update = {
+                                    'type': 'reaction_removed',
+                                    'message_id': message_id,
+                                    'reactions': reactions
+                                }
+                                
+                                # Broadcast to appropriate context
+                                if message.get('context_type') == 'server' and message.get('context_id'):
+                                    server_id = message['context_id'].split('/')[0]
+                                    await broadcast_to_server(server_id, json_encode(reaction_update))
+                                elif message.get('context_type') == 'dm' and message.get('context_id'):
+                                    # Get DM participants (reuse if already fetched)
+                                    if dm_row is None:
+                                        dm_row = db.get_dm_if_participant(username, message['context_id'])
+                                    reaction_payload = json_encode(reaction_update)
+                                    if dm_row:
+                                        for participant in (dm_row['user1'], dm_row['user2']):
+                                            await send_to_user(participant, reaction_payload)
+                                
+                                logger.info("%s removed reaction %s from message %s", username, emoji, message_id)
+                    
                     # ── Threads ────────────────────────────────────────────────────
-                    elif data.get('type') == 'create_thread':
+                    elif msg_type == 'create_thread':
                         s_id = data.get('server_id', '')
                         parent_msg_id = data.get('parent_message_id')
                         thread_name = data.get('name', '').strip()
@@ -2364,17 +3227,17 @@ async def handler(websocket):
                         invited_users = data.get('invited_users', [])
 
                         if not s_id or not thread_name:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'server_id and name are required'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'server_id and name are required'}))
                             continue
 
                         # Verify user is member of server
                         if not db.is_server_member(username, s_id):
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a server member'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a server member'}))
                             continue
 
                         new_thread_id = get_next_thread_id()
                         if not db.create_thread(new_thread_id, s_id, parent_msg_id, thread_name, is_private, username):
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Failed to create thread'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Failed to create thread'}))
                             continue
 
                         # Seed thread members for private threads
@@ -2405,7 +3268,7 @@ async def handler(websocket):
                             'created_by': username,
                             'is_closed': False,
                         }
-                        thread_created_payload = json.dumps({'type': 'thread_created', 'thread': thread_obj})
+                        thread_created_payload = json_encode({'type': 'thread_created', 'thread': thread_obj})
 
                         if is_private:
                             members_to_notify = db.get_thread_members(new_thread_id)
@@ -2414,13 +3277,13 @@ async def handler(websocket):
                         else:
                             await broadcast_to_server(s_id, thread_created_payload)
 
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created thread {new_thread_id} in {s_id}")
+                        logger.info("%s created thread %s in %s", username, new_thread_id, s_id)
 
-                    elif data.get('type') == 'close_thread':
+                    elif msg_type == 'close_thread':
                         t_id = data.get('thread_id', '')
                         thread = db.get_thread(t_id)
                         if not thread:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Thread not found'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Thread not found'}))
                             continue
 
                         # Only creator or server admin/owner can close
@@ -2430,11 +3293,11 @@ async def handler(websocket):
                                      (server_data and server_data['owner'] == username) or
                                      has_permission(s_id, username, 'administrator'))
                         if not can_close:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'No permission to close thread'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'No permission to close thread'}))
                             continue
 
                         db.close_thread(t_id)
-                        close_payload = json.dumps({'type': 'thread_closed', 'thread_id': t_id, 'server_id': s_id})
+                        close_payload = json_encode({'type': 'thread_closed', 'thread_id': t_id, 'server_id': s_id})
 
                         if thread['is_private']:
                             for tuser in db.get_thread_members(t_id):
@@ -2442,11 +3305,11 @@ async def handler(websocket):
                         else:
                             await broadcast_to_server(s_id, close_payload)
 
-                    elif data.get('type') == 'get_thread_history':
+                    elif msg_type == 'get_thread_history':
                         t_id = data.get('thread_id', '')
                         thread = db.get_thread(t_id)
                         if not thread:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Thread not found'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Thread not found'}))
                             continue
 
                         s_id = thread['server_id']
@@ -2456,20 +3319,19 @@ async def handler(websocket):
                                 # Check if admin/owner
                                 server_data = db.get_server(s_id)
                                 if not (server_data and server_data['owner'] == username) and not has_permission(s_id, username, 'administrator'):
-                                    await websocket.send_str(json.dumps({'type': 'error', 'message': 'No access to this private thread'}))
+                                    await websocket.send_str(json_encode({'type': 'error', 'message': 'No access to this private thread'}))
                                     continue
                         else:
                             if not db.is_server_member(username, s_id):
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a server member'}))
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a server member'}))
                                 continue
 
-                        th_messages = db.get_messages('thread', t_id, MAX_HISTORY)
+                        th_messages = await asyncio.to_thread(
+                            db.get_messages, 'thread', t_id, MAX_HISTORY, with_reactions=True)
                         if th_messages:
                             msg_ids = [m['id'] for m in th_messages]
-                            reactions_map = db.get_reactions_for_messages(msg_ids)
-                            mentions_map = db.get_mentions_for_messages(msg_ids)
+                            mentions_map = await asyncio.to_thread(db.get_mentions_for_messages, msg_ids)
                             for tm in th_messages:
-                                tm['reactions'] = reactions_map.get(tm['id'], [])
                                 tm['attachments'] = db.get_message_attachments(tm['id'])
                                 tm['mentions'] = mentions_map.get(tm['id'], [])
                                 tm['user_status'] = get_user_status(tm['username'])
@@ -2477,7 +3339,7 @@ async def handler(websocket):
                                 if hist_role_color:
                                     tm['role_color'] = hist_role_color
 
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'thread_history',
                             'thread_id': t_id,
                             'thread': {
@@ -2492,10 +3354,10 @@ async def handler(websocket):
                             'messages': th_messages
                         }))
 
-                    elif data.get('type') == 'list_threads':
+                    elif msg_type == 'list_threads':
                         s_id = data.get('server_id', '')
                         if not db.is_server_member(username, s_id):
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a server member'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a server member'}))
                             continue
                         all_threads = db.get_open_threads_for_server(s_id)
                         # Filter private threads: only show those the user is a member of
@@ -2514,14 +3376,14 @@ async def handler(websocket):
                         for th in visible:
                             if hasattr(th.get('created_at'), 'isoformat'):
                                 th['created_at'] = th['created_at'].isoformat()
-                        await websocket.send_str(json.dumps({'type': 'threads_list', 'server_id': s_id, 'threads': visible}))
+                        await websocket.send_str(json_encode({'type': 'threads_list', 'server_id': s_id, 'threads': visible}))
 
-                    elif data.get('type') == 'add_thread_member':
+                    elif msg_type == 'add_thread_member':
                         t_id = data.get('thread_id', '')
                         new_member = data.get('username', '')
                         thread = db.get_thread(t_id)
                         if not thread or not thread['is_private']:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Thread not found or not private'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Thread not found or not private'}))
                             continue
                         s_id = thread['server_id']
                         # Only thread creator or admin/owner can add members
@@ -2530,11 +3392,11 @@ async def handler(websocket):
                                    (server_data and server_data['owner'] == username) or
                                    has_permission(s_id, username, 'administrator'))
                         if not can_add:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'No permission'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'No permission'}))
                             continue
                         if db.is_server_member(new_member, s_id):
                             db.add_thread_member(t_id, new_member, username)
-                            await send_to_user(new_member, json.dumps({
+                            await send_to_user(new_member, json_encode({
                                 'type': 'thread_created',
                                 'thread': {
                                     'thread_id': t_id,
@@ -2547,13 +3409,13 @@ async def handler(websocket):
                                 }}))
 
                     # ── Thread messages ────────────────────────────────────────────
-                    elif data.get('type') == 'thread_message':
+                    elif msg_type == 'thread_message':
                         t_id = data.get('thread_id', '')
                         th_content = data.get('content', '').strip()
                         th_nonce = data.get('nonce')
                         thread = db.get_thread(t_id)
                         if not thread or thread['is_closed']:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Thread not found or closed'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Thread not found or closed'}))
                             continue
                         s_id = thread['server_id']
                         if not th_content:
@@ -2561,20 +3423,20 @@ async def handler(websocket):
                         # Access check
                         if thread['is_private']:
                             if not db.is_thread_member(t_id, username):
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'No access'}))
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'No access'}))
                                 continue
                         else:
                             if not db.is_server_member(username, s_id):
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a server member'}))
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a server member'}))
                                 continue
 
-                        admin_settings = db.get_admin_settings()
+                        admin_settings = get_cached_admin_settings()
                         max_length = admin_settings.get('max_message_length', 2000)
                         if len(th_content) > max_length:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': f'Message too long (max {max_length})'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': f'Message too long (max {max_length})'}))
                             continue
 
-                        user_profile = db.get_user(username)
+                        user_profile = _get_user_card(username)
                         th_msg_id = db.save_message(username, th_content, 'thread', t_id)
                         th_msg_obj = create_message_object(
                             username=username,
@@ -2592,7 +3454,7 @@ async def handler(websocket):
                         if thread_role_color:
                             th_msg_obj['role_color'] = thread_role_color
 
-                        thread_msg_payload = json.dumps(th_msg_obj)
+                        thread_msg_payload = json_encode(th_msg_obj)
                         if thread['is_private']:
                             for tuser in db.get_thread_members(t_id):
                                 await send_to_user(tuser, thread_msg_payload)
@@ -2600,14 +3462,14 @@ async def handler(websocket):
                             await broadcast_to_server(s_id, thread_msg_payload)
 
                     # ── Pin / Unpin ────────────────────────────────────────────────
-                    elif data.get('type') == 'pin_message':
+                    elif msg_type == 'pin_message':
                         pin_msg_id = data.get('message_id')
                         if not pin_msg_id:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'message_id required'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'message_id required'}))
                             continue
                         message_row = db.get_message(pin_msg_id)
                         if not message_row:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Message not found'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Message not found'}))
                             continue
                         # Permission: server member can pin in server; DM participant can pin in DM
                         ctx_type = message_row['context_type']
@@ -2615,16 +3477,14 @@ async def handler(websocket):
                         if ctx_type == 'server':
                             s_id = ctx_id.split('/')[0]
                             if not db.is_server_member(username, s_id):
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a server member'}))
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a server member'}))
                                 continue
                         elif ctx_type == 'dm':
-                            user_dms = db.get_user_dms(username)
-                            dm_ids = [d['dm_id'] for d in user_dms]
-                            if ctx_id not in dm_ids:
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a DM participant'}))
+                            if not db.get_dm_if_participant(username, ctx_id):
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a DM participant'}))
                                 continue
                         if db.pin_message(pin_msg_id, username):
-                            pin_payload = json.dumps({
+                            pin_payload = json_encode({
                                 'type': 'message_pinned',
                                 'message_id': pin_msg_id,
                                 'pinned_by': username,
@@ -2638,30 +3498,28 @@ async def handler(websocket):
                             else:
                                 await websocket.send_str(pin_payload)
 
-                    elif data.get('type') == 'unpin_message':
+                    elif msg_type == 'unpin_message':
                         unpin_msg_id = data.get('message_id')
                         if not unpin_msg_id:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'message_id required'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'message_id required'}))
                             continue
                         message_row = db.get_message(unpin_msg_id)
                         if not message_row:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'Message not found'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'Message not found'}))
                             continue
                         ctx_type = message_row['context_type']
                         ctx_id = message_row['context_id']
                         if ctx_type == 'server':
                             s_id = ctx_id.split('/')[0]
                             if not db.is_server_member(username, s_id):
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a server member'}))
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a server member'}))
                                 continue
                         elif ctx_type == 'dm':
-                            user_dms = db.get_user_dms(username)
-                            dm_ids = [d['dm_id'] for d in user_dms]
-                            if ctx_id not in dm_ids:
-                                await websocket.send_str(json.dumps({'type': 'error', 'message': 'Not a DM participant'}))
+                            if not db.get_dm_if_participant(username, ctx_id):
+                                await websocket.send_str(json_encode({'type': 'error', 'message': 'Not a DM participant'}))
                                 continue
                         if db.unpin_message(unpin_msg_id):
-                            unpin_payload = json.dumps({
+                            unpin_payload = json_encode({
                                 'type': 'message_unpinned',
                                 'message_id': unpin_msg_id,
                                 'context_type': ctx_type,
@@ -2674,7 +3532,7 @@ async def handler(websocket):
                             else:
                                 await websocket.send_str(unpin_payload)
 
-                    elif data.get('type') == 'get_pinned_messages':
+                    elif msg_type == 'get_pinned_messages':
                         pin_ctx_type = data.get('context_type', '')
                         pin_ctx_id = data.get('context_id', '')
                         # Permission check
@@ -2683,13 +3541,11 @@ async def handler(websocket):
                             s_id = pin_ctx_id.split('/')[0]
                             can_view = db.is_server_member(username, s_id)
                         elif pin_ctx_type == 'dm':
-                            user_dms = db.get_user_dms(username)
-                            dm_ids = [d['dm_id'] for d in user_dms]
-                            can_view = pin_ctx_id in dm_ids
+                            can_view = db.get_dm_if_participant(username, pin_ctx_id) is not None
                         elif pin_ctx_type == 'global':
                             can_view = True
                         if not can_view:
-                            await websocket.send_str(json.dumps({'type': 'error', 'message': 'No access'}))
+                            await websocket.send_str(json_encode({'type': 'error', 'message': 'No access'}))
                             continue
                         pinned = db.get_pinned_messages(pin_ctx_type, pin_ctx_id)
                         # Enrich with attachments and reactions
@@ -2699,19 +3555,19 @@ async def handler(websocket):
                             for pm in pinned:
                                 pm['reactions'] = reactions_map.get(pm['id'], [])
                                 pm['attachments'] = db.get_message_attachments(pm['id'])
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'pinned_messages',
                             'context_type': pin_ctx_type,
                             'context_id': pin_ctx_id,
                             'messages': pinned
                         }))
 
-                    elif data.get('type') == 'edit_message':
+                    elif msg_type == 'edit_message':
                         message_id = data.get('message_id')
                         new_content = data.get('content', '').strip()
                         
                         if not message_id or not new_content:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid message edit request'
                             }))
@@ -2720,7 +3576,7 @@ async def handler(websocket):
                         # Get the message
                         message = db.get_message(message_id)
                         if not message:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Message not found'
                             }))
@@ -2728,46 +3584,25 @@ async def handler(websocket):
                         
                         # Check if message is deleted
                         if message.get('deleted'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Cannot edit a deleted message'
                             }))
                             continue
                         
                         # Check permissions
-                        can_edit = False
-                        
-                        # Users can always edit their own messages
-                        if message['username'] == username:
-                            can_edit = True
-                        # Check server permissions for editing others' messages
-                        elif message['context_type'] == 'server' and message['context_id']:
-                            server_id = message['context_id'].split('/')[0]
-                            server = db.get_server(server_id)
-                            if server:
-                                # Server owner can edit any message
-                                if username == server['owner']:
-                                    can_edit = True
-                                else:
-                                    # Check member permissions
-                                    members = db.get_server_members(server_id)
-                                    for member in members:
-                                        if member['username'] == username:
-                                            can_edit = member.get('can_edit_messages', False)
-                                            break
-                        
-                        if not can_edit:
-                            await websocket.send_str(json.dumps({
+                        if not check_message_permission(username, message, 'edit'):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to edit this message'
                             }))
                             continue
                         
                         # Enforce max message length
-                        admin_settings = db.get_admin_settings()
+                        admin_settings = get_cached_admin_settings()
                         max_length = admin_settings.get('max_message_length', 2000)
                         if len(new_content) > max_length:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': f'Message exceeds maximum length of {max_length} characters'
                             }))
@@ -2790,24 +3625,24 @@ async def handler(websocket):
                             
                             if message['context_type'] == 'server':
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(edit_notification))
+                                await broadcast_to_server(server_id, json_encode(edit_notification))
                             elif message['context_type'] == 'dm':
                                 # Send to both DM participants using helper
-                                await broadcast_to_dm_participants(username, message['context_id'], json.dumps(edit_notification))
+                                await broadcast_to_dm_participants(username, message['context_id'], json_encode(edit_notification))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} edited message {message_id}")
+                            logger.info("%s edited message %s", username, message_id)
                         else:
                             # Edit failed - could be due to message being deleted by another user
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to edit message. The message may have been deleted.'
                             }))
                     
-                    elif data.get('type') == 'delete_message':
+                    elif msg_type == 'delete_message':
                         message_id = data.get('message_id')
                         
                         if not message_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid message delete request'
                             }))
@@ -2816,7 +3651,7 @@ async def handler(websocket):
                         # Get the message
                         message = db.get_message(message_id)
                         if not message:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Message not found'
                             }))
@@ -2824,28 +3659,15 @@ async def handler(websocket):
                         
                         # Check if message is already deleted
                         if message.get('deleted'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Message is already deleted'
                             }))
                             continue
                         
                         # Check permissions
-                        can_delete = False
-                        
-                        # Users can always delete their own messages
-                        if message['username'] == username:
-                            can_delete = True
-                        # Check server permissions for deleting others' messages
-                        elif message['context_type'] == 'server' and message['context_id']:
-                            server_id = message['context_id'].split('/')[0]
-                            server = db.get_server(server_id)
-                            if server:
-                                # Check if user has delete_messages permission (includes admins)
-                                can_delete = has_permission(server_id, username, 'delete_messages')
-                        
-                        if not can_delete:
-                            await websocket.send_str(json.dumps({
+                        if not check_message_permission(username, message, 'delete'):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to delete this message'
                             }))
@@ -2853,34 +3675,27 @@ async def handler(websocket):
                         
                         # Delete the message
                         if db.delete_message(message_id):
-                            # Broadcast the deletion to relevant users
-                            delete_notification = {
-                                'type': 'message_deleted',
-                                'message_id': message_id,
-                                'context_type': message['context_type'],
-                                'context_id': message['context_id']
-                            }
-                            
+                            # Queue the deletion; consecutive deletions within
+                            # the flush window coalesce into one frame
                             if message['context_type'] == 'server':
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(delete_notification))
+                                queue_deletion_broadcast(('server', server_id), message_id)
                             elif message['context_type'] == 'dm':
-                                # Send to both DM participants using helper
-                                await broadcast_to_dm_participants(username, message['context_id'], json.dumps(delete_notification))
+                                queue_deletion_broadcast(('dm', username, message['context_id']), message_id)
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted message {message_id}")
+                            logger.info("%s deleted message %s", username, message_id)
                         else:
                             # Delete failed - message may already be deleted
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to delete message. It may already be deleted.'
                             }))
                     
-                    elif data.get('type') == 'delete_attachment':
+                    elif msg_type == 'delete_attachment':
                         attachment_id = data.get('attachment_id')
                         
                         if not attachment_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid attachment delete request'
                             }))
@@ -2889,7 +3704,7 @@ async def handler(websocket):
                         # Get the attachment to find its message
                         attachment = db.get_attachment(attachment_id)
                         if not attachment:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Attachment not found'
                             }))
@@ -2898,36 +3713,15 @@ async def handler(websocket):
                         # Get the message to check permissions
                         message = db.get_message(attachment['message_id'])
                         if not message:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Associated message not found'
                             }))
                             continue
                         
                         # Check permissions (same logic as message deletion)
-                        can_delete = False
-                        
-                        # Users can always delete attachments from their own messages
-                        if message['username'] == username:
-                            can_delete = True
-                        # Check server permissions for deleting others' attachments
-                        elif message['context_type'] == 'server' and message['context_id']:
-                            server_id = message['context_id'].split('/')[0]
-                            server = db.get_server(server_id)
-                            if server:
-                                # Server owner can delete any attachment
-                                if username == server['owner']:
-                                    can_delete = True
-                                else:
-                                    # Check member permissions
-                                    members = db.get_server_members(server_id)
-                                    for member in members:
-                                        if member['username'] == username:
-                                            can_delete = member.get('can_delete_messages', False)
-                                            break
-                        
-                        if not can_delete:
-                            await websocket.send_str(json.dumps({
+                        if not check_message_permission(username, message, 'delete'):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to delete this attachment'
                             }))
@@ -2946,61 +3740,66 @@ async def handler(websocket):
                             
                             if message['context_type'] == 'server':
                                 server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(delete_notification))
+                                await broadcast_to_server(server_id, json_encode(delete_notification))
                             elif message['context_type'] == 'dm':
                                 # Send to both DM participants
-                                await broadcast_to_dm_participants(username, message['context_id'], json.dumps(delete_notification))
+                                await broadcast_to_dm_participants(username, message['context_id'], json_encode(delete_notification))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted attachment {attachment_id}")
+                            logger.info("%s deleted attachment %s", username, attachment_id)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to delete attachment'
                             }))
                     
-                    elif data.get('type') == 'search_users':
+                    elif msg_type == 'search_users':
                         query = data.get('query', '').strip().lower()
                         results = []
                         if query:
-                            all_users = db.get_all_users()
-                            friends = set(db.get_friends(username))
-                            requests_sent = set(db.get_friend_requests_sent(username))
-                            requests_received = set(db.get_friend_requests_received(username))
-                            
-                            for user in all_users:
-                                if query in user.lower() and user != username:
-                                    avatar_data = get_avatar_data(user)
-                                    results.append({
-                                        'username': user,
-                                        'is_friend': user in friends,
-                                        'request_sent': user in requests_sent,
-                                        'request_received': user in requests_received,
-                                        **avatar_data
-                                    })
+                            # Filter and truncate in SQL instead of scanning
+                            # every username in Python
+                            matches = db.search_usernames(query, username, limit=20)
+                            friends = get_allowed_peers(username)
+                            requests_sent, requests_received = get_friend_request_sets(username)
+                            
+                            # One bulk query for all hits instead of a user row
+                            # per result; prime the card cache while we're at it
+                            users_by_name = db.get_users_bulk(matches)
+                            for name, row in users_by_name.items():
+                                _cache_user_card(name, row)
+                            
+                            for user in matches:
+                                avatar_data = _avatar_fields(users_by_name.get(user))
+                                results.append({
+                                    'username': user,
+                                    'is_friend': user in friends,
+                                    'request_sent': user in requests_sent,
+                                    'request_received': user in requests_received,
+                                    **avatar_data
+                                })
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'search_results',
-                            'results': results[:20]  # Limit to 20 results
+                            'results': results
                         }))
                     
-                    elif data.get('type') == 'add_friend':
+                    elif msg_type == 'add_friend':
                         # Send friend request
                         friend_username = data.get('username', '').strip()
                         
                         if db.get_user(friend_username) and friend_username != username:
-                            friends = set(db.get_friends(username))
-                            requests_sent = set(db.get_friend_requests_sent(username))
-                            requests_received = set(db.get_friend_requests_received(username))
+                            friends = get_allowed_peers(username)
+                            requests_sent, requests_received = get_friend_request_sets(username)
                             
                             # Check if already friends
                             if friend_username in friends:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Already friends with this user'
                                 }))
                             # Check if request already sent
                             elif friend_username in requests_sent:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Friend request already sent'
                                 }))
@@ -3008,10 +3807,12 @@ async def handler(websocket):
                             elif friend_username in requests_received:
                                 # Auto-accept their pending request
                                 db.accept_friend_request(friend_username, username)
+                                invalidate_allowed_peers(friend_username, username)
+                                invalidate_friend_requests(friend_username, username)
                                 
                                 friend_avatar = get_avatar_data(friend_username)
                                 friend_profile = get_profile_data(friend_username)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'friend_added',
                                     'username': friend_username,
                                     **friend_avatar,
@@ -3021,20 +3822,21 @@ async def handler(websocket):
                                 # Notify the other user
                                 user_avatar = get_avatar_data(username)
                                 user_profile = get_profile_data(username)
-                                await send_to_user(friend_username, json.dumps({
+                                await send_to_user(friend_username, json_encode({
                                     'type': 'friend_added',
                                     'username': username,
                                     **user_avatar,
                                     **user_profile
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} and {friend_username} are now friends (mutual request)")
+                                logger.info("%s and %s are now friends (mutual request)", username, friend_username)
                             else:
                                 # Send friend request
                                 db.add_friend_request(username, friend_username)
+                                invalidate_friend_requests(username, friend_username)
                                 
                                 friend_avatar = get_avatar_data(friend_username)
                                 friend_profile = get_profile_data(friend_username)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'friend_request_sent',
                                     'username': friend_username,
                                     **friend_avatar,
@@ -3044,38 +3846,42 @@ async def handler(websocket):
                                 # Notify the other user
                                 user_avatar = get_avatar_data(username)
                                 user_profile = get_profile_data(username)
-                                await send_to_user(friend_username, json.dumps({
+                                await send_to_user(friend_username, json_encode({
                                     'type': 'friend_request_received',
                                     'username': username,
                                     **user_avatar,
                                     **user_profile
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} sent friend request to {friend_username}")
+                                logger.info("%s sent friend request to %s", username, friend_username)
                     
-                    elif data.get('type') == 'remove_friend':
+                    elif msg_type == 'remove_friend':
                         friend_username = data.get('username', '').strip()
                         
-                        friends = set(db.get_friends(username))
+                        friends = get_allowed_peers(username)
                         if friend_username in friends:
                             db.remove_friendship(username, friend_username)
+                            invalidate_allowed_peers(username, friend_username)
+                            invalidate_friend_requests(username, friend_username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'friend_removed',
                                 'username': friend_username
                             }))
                     
-                    elif data.get('type') == 'approve_friend_request':
+                    elif msg_type == 'approve_friend_request':
                         # Approve a friend request
                         requester_username = data.get('username', '').strip()
                         
-                        requests_received = set(db.get_friend_requests_received(username))
+                        requests_received = get_friend_request_sets(username)[1]
                         if requester_username in requests_received:
                             # Accept the request
                             db.accept_friend_request(requester_username, username)
+                            invalidate_allowed_peers(requester_username, username)
+                            invalidate_friend_requests(requester_username, username)
                             
                             requester_avatar = get_avatar_data(requester_username)
                             requester_profile = get_profile_data(requester_username)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'friend_request_approved',
                                 'username': requester_username,
                                 **requester_avatar,
@@ -3085,56 +3891,58 @@ async def handler(websocket):
                             # Notify the requester
                             user_avatar = get_avatar_data(username)
                             user_profile = get_profile_data(username)
-                            await send_to_user(requester_username, json.dumps({
+                            await send_to_user(requester_username, json_encode({
                                 'type': 'friend_request_accepted',
                                 'username': username,
                                 **user_avatar,
                                 **user_profile
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} approved friend request from {requester_username}")
+                            logger.info("%s approved friend request from %s", username, requester_username)
                     
-                    elif data.get('type') == 'deny_friend_request':
+                    elif msg_type == 'deny_friend_request':
                         # Deny a friend request
                         requester_username = data.get('username', '').strip()
                         
-                        requests_received = set(db.get_friend_requests_received(username))
+                        requests_received = get_friend_request_sets(username)[1]
                         if requester_username in requests_received:
                             # Remove the request
                             db.remove_friendship(requester_username, username)
+                            invalidate_friend_requests(requester_username, username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'friend_request_denied',
                                 'username': requester_username
                             }))
                             
                             # Optionally notify the requester (not doing this for privacy)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} denied friend request from {requester_username}")
+                            logger.info("%s denied friend request from %s", username, requester_username)
                     
-                    elif data.get('type') == 'cancel_friend_request':
+                    elif msg_type == 'cancel_friend_request':
                         # Cancel a sent friend request
                         friend_username = data.get('username', '').strip()
                         
-                        requests_sent = set(db.get_friend_requests_sent(username))
+                        requests_sent = get_friend_request_sets(username)[0]
                         if friend_username in requests_sent:
                             # Remove the request
                             db.remove_friendship(username, friend_username)
+                            invalidate_friend_requests(username, friend_username)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'friend_request_cancelled',
                                 'username': friend_username
                             }))
                             
                             # Notify the other user
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, json_encode({
                                 'type': 'friend_request_cancelled_by_sender',
                                 'username': username
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} cancelled friend request to {friend_username}")
+                            logger.info("%s cancelled friend request to %s", username, friend_username)
                     
-                    elif data.get('type') == 'start_dm':
+                    elif msg_type == 'start_dm':
                         friend_username = data.get('username', '').strip()
                         
-                        friends = set(db.get_friends(username))
+                        friends = get_allowed_peers(username)
                         if db.get_user(friend_username) and friend_username in friends:
                             dm_id = get_or_create_dm(username, friend_username)
                             
@@ -3149,12 +3957,12 @@ async def handler(websocket):
                                     **friend_profile
                                 }
                             }
-                            await websocket.send_str(json.dumps(dm_info))
+                            await websocket.send_str(json_encode(dm_info))
                             
                             # Notify the other user
                             user_avatar = get_avatar_data(username)
                             user_profile = get_profile_data(username)
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, json_encode({
                                 'type': 'dm_started',
                                 'dm': {
                                     'id': dm_id,
@@ -3164,25 +3972,13 @@ async def handler(websocket):
                                 }
                             }))
                     
-                    elif data.get('type') == 'mark_as_read':
-                        # Mark messages as read in a specific context
-                        context_type = data.get('context_type')
-                        context_id = data.get('context_id')
-                        
-                        if context_type and context_id:
-                            # Mark messages as read
-                            success = db.mark_messages_as_read(username, context_type, context_id)
-                            
-                            if success:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} marked messages as read in {context_type}:{context_id}")
-                    
-                    elif data.get('type') == 'generate_invite':
+                    elif msg_type == 'generate_invite':
                         # Generate a new instance invite code (admin only)
                         first_user = db.get_first_user()
                         is_admin = (username == first_user)
                         
                         if not is_admin:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the instance administrator can generate invite codes'
                             }))
@@ -3194,22 +3990,22 @@ async def handler(websocket):
                         invite_code = generate_invite_code()
                         db.create_invite_code(invite_code, username, 'global', max_uses=max_uses, description=description)
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'invite_code',
                             'code': invite_code,
                             'max_uses': max_uses,
                             'description': description,
                             'message': f'Invite code generated: {invite_code}'
                         }))
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} generated invite code: {invite_code} (max_uses: {max_uses})")
+                        logger.info("%s generated invite code: %s (max_uses: %s)", username, invite_code, max_uses)
                     
-                    elif data.get('type') == 'list_instance_invites':
+                    elif msg_type == 'list_instance_invites':
                         # List all instance invite codes (admin only)
                         first_user = db.get_first_user()
                         is_admin = (username == first_user)
                         
                         if not is_admin:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the instance administrator can view invite codes'
                             }))
@@ -3225,18 +4021,18 @@ async def handler(websocket):
                                 item['created_at'] = item['created_at'].isoformat()
                             serialized_invites.append(item)
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'instance_invites_list',
                             'invites': serialized_invites
                         }))
                     
-                    elif data.get('type') == 'get_instance_invite_usage':
+                    elif msg_type == 'get_instance_invite_usage':
                         # Get instance invite usage logs (admin only)
                         first_user = db.get_first_user()
                         is_admin = (username == first_user)
                         
                         if not is_admin:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the instance administrator can view invite usage'
                             }))
@@ -3254,18 +4050,18 @@ async def handler(websocket):
                                     item[key] = value.isoformat()
                             serialized_logs.append(item)
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'instance_invite_usage',
                             'usage_logs': serialized_logs
                         }))
                     
-                    elif data.get('type') == 'revoke_instance_invite':
+                    elif msg_type == 'revoke_instance_invite':
                         # Revoke (deactivate) an instance invite code (admin only)
                         first_user = db.get_first_user()
                         is_admin = (username == first_user)
                         
                         if not is_admin:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the instance administrator can revoke invite codes'
                             }))
@@ -3274,27 +4070,27 @@ async def handler(websocket):
                         code = data.get('code', '').strip()
                         if code:
                             db.deactivate_invite_code(code)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'invite_revoked',
                                 'code': code,
                                 'message': 'Invite code has been revoked'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} revoked instance invite: {code}")
+                            logger.info("%s revoked instance invite: %s", username, code)
                     
                     # Admin configuration handlers
-                    elif data.get('type') == 'check_admin':
+                    elif msg_type == 'check_admin':
                         first_user = db.get_first_user()
                         is_admin = (username == first_user)
                         log_admin_check(username, first_user, is_admin, context="check_admin request")
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'admin_status',
                             'is_admin': is_admin,
                             'first_user': first_user
                         }))
                     
                     # 2FA Management handlers
-                    elif data.get('type') == 'setup_2fa':
+                    elif msg_type == 'setup_2fa':
                         # Generate new 2FA secret
                         secret = generate_2fa_secret()
                         backup_codes = generate_backup_codes()
@@ -3308,7 +4104,7 @@ async def handler(websocket):
                             # NOTE: The raw 2FA secret is sent only for initial authenticator setup.
                             # Clients must NOT store this value and should use it solely to configure
                             # the authenticator app (e.g., via QR code generation) and then discard it.
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': '2fa_setup',
                                 'secret': secret,
                                 'qr_code': qr_code,
@@ -3316,17 +4112,17 @@ async def handler(websocket):
                                 'warning': 'The 2FA secret is sensitive. Do NOT store it; use it only to set up your authenticator app and then discard it.'
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to setup 2FA'
                             }))
                     
-                    elif data.get('type') == 'verify_2fa_setup':
+                    elif msg_type == 'verify_2fa_setup':
                         # Verify the code and enable 2FA
                         totp_code = data.get('code', '').strip()
                         
                         if not totp_code:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Verification code required'
                             }))
@@ -3335,7 +4131,7 @@ async def handler(websocket):
                         # Get the secret
                         twofa_data = db.get_2fa_secret(username)
                         if not twofa_data:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No 2FA setup found. Please start setup again.'
                             }))
@@ -3345,29 +4141,29 @@ async def handler(websocket):
                         if verify_2fa_token(twofa_data['secret'], totp_code):
                             # Enable 2FA
                             if db.enable_2fa(username):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': '2fa_enabled',
                                     'message': 'Two-factor authentication enabled successfully'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] 2FA enabled for user: {username}")
+                                logger.info("2FA enabled for user: %s", username)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to enable 2FA'
                                 }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid verification code'
                             }))
                     
-                    elif data.get('type') == 'disable_2fa':
+                    elif msg_type == 'disable_2fa':
                         # Require password and 2FA code to disable
                         password = data.get('password', '')
                         totp_code = data.get('code', '').strip()
                         
                         if not password:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Password required to disable 2FA'
                             }))
@@ -3375,8 +4171,8 @@ async def handler(websocket):
                         
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -3386,7 +4182,7 @@ async def handler(websocket):
                         twofa_data = db.get_2fa_secret(username)
                         if twofa_data and twofa_data.get('enabled'):
                             if not totp_code:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': '2FA code or backup code required to disable 2FA'
                                 }))
@@ -3399,7 +4195,7 @@ async def handler(websocket):
                                 valid_code = True
                             
                             if not valid_code:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Invalid 2FA code'
                                 }))
@@ -3407,30 +4203,30 @@ async def handler(websocket):
                         
                         # Disable 2FA
                         if db.disable_2fa(username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': '2fa_disabled',
                                 'message': 'Two-factor authentication disabled'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] 2FA disabled for user: {username}")
+                            logger.info("2FA disabled for user: %s", username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to disable 2FA'
                             }))
                     
-                    elif data.get('type') == 'get_2fa_status':
+                    elif msg_type == 'get_2fa_status':
                         # Get current 2FA status
                         twofa_data = db.get_2fa_secret(username)
                         enabled = twofa_data is not None and twofa_data.get('enabled', False)
                         
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': '2fa_status',
                             'enabled': enabled
                         }))
                     
-                    elif data.get('type') == 'get_admin_settings':
+                    elif msg_type == 'get_admin_settings':
                         # Load settings from database
-                        settings = db.get_admin_settings()
+                        settings = get_cached_admin_settings()
                         
                         # Serialize datetime fields to prevent JSON encoding errors
                         set_at = settings.get('announcement_set_at')
@@ -3452,7 +4248,7 @@ async def handler(websocket):
                                 'sso_enabled': settings.get('sso_enabled', False),
                                 'sso_provider': settings.get('sso_provider', None),
                             }
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'admin_settings',
                                 'settings': filtered_settings
                             }))
@@ -3463,16 +4259,16 @@ async def handler(websocket):
                             for secret_key in ['sso_oidc_client_secret', 'sso_ldap_bind_password', 'scim_bearer_token']:
                                 if admin_settings.get(secret_key):
                                     admin_settings[secret_key] = '••••••••'
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'admin_settings',
                                 'settings': admin_settings
                             }))
                     
-                    elif data.get('type') == 'save_admin_settings':
+                    elif msg_type == 'save_admin_settings':
                         # Verify user is admin
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Access denied. Admin only.'
                             }))
@@ -3481,7 +4277,7 @@ async def handler(websocket):
                             
                             # Fetch current settings once — used for diffing in the license gates
                             from license_validator import check_feature_access as _check_feat, license_validator as _lv
-                            current_settings = db.get_admin_settings()
+                            current_settings = get_cached_admin_settings()
                             
                             # SSO / SCIM license gate — only fires when values actually change
                             sso_fields = {'sso_enabled', 'sso_provider', 'sso_oidc_issuer_url',
@@ -3495,7 +4291,7 @@ async def handler(websocket):
                                 for k in sso_fields if k in settings
                             )
                             if has_sso_changes and not _check_feat('sso'):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'SSO/SCIM configuration requires a paid license tier.'
                                 }))
@@ -3508,7 +4304,7 @@ async def handler(websocket):
                                 for k in branding_fields if k in settings
                             )
                             if has_branding_changes and _lv.get_tier() == 'community':
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Custom server branding requires a paid license.'
                                 }))
@@ -3524,7 +4320,7 @@ async def handler(websocket):
                                 # Validate message length
                                 message = settings.get('announcement_message', '')
                                 if len(message) > 500:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Announcement message cannot exceed 500 characters'
                                     }))
@@ -3533,7 +4329,7 @@ async def handler(websocket):
                                 # Validate duration — default to 60 if missing or null
                                 duration = settings.get('announcement_duration_minutes') or 60
                                 if not isinstance(duration, (int, float)):
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Invalid announcement duration value'
                                     }))
@@ -3541,7 +4337,7 @@ async def handler(websocket):
                                 
                                 duration = int(duration)
                                 if duration < 1 or duration > 10080:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Announcement duration must be between 1 and 10080 minutes'
                                     }))
@@ -3563,9 +4359,12 @@ async def handler(websocket):
                             
                             # Save settings to database
                             success = db.update_admin_settings(settings)
+                            invalidate_admin_settings_cache()
+                            if success:
+                                invalidate_email_sender()
                             
                             if success:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Admin {username} updated settings: {settings}")
+                                logger.info("Admin %s updated settings: %s", username, settings)
                                 
                                 # Broadcast announcement update to all connected clients
                                 set_at = settings.get('announcement_set_at')
@@ -3578,27 +4377,23 @@ async def handler(websocket):
                                     'max_message_length': settings.get('max_message_length', 2000)
                                 }
                                 
-                                for client_ws in clients.keys():
-                                    try:
-                                        await client_ws.send_str(json.dumps(announcement_data))
-                                    except Exception:
-                                        pass  # Ignore errors sending to individual clients
-                                
-                                await websocket.send_str(json.dumps({
+                                await broadcast(json_encode(announcement_data))
+
+                                await websocket.send_str(json_encode({
                                     'type': 'settings_saved',
                                     'message': 'Settings saved successfully'
                                 }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to save settings'
                                 }))
                     
-                    elif data.get('type') == 'test_smtp':
+                    elif msg_type == 'test_smtp':
                         # Verify user is admin
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Access denied. Admin only.'
                             }))
@@ -3609,22 +4404,23 @@ async def handler(websocket):
                             
                             # If test email provided, send actual test email
                             if test_email:
-                                success, message = email_sender.send_test_email(test_email)
+                                success, message = await asyncio.to_thread(
+                                    email_sender.send_test_email, test_email)
                             else:
                                 # Just test connection
-                                success, message = email_sender.test_connection()
+                                success, message = await asyncio.to_thread(email_sender.test_connection)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'smtp_test_result',
                                 'success': success,
                                 'message': message
                             }))
                     
-                    elif data.get('type') == 'get_registered_users':
+                    elif msg_type == 'get_registered_users':
                         # Verify user is admin
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Access denied. Admin only.'
                             }))
@@ -3637,16 +4433,16 @@ async def handler(websocket):
                                 if user.get('created_at') and hasattr(user['created_at'], 'isoformat'):
                                     user['created_at'] = user['created_at'].isoformat()
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'registered_users',
                                 'users': users
                             }))
                     
-                    elif data.get('type') == 'delete_registered_user':
+                    elif msg_type == 'delete_registered_user':
                         # Verify user is admin
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Access denied. Admin only.'
                             }))
@@ -3655,7 +4451,7 @@ async def handler(websocket):
                             
                             # Validate username
                             if not target_username:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Username is required'
                                 }))
@@ -3663,7 +4459,7 @@ async def handler(websocket):
                             
                             # Prevent admin from deleting themselves
                             if target_username == username:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Cannot delete your own account'
                                 }))
@@ -3671,15 +4467,16 @@ async def handler(websocket):
                             
                             # Delete the user
                             success = db.delete_user_keep_messages(target_username)
+                            invalidate_user_card(target_username)
                             
                             if success:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Admin {username} deleted user: {target_username}")
+                                logger.info("Admin %s deleted user: %s", username, target_username)
                                 
                                 # Close the deleted user's websocket connection if they're online
                                 for client_ws, client_user in list(clients.items()):
                                     if client_user == target_username:
                                         try:
-                                            await client_ws.send_str(json.dumps({
+                                            await client_ws.send_str(json_encode({
                                                 'type': 'account_deleted',
                                                 'message': 'Your account has been deleted by an administrator'
                                             }))
@@ -3688,18 +4485,18 @@ async def handler(websocket):
                                             pass
                                         break
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'user_deleted',
                                     'message': f'User {target_username} has been deleted',
                                     'username': target_username
                                 }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': f'Failed to delete user {target_username}'
                                 }))
                     
-                    elif data.get('type') == 'sync_data':
+                    elif msg_type == 'sync_data':
                         # Handle request to sync/refresh user data (servers, DMs, friends)
                         # Use helper functions to build data consistently with init message
                         refreshed_servers = build_user_servers_data(username)
@@ -3708,7 +4505,7 @@ async def handler(websocket):
                         refreshed_requests_sent, refreshed_requests_received = build_friend_requests_data(username)
                         
                         # Send synced data to client
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'data_synced',
                             'servers': refreshed_servers,
                             'dms': refreshed_dms,
@@ -3716,10 +4513,10 @@ async def handler(websocket):
                             'friend_requests_sent': refreshed_requests_sent,
                             'friend_requests_received': refreshed_requests_received
                         }))
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Data synced for {username}")
+                        logger.info("Data synced for %s", username)
                     
                     # Server settings handlers
-                    elif data.get('type') == 'rename_server':
+                    elif msg_type == 'rename_server':
                         server_id = data.get('server_id', '')
                         new_name = data.get('name', '').strip()
                         
@@ -3728,24 +4525,25 @@ async def handler(websocket):
                             if has_permission(server_id, username, 'manage_server'):
                                 old_name = server['name']
                                 db.update_server_name(server_id, new_name)
+                                invalidate_server_init(server_id)
                                 
                                 db.add_audit_log_entry(server_id, 'server_rename', actor=username,
                                                        detail={'old_name': old_name, 'new_name': new_name})
 
                                 # Notify all server members
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'server_renamed',
                                     'server_id': server_id,
                                     'name': new_name
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} renamed server {old_name} to {new_name}")
+                                logger.info("%s renamed server %s to %s", username, old_name, new_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'You do not have permission to manage server settings'
                                 }))
                     
-                    elif data.get('type') == 'generate_server_invite':
+                    elif msg_type == 'generate_server_invite':
                         server_id = data.get('server_id', '')
                         max_uses = data.get('max_uses')  # None = unlimited
                         description = data.get('description', '')
@@ -3755,7 +4553,7 @@ async def handler(websocket):
                             invite_code = generate_invite_code()
                             db.create_invite_code(invite_code, username, 'server', server_id, max_uses=max_uses, description=description)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'server_invite_code',
                                 'server_id': server_id,
                                 'code': invite_code,
@@ -3763,14 +4561,14 @@ async def handler(websocket):
                                 'description': description,
                                 'message': f'Server invite code generated: {invite_code}'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} generated invite for server {server_id}: {invite_code} (max_uses: {max_uses})")
+                            logger.info("%s generated invite for server %s: %s (max_uses: %s)", username, server_id, invite_code, max_uses)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to create server invites'
                             }))
                     
-                    elif data.get('type') == 'get_server_invite_usage':
+                    elif msg_type == 'get_server_invite_usage':
                         server_id = data.get('server_id', '')
                         
                         # Check if user has permission to view invite usage
@@ -3787,18 +4585,18 @@ async def handler(websocket):
                                         item[key] = value.isoformat()
                                 serialized_logs.append(item)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'server_invite_usage',
                                 'server_id': server_id,
                                 'usage_logs': serialized_logs
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to view invite usage'
                             }))
                     
-                    elif data.get('type') == 'list_server_invites':
+                    elif msg_type == 'list_server_invites':
                         server_id = data.get('server_id', '')
                         
                         # Check if user has permission to view invites
@@ -3813,18 +4611,18 @@ async def handler(websocket):
                                     item['created_at'] = item['created_at'].isoformat()
                                 serialized_invites.append(item)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'server_invites_list',
                                 'server_id': server_id,
                                 'invites': serialized_invites
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to view server invites'
                             }))
                     
-                    elif data.get('type') == 'revoke_server_invite':
+                    elif msg_type == 'revoke_server_invite':
                         server_id = data.get('server_id', '')
                         code = data.get('code', '').strip()
                         
@@ -3832,20 +4630,20 @@ async def handler(websocket):
                         if has_permission(server_id, username, 'access_settings'):
                             if code:
                                 db.deactivate_invite_code(code)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_invite_revoked',
                                     'server_id': server_id,
                                     'code': code,
                                     'message': 'Server invite code has been revoked'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} revoked server invite: {code}")
+                                logger.info("%s revoked server invite: %s", username, code)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to revoke server invites'
                             }))
                     
-                    elif data.get('type') == 'join_server_with_invite':
+                    elif msg_type == 'join_server_with_invite':
                         invite_code = data.get('invite_code', '').strip()
                         
                         # Find server with this invite code
@@ -3857,7 +4655,7 @@ async def handler(websocket):
                             # Check if user is banned from this server
                             if db.is_user_banned(server_id, username):
                                 ban_info = db.get_user_ban_info(server_id, username)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': f'You are banned from this server. Reason: {ban_info.get("reason", "No reason provided")}'
                                 }))
@@ -3869,12 +4667,12 @@ async def handler(websocket):
                             
                             if username not in member_usernames:
                                 # Get admin settings for member limits
-                                admin_settings = db.get_admin_settings()
+                                admin_settings = get_cached_admin_settings()
                                 max_members = admin_settings.get('max_members_per_server', 1000)
                                 
                                 # Check if server has reached member limit (0 = unlimited)
                                 if max_members > 0 and len(members) >= max_members:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': f'Server has reached maximum members ({max_members})'
                                     }))
@@ -3882,6 +4680,10 @@ async def handler(websocket):
                                 
                                 # Add user to server
                                 db.add_server_member(server_id, username)
+                                invalidate_perm_cache(server_id, username)
+                                invalidate_user_servers(username)
+                                invalidate_server_members(server_id)
+                                invalidate_server_init(server_id, username)
                                 
                                 # Log invite usage
                                 db.log_invite_usage(invite_code, username, server_id)
@@ -3902,25 +4704,27 @@ async def handler(websocket):
                                     auto_role = db.get_role(auto_role_id)
                                     if auto_role and auto_role.get('server_id') == server_id:
                                         db.assign_role(server_id, username, auto_role_id)
+                                        invalidate_perm_cache(server_id, username)
                                         # Notify joining user about their new role
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'role_assigned',
                                             'server_id': server_id,
-                                            'role': auto_role
+                                            'role_id': auto_role_id
                                         }))
                                         # Broadcast to other members
-                                        await broadcast_to_server(server_id, json.dumps({
+                                        await broadcast_to_server(server_id, json_encode({
                                             'type': 'member_role_updated',
                                             'server_id': server_id,
                                             'username': username,
                                             'role_id': auto_role_id,
                                             'action': 'added'
                                         }), exclude=websocket)
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Auto-assigned role {auto_role.get('name')} to {username} in server {server_id}")
+                                        logger.info("Auto-assigned role %s to %s in server %s", auto_role.get('name'), username, server_id)
                                 
                                 # Rules screening gate
                                 if server_settings and server_settings.get('rules_enabled') and server_settings.get('rules_text', '').strip():
                                     db.set_member_rules_accepted(server_id, username, False)
+                                    invalidate_server_init(server_id, username)
                                     rules_pending = True
                                 
                                 # Get channels for response
@@ -3950,15 +4754,15 @@ async def handler(websocket):
                                     server_joined_payload['server']['rules_pending'] = True
                                     server_joined_payload['server']['rules_text'] = server_settings.get('rules_text', '')
                                 
-                                await websocket.send_str(json.dumps(server_joined_payload))
+                                await websocket.send_str(json_encode(server_joined_payload))
                                 
                                 # Notify other server members
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'member_joined',
                                     'server_id': server_id,
                                     'username': username
                                 }), exclude=websocket)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} joined server {server_id} via invite")
+                                logger.info("%s joined server %s via invite", username, server_id)
                                 
                                 db.add_audit_log_entry(server_id, 'member_join', actor=username,
                                                        target=username, detail={'invite_code': invite_code})
@@ -3996,20 +4800,20 @@ async def handler(websocket):
                                             'avatar_type': 'emoji',
                                             'mentions': [username] if '{user}' in welcome['message'] else []
                                         }
-                                        await broadcast_to_server(server_id, json.dumps(welcome_msg))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Sent welcome message to {username} in server {server_id}")
+                                        await broadcast_to_server(server_id, json_encode(welcome_msg))
+                                        logger.info("Sent welcome message to %s in server %s", username, server_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'You are already a member of this server'
                                 }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid server invite code'
                             }))
                     
-                    elif data.get('type') == 'get_server_info_by_invite':
+                    elif msg_type == 'get_server_info_by_invite':
                         # Public endpoint to preview server info before joining (no auth required)
                         invite_code = data.get('invite_code', '').strip()
                         
@@ -4021,7 +4825,7 @@ async def handler(websocket):
                             members = db.get_server_members(server_id)
                             
                             if server:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_info_preview',
                                     'server': {
                                         'id': server_id,
@@ -4035,17 +4839,17 @@ async def handler(websocket):
                                     'invite_code': invite_code
                                 }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Server not found'
                                 }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid or expired invite code'
                             }))
                     
-                    elif data.get('type') == 'update_user_permissions':
+                    elif msg_type == 'update_user_permissions':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', '')
                         permissions = data.get('permissions', {})
@@ -4054,40 +4858,39 @@ async def handler(websocket):
                         if server and target_username:
                             if username == server['owner']:
                                 # Verify target user is a member
-                                members = db.get_server_members(server_id)
-                                member_usernames = {m['username'] for m in members}
-                                
-                                if target_username in member_usernames and target_username != server['owner']:
+                                if target_username in get_cached_server_members(server_id) and target_username != server['owner']:
                                     # Update permissions in database
                                     db.update_member_permissions(server_id, target_username, permissions)
-                                    
+                                    invalidate_perm_cache(server_id, target_username)
+                                    invalidate_server_init(server_id, target_username)
+
                                     # Notify the user whose permissions were updated
-                                    await send_to_user(target_username, json.dumps({
+                                    await send_to_user(target_username, json_encode({
                                         'type': 'permissions_updated',
                                         'server_id': server_id,
                                         'permissions': permissions
                                     }))
                                     
                                     # Confirm to the owner
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'permissions_updated_success',
                                         'server_id': server_id,
                                         'username': target_username,
                                         'permissions': permissions
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated permissions for {target_username} in server {server_id}")
+                                    logger.info("%s updated permissions for %s in server %s", username, target_username, server_id)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Cannot update permissions for this user'
                                     }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Only the server owner can update permissions'
                                 }))
                     
-                    elif data.get('type') == 'get_server_members':
+                    elif msg_type == 'get_server_members':
                         server_id = data.get('server_id', '')
                         
                         server = db.get_server(server_id)
@@ -4120,15 +4923,15 @@ async def handler(websocket):
                                         }
                                     members_list.append(member_data)
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_members',
                                     'server_id': server_id,
                                     'members': members_list
                                 }))
                     
                     # Role management handlers
-                    elif data.get('type') == 'create_role':
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Received create_role request from {username}", flush=True)
+                    elif msg_type == 'create_role':
+                        logger.info("Received create_role request from %s", username)
                         server_id = data.get('server_id', '')
                         role_name = data.get('name', '').strip()
                         color = data.get('color', '#99AAB5')
@@ -4138,47 +4941,47 @@ async def handler(websocket):
                         if isinstance(permissions, list):
                             permissions = {k: True for k in permissions}
                         
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] server_id={server_id}, role_name={role_name}, color={color}", flush=True)
+                        logger.info("server_id=%s, role_name=%s, color=%s", server_id, role_name, color)
                         
                         server = db.get_server(server_id)
                         if server and role_name:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Server found, checking ownership")
+                            logger.info("Server found, checking ownership")
                             if username == server['owner']:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] User is owner, creating role")
+                                logger.info("User is owner, creating role")
                                 role_id = get_next_role_id()
                                 
                                 # Get highest position and add 1
                                 existing_roles = db.get_server_roles(server_id)
                                 position = max([r['position'] for r in existing_roles] + [0]) + 1
                                 
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Creating role with position {position}")
+                                logger.info("Creating role with position %s", position)
                                 if db.create_role(role_id, server_id, role_name, color, position, permissions, hoist):
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Role created in DB, fetching...")
+                                    logger.info("Role created in DB, fetching...")
                                     role = db.get_role(role_id)
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Role fetched: {role}")
+                                    logger.info("Role fetched: %s", role)
                                     
                                     # Broadcast to all server members
                                     serialized_role = serialize_role(role)
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Serialized role: {serialized_role}")
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    logger.info("Serialized role: %s", serialized_role)
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'role_created',
                                         'server_id': server_id,
                                         'role': serialized_role
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created role {role_name} in server {server_id}")
+                                    logger.info("%s created role %s in server %s", username, role_name, server_id)
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create role in DB")
+                                    logger.info("Failed to create role in DB")
                             else:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} is not owner of server")
-                                await websocket.send_str(json.dumps({
+                                logger.info("User %s is not owner of server", username)
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Only the server owner can create roles'
                                 }))
                         else:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Server not found or role_name empty")
+                            logger.info("Server not found or role_name empty")
 
                     
-                    elif data.get('type') == 'update_role':
+                    elif msg_type == 'update_role':
                         role_id = data.get('role_id', '')
                         role_name = data.get('name')
                         color = data.get('color')
@@ -4193,22 +4996,23 @@ async def handler(websocket):
                             server = db.get_server(role['server_id'])
                             if server and username == server['owner']:
                                 if db.update_role(role_id, role_name, color, None, permissions, hoist):
+                                    invalidate_perm_cache(role['server_id'])
                                     updated_role = db.get_role(role_id)
                                     
                                     # Broadcast to all server members
-                                    await broadcast_to_server(role['server_id'], json.dumps({
+                                    await broadcast_to_server(role['server_id'], json_encode({
                                         'type': 'role_updated',
                                         'server_id': role['server_id'],
                                         'role': serialize_role(updated_role)
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated role {role_id}")
+                                    logger.info("%s updated role %s", username, role_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Only the server owner can update roles'
                                 }))
                     
-                    elif data.get('type') == 'delete_role':
+                    elif msg_type == 'delete_role':
                         role_id = data.get('role_id', '')
                         
                         role = db.get_role(role_id)
@@ -4216,141 +5020,141 @@ async def handler(websocket):
                             server = db.get_server(role['server_id'])
                             if server and username == server['owner']:
                                 if db.delete_role(role_id):
+                                    invalidate_perm_cache(role['server_id'])
                                     # Broadcast to all server members
-                                    await broadcast_to_server(role['server_id'], json.dumps({
+                                    await broadcast_to_server(role['server_id'], json_encode({
                                         'type': 'role_deleted',
                                         'server_id': role['server_id'],
                                         'role_id': role_id
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted role {role_id}")
+                                    logger.info("%s deleted role %s", username, role_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Only the server owner can delete roles'
                                 }))
                     
-                    elif data.get('type') == 'assign_role':
+                    elif msg_type == 'assign_role':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', '')
                         role_id = data.get('role_id', '')
                         
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
                         elif not (username == server['owner'] or has_permission(server_id, username, 'administrator')):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the server owner or administrators can assign roles'
                             }))
                         else:
                             role = db.get_role(role_id)
                             if not role:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Role not found'
                                 }))
                             elif db.assign_role(server_id, target_username, role_id):
+                                invalidate_perm_cache(server_id, target_username)
                                 # Notify the user who got the role
-                                await send_to_user(target_username, json.dumps({
+                                await send_to_user(target_username, json_encode({
                                     'type': 'role_assigned',
                                     'server_id': server_id,
-                                    'role': role
+                                    'role_id': role_id
                                 }))
                                 
                                 # Broadcast to server
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'member_role_updated',
                                     'server_id': server_id,
                                     'username': target_username,
                                     'role_id': role_id,
                                     'action': 'added'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} assigned role {role_id} to {target_username}")
+                                logger.info("%s assigned role %s to %s", username, role_id, target_username)
                                 db.add_audit_log_entry(server_id, 'role_assign', actor=username,
                                                        target=target_username,
                                                        detail={'role_id': role_id, 'role_name': role.get('name', '')})
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to assign role'
                                 }))
                     
-                    elif data.get('type') == 'remove_role_from_user':
+                    elif msg_type == 'remove_role_from_user':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', '')
                         role_id = data.get('role_id', '')
                         
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
                         elif not (username == server['owner'] or has_permission(server_id, username, 'administrator')):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the server owner or administrators can remove roles'
                             }))
                         elif db.remove_role_from_user(server_id, target_username, role_id):
+                            invalidate_perm_cache(server_id, target_username)
                             # Notify the user
-                            await send_to_user(target_username, json.dumps({
+                            await send_to_user(target_username, json_encode({
                                 'type': 'role_removed',
                                 'server_id': server_id,
                                 'role_id': role_id
                             }))
                             
                             # Broadcast to server
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, json_encode({
                                 'type': 'member_role_updated',
                                 'server_id': server_id,
                                 'username': target_username,
                                 'role_id': role_id,
                                 'action': 'removed'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} removed role {role_id} from {target_username}")
+                            logger.info("%s removed role %s from %s", username, role_id, target_username)
                             db.add_audit_log_entry(server_id, 'role_remove', actor=username,
                                                    target=target_username, detail={'role_id': role_id})
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to remove role'
                             }))
                     
-                    elif data.get('type') == 'get_server_roles':
+                    elif msg_type == 'get_server_roles':
                         server_id = data.get('server_id', '')
                         
                         server = db.get_server(server_id)
                         if server:
                             # Verify user is a member
-                            members = db.get_server_members(server_id)
-                            member_usernames = {m['username'] for m in members}
-                            
-                            if username in member_usernames:
+                            if username in get_cached_server_members(server_id):
                                 roles = db.get_server_roles(server_id)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_roles',
                                     'server_id': server_id,
                                     'roles': [serialize_role(r) for r in roles]
                                 }))
                     
-                    elif data.get('type') == 'get_user_roles':
+                    elif msg_type == 'get_user_roles':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', username)
                         
                         server = db.get_server(server_id)
                         if server:
                             roles = db.get_user_roles(server_id, target_username)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'user_roles',
                                 'server_id': server_id,
                                 'username': target_username,
                                 'roles': [serialize_role(r) for r in roles]
                             }))
                     
-                    elif data.get('type') == 'reorder_roles':
+                    elif msg_type == 'reorder_roles':
                         # Move a role up or down by one position slot
                         server_id = data.get('server_id', '')
                         role_id = data.get('role_id', '')
@@ -4358,12 +5162,12 @@ async def handler(websocket):
                         
                         server = db.get_server(server_id)
                         if not server or username != server['owner']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Only the server owner can reorder roles'
                             }))
                         elif direction not in ('up', 'down'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'direction must be up or down'
                             }))
@@ -4381,31 +5185,31 @@ async def handler(websocket):
                                         {'role_id': roles[swap_idx]['role_id'], 'position': p1},
                                     ])
                                     updated_roles = db.get_server_roles(server_id)
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'roles_reordered',
                                         'server_id': server_id,
                                         'roles': [serialize_role(r) for r in updated_roles]
                                     }))
                     
-                    elif data.get('type') == 'get_channel_permissions':
+                    elif msg_type == 'get_channel_permissions':
                         channel_id = data.get('channel_id', '')
                         server_id = data.get('server_id', '')
                         
                         server = db.get_server(server_id)
                         if server and (username == server['owner'] or has_permission(server_id, username, 'manage_channels')):
                             overrides = db.get_channel_all_overrides(channel_id)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'channel_permissions',
                                 'channel_id': channel_id,
                                 'overrides': overrides
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No permission to view channel permissions'
                             }))
                     
-                    elif data.get('type') == 'set_channel_role_permissions':
+                    elif msg_type == 'set_channel_role_permissions':
                         channel_id = data.get('channel_id', '')
                         role_id = data.get('role_id', '')
                         permissions = data.get('permissions', {})
@@ -4416,60 +5220,60 @@ async def handler(websocket):
                         
                         server = db.get_server(server_id)
                         if not server or not (username == server['owner'] or has_permission(server_id, username, 'manage_channels')):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No permission to set channel permissions'
                             }))
                         else:
                             if db.set_channel_role_permissions(channel_id, role_id, permissions):
                                 overrides = db.get_channel_all_overrides(channel_id)
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'channel_permissions_updated',
                                     'server_id': server_id,
                                     'channel_id': channel_id,
                                     'overrides': overrides
                                 }))
                     
-                    elif data.get('type') == 'delete_channel_role_permissions':
+                    elif msg_type == 'delete_channel_role_permissions':
                         channel_id = data.get('channel_id', '')
                         role_id = data.get('role_id', '')
                         server_id = data.get('server_id', '')
                         
                         server = db.get_server(server_id)
                         if not server or not (username == server['owner'] or has_permission(server_id, username, 'manage_channels')):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No permission to delete channel permissions'
                             }))
                         else:
                             if db.delete_channel_role_permissions(channel_id, role_id):
                                 overrides = db.get_channel_all_overrides(channel_id)
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'channel_permissions_updated',
                                     'server_id': server_id,
                                     'channel_id': channel_id,
                                     'overrides': overrides
                                 }))
                     
-                    elif data.get('type') == 'get_category_permissions':
+                    elif msg_type == 'get_category_permissions':
                         category_id = data.get('category_id', '')
                         server_id = data.get('server_id', '')
                         
                         server = db.get_server(server_id)
                         if server and (username == server['owner'] or has_permission(server_id, username, 'manage_categories')):
                             overrides = db.get_category_all_overrides(category_id)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'category_permissions',
                                 'category_id': category_id,
                                 'overrides': overrides
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No permission to view category permissions'
                             }))
                     
-                    elif data.get('type') == 'set_category_role_permissions':
+                    elif msg_type == 'set_category_role_permissions':
                         category_id = data.get('category_id', '')
                         role_id = data.get('role_id', '')
                         permissions = data.get('permissions', {})
@@ -4480,14 +5284,14 @@ async def handler(websocket):
                         
                         server = db.get_server(server_id)
                         if not server or not (username == server['owner'] or has_permission(server_id, username, 'manage_categories')):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No permission to set category permissions'
                             }))
                         else:
                             if db.set_category_role_permissions(category_id, role_id, permissions):
                                 overrides = db.get_category_all_overrides(category_id)
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'category_permissions_updated',
                                     'server_id': server_id,
                                     'category_id': category_id,
@@ -4495,14 +5299,14 @@ async def handler(websocket):
                                 }))
                     
                     # Ban management handlers
-                    elif data.get('type') == 'ban_member':
+                    elif msg_type == 'ban_member':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', '').strip()
                         reason = data.get('reason', '').strip()
                         
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
@@ -4510,7 +5314,7 @@ async def handler(websocket):
                         
                         # Check if requester has ban_members permission
                         if not has_permission(server_id, username, 'ban_members'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to ban members'
                             }))
@@ -4518,7 +5322,7 @@ async def handler(websocket):
                         
                         # Cannot ban the server owner
                         if target_username == server['owner']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Cannot ban the server owner'
                             }))
@@ -4526,7 +5330,7 @@ async def handler(websocket):
                         
                         # Cannot ban yourself
                         if target_username == username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Cannot ban yourself'
                             }))
@@ -4534,7 +5338,7 @@ async def handler(websocket):
                         
                         # Verify target user exists and is a member
                         if not db.get_user(target_username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
@@ -4542,7 +5346,7 @@ async def handler(websocket):
                         
                         members = db.get_server_members(server_id)
                         if target_username not in [m['username'] for m in members]:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User is not a member of this server'
                             }))
@@ -4550,8 +5354,12 @@ async def handler(websocket):
                         
                         # Execute the ban
                         if db.ban_user_from_server(server_id, target_username, username, reason):
+                            invalidate_perm_cache(server_id, target_username)
+                            invalidate_user_servers(target_username)
+                            invalidate_server_members(server_id)
+                            invalidate_server_init(server_id, target_username)
                             # Notify the banned user
-                            await send_to_user(target_username, json.dumps({
+                            await send_to_user(target_username, json_encode({
                                 'type': 'banned_from_server',
                                 'server_id': server_id,
                                 'reason': reason,
@@ -4559,7 +5367,7 @@ async def handler(websocket):
                             }))
                             
                             # Broadcast to all server members
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, json_encode({
                                 'type': 'member_banned',
                                 'server_id': server_id,
                                 'username': target_username,
@@ -4567,22 +5375,22 @@ async def handler(websocket):
                                 'reason': reason
                             }))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} banned {target_username} from server {server_id}")
+                            logger.info("%s banned %s from server %s", username, target_username, server_id)
                             db.add_audit_log_entry(server_id, 'member_ban', actor=username,
                                                    target=target_username, detail={'reason': reason})
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to ban user'
                             }))
                     
-                    elif data.get('type') == 'unban_member':
+                    elif msg_type == 'unban_member':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', '').strip()
                         
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
@@ -4590,7 +5398,7 @@ async def handler(websocket):
                         
                         # Check if requester has ban_members permission
                         if not has_permission(server_id, username, 'ban_members'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to unban members'
                             }))
@@ -4599,7 +5407,7 @@ async def handler(websocket):
                         # Execute the unban
                         if db.unban_user_from_server(server_id, target_username):
                             # Broadcast to all server members
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, json_encode({
                                 'type': 'member_unbanned',
                                 'server_id': server_id,
                                 'username': target_username,
@@ -4607,27 +5415,27 @@ async def handler(websocket):
                             }))
                             
                             # Notify the unbanned user
-                            await send_to_user(target_username, json.dumps({
+                            await send_to_user(target_username, json_encode({
                                 'type': 'unbanned_from_server',
                                 'server_id': server_id,
                                 'unbanned_by': username
                             }))
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} unbanned {target_username} from server {server_id}")
+                            logger.info("%s unbanned %s from server %s", username, target_username, server_id)
                             db.add_audit_log_entry(server_id, 'member_unban', actor=username,
                                                    target=target_username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to unban user or user is not banned'
                             }))
                     
-                    elif data.get('type') == 'get_server_bans':
+                    elif msg_type == 'get_server_bans':
                         server_id = data.get('server_id', '')
                         
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
@@ -4635,14 +5443,14 @@ async def handler(websocket):
                         
                         # Check if requester has ban_members permission
                         if not has_permission(server_id, username, 'ban_members'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to view bans'
                             }))
                             continue
                         
                         bans = db.get_server_bans(server_id)
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'server_bans',
                             'server_id': server_id,
                             'bans': [{
@@ -4653,42 +5461,42 @@ async def handler(websocket):
                             } for ban in bans]
                         }))
                     
-                    elif data.get('type') == 'kick_member':
+                    elif msg_type == 'kick_member':
                         server_id = data.get('server_id', '')
                         target_username = data.get('username', '').strip()
                         reason = data.get('reason', '').strip()
 
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
                             continue
 
                         if not has_permission(server_id, username, 'ban_members'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to kick members'
                             }))
                             continue
 
                         if target_username == server['owner']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Cannot kick the server owner'
                             }))
                             continue
 
                         if target_username == username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Cannot kick yourself'
                             }))
                             continue
 
                         if not db.get_user(target_username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
@@ -4696,21 +5504,25 @@ async def handler(websocket):
 
                         members = db.get_server_members(server_id)
                         if target_username not in [m['username'] for m in members]:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User is not a member of this server'
                             }))
                             continue
 
                         if db.remove_server_member(server_id, target_username):
-                            await send_to_user(target_username, json.dumps({
+                            invalidate_perm_cache(server_id, target_username)
+                            invalidate_user_servers(target_username)
+                            invalidate_server_members(server_id)
+                            invalidate_server_init(server_id, target_username)
+                            await send_to_user(target_username, json_encode({
                                 'type': 'kicked_from_server',
                                 'server_id': server_id,
                                 'server_name': server['name'],
                                 'reason': reason,
                                 'kicked_by': username
                             }))
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, json_encode({
                                 'type': 'member_kicked',
                                 'server_id': server_id,
                                 'username': target_username,
@@ -4719,40 +5531,40 @@ async def handler(websocket):
                             }))
                             db.add_audit_log_entry(server_id, 'member_kick', actor=username,
                                                    target=target_username, detail={'reason': reason})
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} kicked {target_username} from server {server_id}")
+                            logger.info("%s kicked %s from server %s", username, target_username, server_id)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to kick user'
                             }))
 
-                    elif data.get('type') == 'get_server_audit_log':
+                    elif msg_type == 'get_server_audit_log':
                         server_id = data.get('server_id', '')
 
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
                             continue
 
                         if not has_permission(server_id, username, 'access_settings'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to view the audit log'
                             }))
                             continue
 
                         entries = db.get_server_audit_log(server_id, limit=200)
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'server_audit_log',
                             'server_id': server_id,
                             'entries': entries
                         }))
 
                     # Channel creation handlers
-                    elif data.get('type') == 'create_channel':
+                    elif msg_type == 'create_channel':
                         server_id = data.get('server_id', '')
                         channel_name = data.get('name', '').strip()
                         channel_type = data.get('channel_type', 'text')  # Default to text channel
@@ -4760,7 +5572,7 @@ async def handler(websocket):
                         if db.get_server(server_id) and channel_name:
                             if has_permission(server_id, username, 'create_channel') or has_permission(server_id, username, 'manage_channels'):
                                 # Get admin settings for channel limits
-                                admin_settings = db.get_admin_settings()
+                                admin_settings = get_cached_admin_settings()
                                 max_channels = admin_settings.get('max_channels_per_server', 50)
 
                                 # Apply license ceiling
@@ -4772,7 +5584,7 @@ async def handler(websocket):
                                 if max_channels > 0:
                                     server_channels = db.get_server_channels(server_id)
                                     if len(server_channels) >= max_channels:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'error',
                                             'message': f'Maximum channels per server ({max_channels}) reached'
                                         }))
@@ -4783,9 +5595,10 @@ async def handler(websocket):
                                 position = data.get('position', 0)
                                 
                                 db.create_channel(channel_id, server_id, channel_name, channel_type, category_id, position)
+                                invalidate_server_init(server_id)
                                 
                                 # Notify all server members
-                                channel_info = json.dumps({
+                                channel_info = json_encode({
                                     'type': 'channel_created',
                                     'server_id': server_id,
                                     'channel': {
@@ -4797,15 +5610,15 @@ async def handler(websocket):
                                     }
                                 })
                                 await broadcast_to_server(server_id, channel_info)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created {channel_type} channel: {channel_name}")
+                                logger.info("%s created %s channel: %s", username, channel_type, channel_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'You do not have permission to create channels'
                                 }))
                     
                     # Category management handlers
-                    elif data.get('type') == 'create_category':
+                    elif msg_type == 'create_category':
                         server_id = data.get('server_id', '')
                         category_name = data.get('name', '').strip()
                         
@@ -4817,9 +5630,10 @@ async def handler(websocket):
                                 position = len(categories)
                                 
                                 db.create_category(category_id, server_id, category_name, position)
+                                invalidate_server_init(server_id)
                                 
                                 # Notify all server members
-                                category_info = json.dumps({
+                                category_info = json_encode({
                                     'type': 'category_created',
                                     'server_id': server_id,
                                     'category': {
@@ -4829,14 +5643,14 @@ async def handler(websocket):
                                     }
                                 })
                                 await broadcast_to_server(server_id, category_info)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created category: {category_name}")
+                                logger.info("%s created category: %s", username, category_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'You do not have permission to create categories'
                                 }))
                     
-                    elif data.get('type') == 'update_category':
+                    elif msg_type == 'update_category':
                         category_id = data.get('category_id', '')
                         category_name = data.get('name', '').strip()
                         
@@ -4851,22 +5665,23 @@ async def handler(websocket):
                                     server_id = row['server_id']
                                     if has_permission(server_id, username, 'manage_categories'):
                                         db.update_category(category_id, category_name)
+                                        invalidate_server_init(server_id)
                                         
                                         # Notify all server members
-                                        await broadcast_to_server(server_id, json.dumps({
+                                        await broadcast_to_server(server_id, json_encode({
                                             'type': 'category_updated',
                                             'server_id': server_id,
                                             'category_id': category_id,
                                             'name': category_name
                                         }))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated category: {category_name}")
+                                        logger.info("%s updated category: %s", username, category_name)
                                     else:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'error',
                                             'message': 'You do not have permission to manage categories'
                                         }))
                     
-                    elif data.get('type') == 'delete_category':
+                    elif msg_type == 'delete_category':
                         category_id = data.get('category_id', '')
                         
                         # Get server_id for the category
@@ -4878,21 +5693,22 @@ async def handler(websocket):
                                 server_id = row['server_id']
                                 if has_permission(server_id, username, 'manage_categories'):
                                     db.delete_category(category_id)
+                                    invalidate_server_init(server_id)
                                     
                                     # Notify all server members
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'category_deleted',
                                         'server_id': server_id,
                                         'category_id': category_id
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted category: {category_id}")
+                                    logger.info("%s deleted category: %s", username, category_id)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'You do not have permission to manage categories'
                                     }))
                     
-                    elif data.get('type') == 'update_category_positions':
+                    elif msg_type == 'update_category_positions':
                         server_id = data.get('server_id', '')
                         positions = data.get('positions', [])  # List of {category_id, position}
                         
@@ -4900,15 +5716,16 @@ async def handler(websocket):
                             # Convert to list of tuples
                             position_tuples = [(p['category_id'], p['position']) for p in positions]
                             db.update_category_positions(position_tuples)
+                            invalidate_server_init(server_id)
                             
                             # Notify all server members
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, json_encode({
                                 'type': 'category_positions_updated',
                                 'server_id': server_id,
                                 'positions': positions
                             }))
                     
-                    elif data.get('type') == 'update_channel_positions':
+                    elif msg_type == 'update_channel_positions':
                         server_id = data.get('server_id', '')
                         positions = data.get('positions', [])  # List of {channel_id, position, category_id}
                         
@@ -4916,6 +5733,7 @@ async def handler(websocket):
                             # Update positions
                             position_tuples = [(p['channel_id'], p['position']) for p in positions]
                             db.update_channel_positions(position_tuples)
+                            invalidate_server_init(server_id)
                             
                             # Update category assignments if needed
                             for p in positions:
@@ -4923,13 +5741,13 @@ async def handler(websocket):
                                     db.update_channel_category(p['channel_id'], p.get('category_id'))
                             
                             # Notify all server members
-                            await broadcast_to_server(server_id, json.dumps({
+                            await broadcast_to_server(server_id, json_encode({
                                 'type': 'channel_positions_updated',
                                 'server_id': server_id,
                                 'positions': positions
                             }))
                     
-                    elif data.get('type') == 'update_channel_category':
+                    elif msg_type == 'update_channel_category':
                         channel_id = data.get('channel_id', '')
                         category_id = data.get('category_id')  # Can be None to remove from category
                         
@@ -4942,22 +5760,23 @@ async def handler(websocket):
                                 server_id = row['server_id']
                                 if has_permission(server_id, username, 'manage_channels'):
                                     db.update_channel_category(channel_id, category_id)
+                                    invalidate_server_init(server_id)
                                     
                                     # Notify all server members
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'channel_category_updated',
                                         'server_id': server_id,
                                         'channel_id': channel_id,
                                         'category_id': category_id
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} moved channel {channel_id} to category {category_id}")
+                                    logger.info("%s moved channel %s to category %s", username, channel_id, category_id)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'You do not have permission to manage channels'
                                     }))
                     
-                    elif data.get('type') == 'delete_channel':
+                    elif msg_type == 'delete_channel':
                         channel_id = data.get('channel_id', '')
                         
                         # Get server_id for the channel
@@ -4970,29 +5789,30 @@ async def handler(websocket):
                                 channel_name = row['name']
                                 if has_permission(server_id, username, 'manage_channels') or has_permission(server_id, username, 'delete_channel'):
                                     db.delete_channel(channel_id)
+                                    invalidate_server_init(server_id)
                                     
                                     # Notify all server members
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'channel_deleted',
                                         'server_id': server_id,
                                         'channel_id': channel_id
                                     }))
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted channel: {channel_name}")
+                                    logger.info("%s deleted channel: %s", username, channel_name)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'You do not have permission to delete channels'
                                     }))
                     
                     # Voice chat handlers (legacy endpoint for backward compatibility)
-                    elif data.get('type') == 'create_voice_channel':
+                    elif msg_type == 'create_voice_channel':
                         server_id = data.get('server_id', '')
                         channel_name = data.get('name', '').strip()
                         
                         if db.get_server(server_id) and channel_name:
                             if has_permission(server_id, username, 'create_voice_channel'):
                                 # Get admin settings for channel limits
-                                admin_settings = db.get_admin_settings()
+                                admin_settings = get_cached_admin_settings()
                                 max_channels = admin_settings.get('max_channels_per_server', 50)
 
                                 # Apply license ceiling
@@ -5004,7 +5824,7 @@ async def handler(websocket):
                                 if max_channels > 0:
                                     server_channels = db.get_server_channels(server_id)
                                     if len(server_channels) >= max_channels:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'error',
                                             'message': f'Maximum channels per server ({max_channels}) reached'
                                         }))
@@ -5012,24 +5832,25 @@ async def handler(websocket):
                                 
                                 channel_id = get_next_channel_id()
                                 db.create_channel(channel_id, server_id, channel_name, 'voice')
+                                invalidate_server_init(server_id)
                                 
                                 # Notify all server members (use unified message type)
-                                channel_info = json.dumps({
+                                channel_info = json_encode({
                                     'type': 'channel_created',
                                     'server_id': server_id,
                                     'channel': {'id': channel_id, 'name': channel_name, 'type': 'voice'}
                                 })
                                 await broadcast_to_server(server_id, channel_info)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} created voice channel: {channel_name}")
+                                logger.info("%s created voice channel: %s", username, channel_name)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'You do not have permission to create channels'
                                 }))
                     
-                    elif data.get('type') == 'join_voice_channel':
+                    elif msg_type == 'join_voice_channel':
                         if not check_feature_access('voice_chat'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Voice chat requires a paid license tier.'
                             }))
@@ -5041,9 +5862,7 @@ async def handler(websocket):
                         # Verify server and channel exist and user is member
                         server = db.get_server(server_id)
                         if server:
-                            members = db.get_server_members(server_id)
-                            member_usernames = {m['username'] for m in members}
-                            if username in member_usernames:
+                            if username in get_cached_server_members(server_id):
                                 # Clean up any existing voice state (e.g., direct call)
                                 await cleanup_voice_state(username, 'joined voice channel')
                                 
@@ -5071,7 +5890,7 @@ async def handler(websocket):
                                 
                                 # Notify all server members about voice state change
                                 user_avatar = get_avatar_data(username)
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'voice_state_update',
                                     'server_id': server_id,
                                     'channel_id': channel_id,
@@ -5088,7 +5907,7 @@ async def handler(websocket):
                                 livekit_token = generate_livekit_token(
                                     room_name, username, username
                                 )
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'voice_channel_joined',
                                     'server_id': server_id,
                                     'channel_id': channel_id,
@@ -5096,9 +5915,9 @@ async def handler(websocket):
                                     'livekit_token': livekit_token,
                                     'livekit_url': LIVEKIT_URL if livekit_token else None,
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} joined voice channel {channel_id}")
+                                logger.info("%s joined voice channel %s", username, channel_id)
                     
-                    elif data.get('type') == 'leave_voice_channel':
+                    elif msg_type == 'leave_voice_channel':
                         if username in voice_states:
                             state = voice_states[username]
                             server_id = state.get('server_id')
@@ -5124,7 +5943,7 @@ async def handler(websocket):
                                         })
                                     
                                     # Notify all server members
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'voice_state_update',
                                         'server_id': server_id,
                                         'channel_id': channel_id,
@@ -5134,97 +5953,101 @@ async def handler(websocket):
                                     }))
                             
                             del voice_states[username]
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} left voice channel")
+                            logger.info("%s left voice channel", username)
                     
-                    elif data.get('type') == 'voice_mute':
-                        muted = data.get('muted', False)
+                    elif msg_type in VOICE_FLAG_UPDATES:
+                        # Parametric handler for voice_mute / voice_video /
+                        # voice_screen_share — identical shape, one field each
+                        field, update_type = VOICE_FLAG_UPDATES[msg_type]
+                        value = bool(data.get(field, False))
                         if username in voice_states:
-                            voice_states[username]['muted'] = muted
+                            voice_states[username][field] = value
                             state = voice_states[username]
                             
                             # Notify others in the same voice channel OR direct call peer
+                            # (one cached serialization either way)
+                            frame = encode_voice_update(update_type, username, field, value)
                             if state.get('server_id') and state.get('channel_id'):
                                 # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
-                                    'type': 'voice_mute_update',
-                                    'username': username,
-                                    'muted': muted
-                                }))
+                                await broadcast_to_server(state['server_id'], frame)
                             elif state.get('direct_call_peer'):
                                 # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
-                                    'type': 'voice_mute_update',
-                                    'username': username,
-                                    'muted': muted
-                                }))
+                                await send_to_user(state['direct_call_peer'], frame)
                     
-                    elif data.get('type') == 'set_avatar':
+                    elif msg_type == 'set_avatar':
                         # Update user avatar (emoji or image upload)
                         avatar_type = data.get('avatar_type', 'emoji')
-                        
-                        # Get admin settings for file size limits
-                        admin_settings = db.get_admin_settings()
-                        max_file_size_mb = admin_settings.get('max_file_size_mb', 10)
-                        max_file_size = max_file_size_mb * 1024 * 1024
-                        
+
                         user = db.get_user(username)
                         if user:
                             if avatar_type == 'emoji':
                                 avatar = data.get('avatar', '👤').strip()
                                 db.update_user_avatar(username, avatar, 'emoji', None)
+                                invalidate_user_card(username)
                             elif avatar_type == 'image':
                                 # Handle image upload via base64
                                 avatar_data = data.get('avatar_data', '')
-                                
+
+                                # File size limits only matter for image uploads;
+                                # the emoji path skips the settings query entirely
+                                admin_settings = get_cached_admin_settings()
+                                max_file_size_mb = admin_settings.get('max_file_size_mb', 10)
+                                max_file_size = max_file_size_mb * 1024 * 1024
+
                                 # Validate size (base64 is ~33% larger than original)
                                 if len(avatar_data) > max_file_size * 1.5:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': f'Avatar image too large. Maximum size is {max_file_size_mb}MB.'
                                     }))
                                     continue
                                 
                                 db.update_user_avatar(username, None, 'image', avatar_data)
+                                invalidate_user_card(username)
                             
                             # Get full avatar data to broadcast
                             avatar_update = get_avatar_data(username)
-                            
-                            # Notify all friends about avatar change
-                            for friend_username in db.get_friends(username):
-                                await send_to_user(friend_username, json.dumps({
-                                    'type': 'avatar_update',
-                                    'username': username,
-                                    **avatar_update
-                                }))
-                            
-                            # Notify all servers the user is in
-                            for server_id in db.get_user_servers(username):
-                                await broadcast_to_server(server_id, json.dumps({
-                                    'type': 'avatar_update',
-                                    'username': username,
-                                    **avatar_update
-                                }))
-                            
-                            await websocket.send_str(json.dumps({
+
+                            # Serialize once and fan out to friends plus members
+                            # of shared servers, deduplicated (a friend in a
+                            # shared server gets a single frame) and sent in
+                            # parallel
+                            payload = json_encode({
+                                'type': 'avatar_update',
+                                'username': username,
+                                **avatar_update
+                            })
+                            recipients = set(get_allowed_peers(username))
+                            for server_id in get_cached_user_servers(username):
+                                recipients.update(m['username'] for m in db.get_server_members(server_id))
+                            recipients.discard(username)
+
+                            tasks = [client_ws.send_str(payload)
+                                     for client_ws, client_username in clients.items()
+                                     if client_username in recipients]
+                            if tasks:
+                                await asyncio.gather(*tasks, return_exceptions=True)
+
+                            await websocket.send_str(json_encode({
                                 'type': 'avatar_updated',
                                 **avatar_update
                             }))
                     
-                    elif data.get('type') == 'update_profile':
+                    elif msg_type == 'update_profile':
                         # Update user profile (bio and status message)
                         bio = data.get('bio', '').strip()
                         status_message = data.get('status_message', '').strip()
                         
                         # Validate lengths
                         if len(bio) > 500:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Bio is too long. Maximum 500 characters.'
                             }))
                             continue
                         
                         if len(status_message) > 100:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Status message is too long. Maximum 100 characters.'
                             }))
@@ -5232,6 +6055,7 @@ async def handler(websocket):
                         
                         # Update profile in database
                         db.update_user_profile(username, bio=bio, status_message=status_message)
+                        invalidate_user_card(username)
                         
                         # Get updated user data
                         user_data = db.get_user(username)
@@ -5240,35 +6064,31 @@ async def handler(websocket):
                             'status_message': user_data.get('status_message', '')
                         }
                         
-                        # Notify all friends about profile change
+                        # Notify all friends and servers; serialize the frame once
+                        profile_payload = json_encode({
+                            'type': 'profile_update',
+                            'username': username,
+                            **profile_update
+                        })
                         for friend_username in db.get_friends(username):
-                            await send_to_user(friend_username, json.dumps({
-                                'type': 'profile_update',
-                                'username': username,
-                                **profile_update
-                            }))
+                            await send_to_user(friend_username, profile_payload)
                         
-                        # Notify all servers the user is in
                         for server_id in db.get_user_servers(username):
-                            await broadcast_to_server(server_id, json.dumps({
-                                'type': 'profile_update',
-                                'username': username,
-                                **profile_update
-                            }))
+                            await broadcast_to_server(server_id, profile_payload)
                         
                         # Confirm to the user
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'profile_updated',
                             **profile_update
                         }))
                     
-                    elif data.get('type') == 'change_user_status':
+                    elif msg_type == 'change_user_status':
                         # Update user status (online, away, busy, offline)
                         user_status = data.get('user_status', 'online')
                         
                         # Validate status value
                         if user_status not in ['online', 'away', 'busy', 'offline']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid status value'
                             }))
@@ -5276,32 +6096,29 @@ async def handler(websocket):
                         
                         # Update status in database
                         db.update_user_status(username, user_status)
+                        invalidate_user_card(username)
                         
-                        # Notify all friends about status change
+                        # Notify all friends and servers; serialize the frame once
+                        status_payload = json_encode({
+                            'type': 'user_status_changed',
+                            'username': username,
+                            'user_status': user_status
+                        })
                         for friend_username in db.get_friends(username):
-                            await send_to_user(friend_username, json.dumps({
-                                'type': 'user_status_changed',
-                                'username': username,
-                                'user_status': user_status
-                            }))
+                            await send_to_user(friend_username, status_payload)
                         
-                        # Notify all servers the user is in
                         for server_id in db.get_user_servers(username):
-                            await broadcast_to_server(server_id, json.dumps({
-                                'type': 'user_status_changed',
-                                'username': username,
-                                'user_status': user_status
-                            }))
+                            await broadcast_to_server(server_id, status_payload)
                         
                         # Confirm to the user
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'user_status_changed',
                             'username': username,
                             'user_status': user_status
                         }))
                         # Validate email format
                         if not new_email or not is_valid_email(new_email):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid email address format'
                             }))
@@ -5309,8 +6126,8 @@ async def handler(websocket):
 
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -5318,7 +6135,7 @@ async def handler(websocket):
 
                         # Check same email
                         if user.get('email') == new_email:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New email is the same as current email'
                             }))
@@ -5327,36 +6144,37 @@ async def handler(websocket):
                         # Attempt update
                         if db.update_user_email(username, new_email):
                             # Optionally send verification email if SMTP configured
-                            admin_settings = db.get_admin_settings()
+                            admin_settings = get_cached_admin_settings()
                             if admin_settings.get('require_email_verification'):
                                 try:
-                                    email_sender = EmailSender(admin_settings)
+                                    email_sender = get_email_sender()
                                     if email_sender.is_configured():
-                                        verification_code = ''.join(secrets.choice(string.digits) for _ in range(6))
+                                        verification_code = f'{secrets.randbelow(10**6):06d}'
                                         expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
                                         db.create_email_verification_code(new_email, username, verification_code, expires_at)
-                                        email_sender.send_verification_email(new_email, username, verification_code)
+                                        await asyncio.to_thread(
+                                            email_sender.send_verification_email, new_email, username, verification_code)
                                 except Exception as e:
-                                    print(f"Failed to send verification email: {e}")
+                                    logger.error("Failed to send verification email: %s", e)
 
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'email_changed',
                                 'email': new_email,
                                 'email_verified': False
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Email address already in use'
                             }))
 
-                    elif data.get('type') == 'verify_email_change':
+                    elif msg_type == 'verify_email_change':
                         # Handle verification of changed email
                         code = data.get('code', '').strip()
                         
                         # Validate verification code format (must be exactly 6 digits)
                         if not code or not code.isdigit() or len(code) != 6:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid verification code format'
                             }))
@@ -5365,7 +6183,7 @@ async def handler(websocket):
                         # Get user's current email
                         user = db.get_user(username)
                         if not user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
@@ -5373,7 +6191,7 @@ async def handler(websocket):
                         
                         email = user.get('email')
                         if not email:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No email associated with this account'
                             }))
@@ -5381,8 +6199,8 @@ async def handler(websocket):
                         
                         # Verify the code
                         verification_data = db.get_email_verification_code(email, username)
-                        if not verification_data or verification_data['code'] != code:
-                            await websocket.send_str(json.dumps({
+                        if not verification_data or not hmac.compare_digest(verification_data['code'], code):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid or expired verification code'
                             }))
@@ -5393,45 +6211,45 @@ async def handler(websocket):
                             # Clean up ALL verification codes for this user
                             # This prevents reuse of old codes if deletion fails
                             if not db.delete_all_user_verification_codes(username):
-                                print(f"Warning: Failed to delete verification codes after email verification")
-                                await websocket.send_str(json.dumps({
+                                logger.warning("Failed to delete verification codes after email verification")
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Email verified but failed to clean up verification codes'
                                 }))
                                 continue
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'email_verified',
                                 'email': email,
                                 'email_verified': True
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to verify email'
                             }))
 
-                    elif data.get('type') == 'change_username':
+                    elif msg_type == 'change_username':
                         new_username = data.get('new_username', '').strip()
                         password = data.get('password', '')
 
                         # Validate
                         if not new_username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New username is required'
                             }))
                             continue
 
                         if len(new_username) > 255:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Username is too long. Maximum 255 characters.'
                             }))
                             continue
 
                         if new_username == username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New username is the same as current username'
                             }))
@@ -5439,7 +6257,7 @@ async def handler(websocket):
 
                         # Check availability
                         if db.get_user(new_username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Username already taken'
                             }))
@@ -5447,8 +6265,8 @@ async def handler(websocket):
 
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -5458,6 +6276,30 @@ async def handler(websocket):
                         if db.change_username(old_username, new_username):
                             # Update in-memory state
                             clients[websocket] = new_username
+                            invalidate_user_card(old_username, new_username)
+                            username_to_ws.pop(old_username, None)
+                            username_to_ws[new_username] = websocket
+
+                            # Cached member sets still hold the old name; flush
+                            # them or the renamed user drops out of server
+                            # broadcasts and fails membership checks until an
+                            # unrelated membership change rebuilds each set
+                            user_server_ids = db.get_user_servers(new_username)
+                            for server_id in user_server_ids:
+                                invalidate_server_members(server_id)
+
+                            # Friends' cached signaling peer sets also hold the
+                            # old name; without this, voice calls to and from
+                            # the renamed user are rejected until restart
+                            friends = db.get_friends(new_username)
+                            invalidate_allowed_peers(old_username, new_username, *friends)
+
+                            # Same for pending friend requests: counterparts'
+                            # cached (sent, received) sets reference the old name
+                            invalidate_friend_requests(
+                                old_username, new_username,
+                                *db.get_friend_requests_sent(new_username),
+                                *db.get_friend_requests_received(new_username))
 
                             if old_username in voice_states:
                                 voice_states[new_username] = voice_states.pop(old_username)
@@ -5474,111 +6316,109 @@ async def handler(websocket):
                             new_token = generate_jwt_token(new_username)
 
                             # Confirm to user
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'username_changed',
                                 'old_username': old_username,
                                 'new_username': new_username,
                                 'token': new_token
                             }))
 
-                            # Broadcast to friends
-                            for friend_username in db.get_friends(new_username):
-                                await send_to_user(friend_username, json.dumps({
-                                    'type': 'user_renamed',
-                                    'old_username': old_username,
-                                    'new_username': new_username
-                                }))
+                            # Broadcast to friends and servers; serialize the frame once
+                            renamed_payload = json_encode({
+                                'type': 'user_renamed',
+                                'old_username': old_username,
+                                'new_username': new_username
+                            })
+                            for friend_username in friends:
+                                await send_to_user(friend_username, renamed_payload)
 
-                            # Broadcast to all servers user is in
-                            for server_id in db.get_user_servers(new_username):
-                                await broadcast_to_server(server_id, json.dumps({
-                                    'type': 'user_renamed',
-                                    'old_username': old_username,
-                                    'new_username': new_username
-                                }), exclude=websocket)
+                            for server_id in user_server_ids:
+                                await broadcast_to_server(server_id, renamed_payload, exclude=websocket)
 
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Username changed: {old_username} -> {new_username}")
+                            logger.info("Username changed: %s -> %s", old_username, new_username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to change username. It may already be taken.'
                             }))
 
-                    elif data.get('type') == 'request_password_reset':
+                    elif msg_type == 'request_password_reset':
                         # Handle password reset request from logged-in user
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Processing password reset for authenticated user: {username}")
+                        logger.info("DEBUG: Processing password reset for authenticated user: %s", username)
                         try:
                             # For authenticated users, always rate limit by their actual account
                             rate_limit_key = username
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: password reset rate_limit_key={rate_limit_key}")
+                            logger.info("DEBUG: password reset rate_limit_key=%s", rate_limit_key)
                             
                             # Check rate limiting to prevent abuse
-                            if not check_password_reset_rate_limit(rate_limit_key):
-                                await websocket.send_str(json.dumps({
+                            if not await check_password_reset_rate_limit_async(rate_limit_key):
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Too many password reset requests. Please try again later.'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Rate limit exceeded for password reset: {rate_limit_key}")
+                                logger.info("Rate limit exceeded for password reset: %s", rate_limit_key)
                                 continue
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Rate limit passed")
+                            logger.info("DEBUG: Rate limit passed")
                             
                             # Get user data
                             user = db.get_user(username)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: user={user}")
+                            logger.info("DEBUG: user=%s", user)
                             
                             if user and user.get('email'):
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: User has email, generating token")
+                                logger.info("DEBUG: User has email, generating token")
                                 # Generate reset token
                                 reset_token = secrets.token_urlsafe(32)
                                 expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
                                 
                                 # Save token to database
                                 if db.create_password_reset_token(user['username'], reset_token, expires_at):
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Token created, sending email")
+                                    logger.info("DEBUG: Token created, sending email")
                                     # Send password reset email
-                                    email_sender = EmailSender(db.get_admin_settings())
+                                    email_sender = get_email_sender()
                                     try:
-                                        if email_sender.send_password_reset_email(
-                                            user['email'], 
-                                            user['username'], 
+                                        # SMTP I/O off the event loop
+                                        if await asyncio.to_thread(
+                                            email_sender.send_password_reset_email,
+                                            user['email'],
+                                            user['username'],
                                             reset_token
                                         ):
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset email sent to {user['username']} at {user['email']}")
+                                            logger.info("Password reset email sent to %s at %s", user['username'], user['email'])
                                         else:
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to send password reset email to {user['username']} at {user['email']}")
+                                            logger.info("Failed to send password reset email to %s at %s", user['username'], user['email'])
                                     except Exception as e:
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Error sending password reset email to {user['username']}: {e}")
+                                        logger.info("Error sending password reset email to %s: %s", user['username'], e)
                                         traceback.print_exc()
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create password reset token for {user['username']}")
+                                    logger.info("Failed to create password reset token for %s", user['username'])
                             else:
                                 if user:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} has no email address registered")
+                                    logger.info("User %s has no email address registered", username)
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} not found")
+                                    logger.info("User %s not found", username)
                             
                             # Always return success to prevent information leakage
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'password_reset_requested',
                                 'message': 'If an email is registered for your account, a password reset link has been sent.'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Response sent to client")
+                            logger.info("DEBUG: Response sent to client")
                         except Exception as e:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] EXCEPTION in password reset handler: {e}")
+                            logger.info("EXCEPTION in password reset handler: %s", e)
                             traceback.print_exc()
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'An error occurred processing your request.'
                             }))
                     
-                    elif data.get('type') == 'change_user_status':
+                    elif msg_type == 'change_user_status':
                         # Update user status (online, away, busy, offline)
                         user_status = data.get('user_status', 'online')
                         
                         # Validate status value
                         if user_status not in ['online', 'away', 'busy', 'offline']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid status value'
                             }))
@@ -5586,31 +6426,28 @@ async def handler(websocket):
                         
                         # Update status in database
                         db.update_user_status(username, user_status)
+                        invalidate_user_card(username)
                         
-                        # Notify all friends about status change
+                        # Notify all friends and servers; serialize the frame once
+                        status_payload = json_encode({
+                            'type': 'user_status_changed',
+                            'username': username,
+                            'user_status': user_status
+                        })
                         for friend_username in db.get_friends(username):
-                            await send_to_user(friend_username, json.dumps({
-                                'type': 'user_status_changed',
-                                'username': username,
-                                'user_status': user_status
-                            }))
+                            await send_to_user(friend_username, status_payload)
                         
-                        # Notify all servers the user is in
                         for server_id in db.get_user_servers(username):
-                            await broadcast_to_server(server_id, json.dumps({
-                                'type': 'user_status_changed',
-                                'username': username,
-                                'user_status': user_status
-                            }))
+                            await broadcast_to_server(server_id, status_payload)
                         
                         # Confirm to the user
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'user_status_changed',
                             'username': username,
                             'user_status': user_status
                         }))
                     
-                    elif data.get('type') == 'update_user_preferences':
+                    elif msg_type == 'update_user_preferences':
                         # Update user preferences (theme_mode and/or keybinds)
                         theme_mode = data.get('theme_mode')
                         keybinds = data.get('keybinds')
@@ -5646,24 +6483,24 @@ async def handler(websocket):
                         if success:
                             # Get updated preferences
                             prefs = db.get_user_preferences(username)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'user_preferences_updated',
                                 'theme_mode': prefs.get('theme_mode', 'dark'),
                                 'keybinds': prefs.get('keybinds', {})
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': error_message or 'Failed to update preferences'
                             }))
                     
-                    elif data.get('type') == 'change_email':
+                    elif msg_type == 'change_email':
                         new_email = data.get('new_email', '').strip()
                         password = data.get('password', '').strip()
                         
                         # Validate email format
                         if not new_email or not is_valid_email(new_email):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid email address format'
                             }))
@@ -5671,8 +6508,8 @@ async def handler(websocket):
 
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -5680,7 +6517,7 @@ async def handler(websocket):
 
                         # Check same email
                         if user.get('email') == new_email:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New email is the same as current email'
                             }))
@@ -5689,36 +6526,37 @@ async def handler(websocket):
                         # Attempt update
                         if db.update_user_email(username, new_email):
                             # Optionally send verification email if SMTP configured
-                            admin_settings = db.get_admin_settings()
+                            admin_settings = get_cached_admin_settings()
                             if admin_settings.get('require_email_verification'):
                                 try:
-                                    email_sender = EmailSender(admin_settings)
+                                    email_sender = get_email_sender()
                                     if email_sender.is_configured():
-                                        verification_code = ''.join(secrets.choice(string.digits) for _ in range(6))
+                                        verification_code = f'{secrets.randbelow(10**6):06d}'
                                         expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
                                         db.create_email_verification_code(new_email, username, verification_code, expires_at)
-                                        email_sender.send_verification_email(new_email, username, verification_code)
+                                        await asyncio.to_thread(
+                                            email_sender.send_verification_email, new_email, username, verification_code)
                                 except Exception as e:
-                                    print(f"Failed to send verification email: {e}")
+                                    logger.error("Failed to send verification email: %s", e)
 
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'email_changed',
                                 'email': new_email,
                                 'email_verified': False
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Email address already in use'
                             }))
 
-                    elif data.get('type') == 'verify_email_change':
+                    elif msg_type == 'verify_email_change':
                         # Handle verification of changed email
                         code = data.get('code', '').strip()
                         
                         # Validate verification code format (must be exactly 6 digits)
                         if not code or not code.isdigit() or len(code) != 6:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid verification code format'
                             }))
@@ -5727,7 +6565,7 @@ async def handler(websocket):
                         # Get user's current email
                         user = db.get_user(username)
                         if not user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
@@ -5735,7 +6573,7 @@ async def handler(websocket):
                         
                         email = user.get('email')
                         if not email:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No email associated with this account'
                             }))
@@ -5743,8 +6581,8 @@ async def handler(websocket):
                         
                         # Verify the code
                         verification_data = db.get_email_verification_code(email, username)
-                        if not verification_data or verification_data['code'] != code:
-                            await websocket.send_str(json.dumps({
+                        if not verification_data or not hmac.compare_digest(verification_data['code'], code):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid or expired verification code'
                             }))
@@ -5755,45 +6593,45 @@ async def handler(websocket):
                             # Clean up ALL verification codes for this user
                             # This prevents reuse of old codes if deletion fails
                             if not db.delete_all_user_verification_codes(username):
-                                print(f"Warning: Failed to delete verification codes after email verification")
-                                await websocket.send_str(json.dumps({
+                                logger.warning("Failed to delete verification codes after email verification")
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Email verified but failed to clean up verification codes'
                                 }))
                                 continue
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'email_verified',
                                 'email': email,
                                 'email_verified': True
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to verify email'
                             }))
 
-                    elif data.get('type') == 'change_username':
+                    elif msg_type == 'change_username':
                         new_username = data.get('new_username', '').strip()
                         password = data.get('password', '')
 
                         # Validate
                         if not new_username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New username is required'
                             }))
                             continue
 
                         if len(new_username) > 255:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Username is too long. Maximum 255 characters.'
                             }))
                             continue
 
                         if new_username == username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New username is the same as current username'
                             }))
@@ -5801,7 +6639,7 @@ async def handler(websocket):
 
                         # Check availability
                         if db.get_user(new_username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Username already taken'
                             }))
@@ -5809,8 +6647,8 @@ async def handler(websocket):
 
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -5820,6 +6658,30 @@ async def handler(websocket):
                         if db.change_username(old_username, new_username):
                             # Update in-memory state
                             clients[websocket] = new_username
+                            invalidate_user_card(old_username, new_username)
+                            username_to_ws.pop(old_username, None)
+                            username_to_ws[new_username] = websocket
+
+                            # Cached member sets still hold the old name; flush
+                            # them or the renamed user drops out of server
+                            # broadcasts and fails membership checks until an
+                            # unrelated membership change rebuilds each set
+                            user_server_ids = db.get_user_servers(new_username)
+                            for server_id in user_server_ids:
+                                invalidate_server_members(server_id)
+
+                            # Friends' cached signaling peer sets also hold the
+                            # old name; without this, voice calls to and from
+                            # the renamed user are rejected until restart
+                            friends = db.get_friends(new_username)
+                            invalidate_allowed_peers(old_username, new_username, *friends)
+
+                            # Same for pending friend requests: counterparts'
+                            # cached (sent, received) sets reference the old name
+                            invalidate_friend_requests(
+                                old_username, new_username,
+                                *db.get_friend_requests_sent(new_username),
+                                *db.get_friend_requests_received(new_username))
 
                             if old_username in voice_states:
                                 voice_states[new_username] = voice_states.pop(old_username)
@@ -5836,111 +6698,109 @@ async def handler(websocket):
                             new_token = generate_jwt_token(new_username)
 
                             # Confirm to user
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'username_changed',
                                 'old_username': old_username,
                                 'new_username': new_username,
                                 'token': new_token
                             }))
 
-                            # Broadcast to friends
-                            for friend_username in db.get_friends(new_username):
-                                await send_to_user(friend_username, json.dumps({
-                                    'type': 'user_renamed',
-                                    'old_username': old_username,
-                                    'new_username': new_username
-                                }))
+                            # Broadcast to friends and servers; serialize the frame once
+                            renamed_payload = json_encode({
+                                'type': 'user_renamed',
+                                'old_username': old_username,
+                                'new_username': new_username
+                            })
+                            for friend_username in friends:
+                                await send_to_user(friend_username, renamed_payload)
 
-                            # Broadcast to all servers user is in
-                            for server_id in db.get_user_servers(new_username):
-                                await broadcast_to_server(server_id, json.dumps({
-                                    'type': 'user_renamed',
-                                    'old_username': old_username,
-                                    'new_username': new_username
-                                }), exclude=websocket)
+                            for server_id in user_server_ids:
+                                await broadcast_to_server(server_id, renamed_payload, exclude=websocket)
 
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Username changed: {old_username} -> {new_username}")
+                            logger.info("Username changed: %s -> %s", old_username, new_username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to change username. It may already be taken.'
                             }))
 
-                    elif data.get('type') == 'request_password_reset':
+                    elif msg_type == 'request_password_reset':
                         # Handle password reset request from logged-in user
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Processing password reset for authenticated user: {username}")
+                        logger.info("DEBUG: Processing password reset for authenticated user: %s", username)
                         try:
                             # For authenticated users, always rate limit by their actual account
                             rate_limit_key = username
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: password reset rate_limit_key={rate_limit_key}")
+                            logger.info("DEBUG: password reset rate_limit_key=%s", rate_limit_key)
                             
                             # Check rate limiting to prevent abuse
-                            if not check_password_reset_rate_limit(rate_limit_key):
-                                await websocket.send_str(json.dumps({
+                            if not await check_password_reset_rate_limit_async(rate_limit_key):
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Too many password reset requests. Please try again later.'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Rate limit exceeded for password reset: {rate_limit_key}")
+                                logger.info("Rate limit exceeded for password reset: %s", rate_limit_key)
                                 continue
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Rate limit passed")
+                            logger.info("DEBUG: Rate limit passed")
                             
                             # Get user data
                             user = db.get_user(username)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: user={user}")
+                            logger.info("DEBUG: user=%s", user)
                             
                             if user and user.get('email'):
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: User has email, generating token")
+                                logger.info("DEBUG: User has email, generating token")
                                 # Generate reset token
                                 reset_token = secrets.token_urlsafe(32)
                                 expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
                                 
                                 # Save token to database
                                 if db.create_password_reset_token(user['username'], reset_token, expires_at):
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Token created, sending email")
+                                    logger.info("DEBUG: Token created, sending email")
                                     # Send password reset email
-                                    email_sender = EmailSender(db.get_admin_settings())
+                                    email_sender = get_email_sender()
                                     try:
-                                        if email_sender.send_password_reset_email(
-                                            user['email'], 
-                                            user['username'], 
+                                        # SMTP I/O off the event loop
+                                        if await asyncio.to_thread(
+                                            email_sender.send_password_reset_email,
+                                            user['email'],
+                                            user['username'],
                                             reset_token
                                         ):
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset email sent to {user['username']} at {user['email']}")
+                                            logger.info("Password reset email sent to %s at %s", user['username'], user['email'])
                                         else:
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to send password reset email to {user['username']} at {user['email']}")
+                                            logger.info("Failed to send password reset email to %s at %s", user['username'], user['email'])
                                     except Exception as e:
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Error sending password reset email to {user['username']}: {e}")
+                                        logger.info("Error sending password reset email to %s: %s", user['username'], e)
                                         traceback.print_exc()
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create password reset token for {user['username']}")
+                                    logger.info("Failed to create password reset token for %s", user['username'])
                             else:
                                 if user:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} has no email address registered")
+                                    logger.info("User %s has no email address registered", username)
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} not found")
+                                    logger.info("User %s not found", username)
                             
                             # Always return success to prevent information leakage
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'password_reset_requested',
                                 'message': 'If an email is registered for your account, a password reset link has been sent.'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Response sent to client")
+                            logger.info("DEBUG: Response sent to client")
                         except Exception as e:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] EXCEPTION in password reset handler: {e}")
+                            logger.info("EXCEPTION in password reset handler: %s", e)
                             traceback.print_exc()
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'An error occurred processing your request.'
                             }))
                     
-                    elif data.get('type') == 'change_user_status':
+                    elif msg_type == 'change_user_status':
                         # Update user status (online, away, busy, offline)
                         user_status = data.get('user_status', 'online')
                         
                         # Validate status value
                         if user_status not in ['online', 'away', 'busy', 'offline']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid status value'
                             }))
@@ -5948,31 +6808,28 @@ async def handler(websocket):
                         
                         # Update status in database
                         db.update_user_status(username, user_status)
+                        invalidate_user_card(username)
                         
-                        # Notify all friends about status change
+                        # Notify all friends and servers; serialize the frame once
+                        status_payload = json_encode({
+                            'type': 'user_status_changed',
+                            'username': username,
+                            'user_status': user_status
+                        })
                         for friend_username in db.get_friends(username):
-                            await send_to_user(friend_username, json.dumps({
-                                'type': 'user_status_changed',
-                                'username': username,
-                                'user_status': user_status
-                            }))
+                            await send_to_user(friend_username, status_payload)
                         
-                        # Notify all servers the user is in
                         for server_id in db.get_user_servers(username):
-                            await broadcast_to_server(server_id, json.dumps({
-                                'type': 'user_status_changed',
-                                'username': username,
-                                'user_status': user_status
-                            }))
+                            await broadcast_to_server(server_id, status_payload)
                         
                         # Confirm to the user
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'user_status_changed',
                             'username': username,
                             'user_status': user_status
                         }))
                     
-                    elif data.get('type') == 'update_user_preferences':
+                    elif msg_type == 'update_user_preferences':
                         # Update user preferences (theme_mode and/or keybinds)
                         theme_mode = data.get('theme_mode')
                         keybinds = data.get('keybinds')
@@ -6008,24 +6865,24 @@ async def handler(websocket):
                         if success:
                             # Get updated preferences
                             prefs = db.get_user_preferences(username)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'user_preferences_updated',
                                 'theme_mode': prefs.get('theme_mode', 'dark'),
                                 'keybinds': prefs.get('keybinds', {})
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': error_message or 'Failed to update preferences'
                             }))
                     
-                    elif data.get('type') == 'change_email':
+                    elif msg_type == 'change_email':
                         new_email = data.get('new_email', '').strip()
                         password = data.get('password', '').strip()
                         
                         # Validate email format
                         if not new_email or not is_valid_email(new_email):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid email address format'
                             }))
@@ -6033,8 +6890,8 @@ async def handler(websocket):
 
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -6042,7 +6899,7 @@ async def handler(websocket):
 
                         # Check same email
                         if user.get('email') == new_email:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New email is the same as current email'
                             }))
@@ -6051,36 +6908,37 @@ async def handler(websocket):
                         # Attempt update
                         if db.update_user_email(username, new_email):
                             # Optionally send verification email if SMTP configured
-                            admin_settings = db.get_admin_settings()
+                            admin_settings = get_cached_admin_settings()
                             if admin_settings.get('require_email_verification'):
                                 try:
-                                    email_sender = EmailSender(admin_settings)
+                                    email_sender = get_email_sender()
                                     if email_sender.is_configured():
-                                        verification_code = ''.join(secrets.choice(string.digits) for _ in range(6))
+                                        verification_code = f'{secrets.randbelow(10**6):06d}'
                                         expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
                                         db.create_email_verification_code(new_email, username, verification_code, expires_at)
-                                        email_sender.send_verification_email(new_email, username, verification_code)
+                                        await asyncio.to_thread(
+                                            email_sender.send_verification_email, new_email, username, verification_code)
                                 except Exception as e:
-                                    print(f"Failed to send verification email: {e}")
+                                    logger.error("Failed to send verification email: %s", e)
 
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'email_changed',
                                 'email': new_email,
                                 'email_verified': False
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Email address already in use'
                             }))
 
-                    elif data.get('type') == 'verify_email_change':
+                    elif msg_type == 'verify_email_change':
                         # Handle verification of changed email
                         code = data.get('code', '').strip()
                         
                         # Validate verification code format (must be exactly 6 digits)
                         if not code or not code.isdigit() or len(code) != 6:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid verification code format'
                             }))
@@ -6089,7 +6947,7 @@ async def handler(websocket):
                         # Get user's current email
                         user = db.get_user(username)
                         if not user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
@@ -6097,7 +6955,7 @@ async def handler(websocket):
                         
                         email = user.get('email')
                         if not email:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No email associated with this account'
                             }))
@@ -6105,8 +6963,8 @@ async def handler(websocket):
                         
                         # Verify the code
                         verification_data = db.get_email_verification_code(email, username)
-                        if not verification_data or verification_data['code'] != code:
-                            await websocket.send_str(json.dumps({
+                        if not verification_data or not hmac.compare_digest(verification_data['code'], code):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid or expired verification code'
                             }))
@@ -6117,45 +6975,45 @@ async def handler(websocket):
                             # Clean up ALL verification codes for this user
                             # This prevents reuse of old codes if deletion fails
                             if not db.delete_all_user_verification_codes(username):
-                                print(f"Warning: Failed to delete verification codes after email verification")
-                                await websocket.send_str(json.dumps({
+                                logger.warning("Failed to delete verification codes after email verification")
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Email verified but failed to clean up verification codes'
                                 }))
                                 continue
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'email_verified',
                                 'email': email,
                                 'email_verified': True
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to verify email'
                             }))
 
-                    elif data.get('type') == 'change_username':
+                    elif msg_type == 'change_username':
                         new_username = data.get('new_username', '').strip()
                         password = data.get('password', '')
 
                         # Validate
                         if not new_username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New username is required'
                             }))
                             continue
 
                         if len(new_username) > 255:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Username is too long. Maximum 255 characters.'
                             }))
                             continue
 
                         if new_username == username:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'New username is the same as current username'
                             }))
@@ -6163,7 +7021,7 @@ async def handler(websocket):
 
                         # Check availability
                         if db.get_user(new_username):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Username already taken'
                             }))
@@ -6171,8 +7029,8 @@ async def handler(websocket):
 
                         # Verify password
                         user = db.get_user(username)
-                        if not user or not verify_password(password, user['password_hash']):
-                            await websocket.send_str(json.dumps({
+                        if not user or not await verify_password_async(password, user['password_hash']):
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid password'
                             }))
@@ -6182,6 +7040,30 @@ async def handler(websocket):
                         if db.change_username(old_username, new_username):
                             # Update in-memory state
                             clients[websocket] = new_username
+                            invalidate_user_card(old_username, new_username)
+                            username_to_ws.pop(old_username, None)
+                            username_to_ws[new_username] = websocket
+
+                            # Cached member sets still hold the old name; flush
+                            # them or the renamed user drops out of server
+                            # broadcasts and fails membership checks until an
+                            # unrelated membership change rebuilds each set
+                            user_server_ids = db.get_user_servers(new_username)
+                            for server_id in user_server_ids:
+                                invalidate_server_members(server_id)
+
+                            # Friends' cached signaling peer sets also hold the
+                            # old name; without this, voice calls to and from
+                            # the renamed user are rejected until restart
+                            friends = db.get_friends(new_username)
+                            invalidate_allowed_peers(old_username, new_username, *friends)
+
+                            # Same for pending friend requests: counterparts'
+                            # cached (sent, received) sets reference the old name
+                            invalidate_friend_requests(
+                                old_username, new_username,
+                                *db.get_friend_requests_sent(new_username),
+                                *db.get_friend_requests_received(new_username))
 
                             if old_username in voice_states:
                                 voice_states[new_username] = voice_states.pop(old_username)
@@ -6198,179 +7080,179 @@ async def handler(websocket):
                             new_token = generate_jwt_token(new_username)
 
                             # Confirm to user
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'username_changed',
                                 'old_username': old_username,
                                 'new_username': new_username,
                                 'token': new_token
                             }))
 
-                            # Broadcast to friends
-                            for friend_username in db.get_friends(new_username):
-                                await send_to_user(friend_username, json.dumps({
-                                    'type': 'user_renamed',
-                                    'old_username': old_username,
-                                    'new_username': new_username
-                                }))
+                            # Broadcast to friends and servers; serialize the frame once
+                            renamed_payload = json_encode({
+                                'type': 'user_renamed',
+                                'old_username': old_username,
+                                'new_username': new_username
+                            })
+                            for friend_username in friends:
+                                await send_to_user(friend_username, renamed_payload)
 
-                            # Broadcast to all servers user is in
-                            for server_id in db.get_user_servers(new_username):
-                                await broadcast_to_server(server_id, json.dumps({
-                                    'type': 'user_renamed',
-                                    'old_username': old_username,
-                                    'new_username': new_username
-                                }), exclude=websocket)
+                            for server_id in user_server_ids:
+                                await broadcast_to_server(server_id, renamed_payload, exclude=websocket)
 
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Username changed: {old_username} -> {new_username}")
+                            logger.info("Username changed: %s -> %s", old_username, new_username)
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Failed to change username. It may already be taken.'
                             }))
 
-                    elif data.get('type') == 'request_password_reset':
+                    elif msg_type == 'request_password_reset':
                         # Handle password reset request from logged-in user
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Processing password reset for authenticated user: {username}")
+                        logger.info("DEBUG: Processing password reset for authenticated user: %s", username)
                         try:
                             # For authenticated users, always rate limit by their actual account
                             rate_limit_key = username
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: password reset rate_limit_key={rate_limit_key}")
+                            logger.info("DEBUG: password reset rate_limit_key=%s", rate_limit_key)
                             
                             # Check rate limiting to prevent abuse
-                            if not check_password_reset_rate_limit(rate_limit_key):
-                                await websocket.send_str(json.dumps({
+                            if not await check_password_reset_rate_limit_async(rate_limit_key):
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Too many password reset requests. Please try again later.'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Rate limit exceeded for password reset: {rate_limit_key}")
+                                logger.info("Rate limit exceeded for password reset: %s", rate_limit_key)
                                 continue
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Rate limit passed")
+                            logger.info("DEBUG: Rate limit passed")
                             
                             # Get user data
                             user = db.get_user(username)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: user={user}")
+                            logger.info("DEBUG: user=%s", user)
                             
                             if user and user.get('email'):
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: User has email, generating token")
+                                logger.info("DEBUG: User has email, generating token")
                                 # Generate reset token
                                 reset_token = secrets.token_urlsafe(32)
                                 expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
                                 
                                 # Save token to database
                                 if db.create_password_reset_token(user['username'], reset_token, expires_at):
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Token created, sending email")
+                                    logger.info("DEBUG: Token created, sending email")
                                     # Send password reset email
-                                    email_sender = EmailSender(db.get_admin_settings())
+                                    email_sender = get_email_sender()
                                     try:
-                                        if email_sender.send_password_reset_email(
-                                            user['email'], 
-                                            user['username'], 
+                                        # SMTP I/O off the event loop
+                                        if await asyncio.to_thread(
+                                            email_sender.send_password_reset_email,
+                                            user['email'],
+                                            user['username'],
                                             reset_token
                                         ):
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset email sent to {user['username']} at {user['email']}")
+                                            logger.info("Password reset email sent to %s at %s", user['username'], user['email'])
                                         else:
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to send password reset email to {user['username']} at {user['email']}")
+                                            logger.info("Failed to send password reset email to %s at %s", user['username'], user['email'])
                                     except Exception as e:
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Error sending password reset email to {user['username']}: {e}")
+                                        logger.info("Error sending password reset email to %s: %s", user['username'], e)
                                         traceback.print_exc()
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create password reset token for {user['username']}")
+                                    logger.info("Failed to create password reset token for %s", user['username'])
                             else:
                                 if user:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} has no email address registered")
+                                    logger.info("User %s has no email address registered", username)
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} not found")
+                                    logger.info("User %s not found", username)
                             
                             # Always return success to prevent information leakage
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'password_reset_requested',
                                 'message': 'If an email is registered for your account, a password reset link has been sent.'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Response sent to client")
+                            logger.info("DEBUG: Response sent to client")
                         except Exception as e:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] EXCEPTION in password reset handler: {e}")
+                            logger.info("EXCEPTION in password reset handler: %s", e)
                             traceback.print_exc()
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'An error occurred processing your request.'
                             }))
                     
-                    elif data.get('type') == 'request_password_reset':
+                    elif msg_type == 'request_password_reset':
                         # Handle password reset request from logged-in user
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Processing password reset for authenticated user: {username}")
+                        logger.info("DEBUG: Processing password reset for authenticated user: %s", username)
                         try:
                             identifier = data.get('identifier', '').strip() or username
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: identifier={identifier}")
+                            logger.info("DEBUG: identifier=%s", identifier)
                             
                             # Check rate limiting to prevent abuse
-                            if not check_password_reset_rate_limit(identifier):
-                                await websocket.send_str(json.dumps({
+                            if not await check_password_reset_rate_limit_async(identifier):
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Too many password reset requests. Please try again later.'
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] Rate limit exceeded for password reset: {identifier}")
+                                logger.info("Rate limit exceeded for password reset: %s", identifier)
                                 continue
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Rate limit passed")
+                            logger.info("DEBUG: Rate limit passed")
                             
                             # Get user data
                             user = db.get_user(username)
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: user={user}")
+                            logger.info("DEBUG: user=%s", user)
                             
                             if user and user.get('email'):
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: User has email, generating token")
+                                logger.info("DEBUG: User has email, generating token")
                                 # Generate reset token
                                 reset_token = secrets.token_urlsafe(32)
                                 expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
                                 
                                 # Save token to database
                                 if db.create_password_reset_token(user['username'], reset_token, expires_at):
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Token created, sending email")
+                                    logger.info("DEBUG: Token created, sending email")
                                     # Send password reset email
-                                    email_sender = EmailSender(db.get_admin_settings())
+                                    email_sender = get_email_sender()
                                     try:
-                                        if email_sender.send_password_reset_email(
-                                            user['email'], 
-                                            user['username'], 
+                                        # SMTP I/O off the event loop
+                                        if await asyncio.to_thread(
+                                            email_sender.send_password_reset_email,
+                                            user['email'],
+                                            user['username'],
                                             reset_token
                                         ):
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Password reset email sent to {user['username']} at {user['email']}")
+                                            logger.info("Password reset email sent to %s at %s", user['username'], user['email'])
                                         else:
-                                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to send password reset email to {user['username']} at {user['email']}")
+                                            logger.info("Failed to send password reset email to %s at %s", user['username'], user['email'])
                                     except Exception as e:
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Error sending password reset email to {user['username']}: {e}")
+                                        logger.info("Error sending password reset email to %s: %s", user['username'], e)
                                         traceback.print_exc()
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Failed to create password reset token for {user['username']}")
+                                    logger.info("Failed to create password reset token for %s", user['username'])
                             else:
                                 if user:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} has no email address registered")
+                                    logger.info("User %s has no email address registered", username)
                                 else:
-                                    print(f"[{datetime.now().strftime('%H:%M:%S')}] User {username} not found")
+                                    logger.info("User %s not found", username)
                             
                             # Always return success to prevent information leakage
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'password_reset_requested',
                                 'message': 'If an email is registered for your account, a password reset link has been sent.'
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] DEBUG: Response sent to client")
+                            logger.info("DEBUG: Response sent to client")
                         except Exception as e:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] EXCEPTION in password reset handler: {e}")
+                            logger.info("EXCEPTION in password reset handler: %s", e)
                             traceback.print_exc()
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'An error occurred processing your request.'
                             }))
                     
-                    elif data.get('type') == 'set_server_icon':
+                    elif msg_type == 'set_server_icon':
                         # Update server icon (emoji or image upload)
                         server_id = data.get('server_id', '')
                         icon_type = data.get('icon_type', 'emoji')
                         
                         # Validate icon_type
                         if icon_type not in ['emoji', 'image']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid icon type. Must be "emoji" or "image".'
                             }))
@@ -6379,28 +7261,28 @@ async def handler(websocket):
                         # Verify user has permission to change server icon
                         server = db.get_server(server_id)
                         if not server:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Server not found'
                             }))
                             continue
                         
                         if not has_permission(server_id, username, 'manage_server'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You do not have permission to change the server icon'
                             }))
                             continue
                         
                         # Get admin settings for file size limits
-                        admin_settings = db.get_admin_settings()
+                        admin_settings = get_cached_admin_settings()
                         max_file_size_mb = admin_settings.get('max_file_size_mb', 10)
                         max_file_size = max_file_size_mb * 1024 * 1024
                         
                         if icon_type == 'emoji':
                             icon = data.get('icon', '🏠').strip()
                             if not db.update_server_icon(server_id, icon, 'emoji', None):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to update server icon'
                                 }))
@@ -6411,7 +7293,7 @@ async def handler(websocket):
                             
                             # Validate icon_data is not empty
                             if not icon_data:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Icon image data is required'
                                 }))
@@ -6419,19 +7301,21 @@ async def handler(websocket):
                             
                             # Validate size (base64 is ~33% larger than original)
                             if len(icon_data) > max_file_size * 1.5:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': f'Icon image too large. Maximum size is {max_file_size_mb}MB.'
                                 }))
                                 continue
                             
                             if not db.update_server_icon(server_id, None, 'image', icon_data):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to update server icon'
                                 }))
                                 continue
                         
+                        invalidate_server_init(server_id)
+                        
                         # Get updated server data
                         updated_server = db.get_server(server_id)
                         icon_update = {
@@ -6441,21 +7325,21 @@ async def handler(websocket):
                         }
                         
                         # Notify all server members about icon change
-                        await broadcast_to_server(server_id, json.dumps({
+                        await broadcast_to_server(server_id, json_encode({
                             'type': 'server_icon_update',
                             'server_id': server_id,
                             **icon_update
                         }))
                         
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated icon for server {server_id}")
+                        logger.info("%s updated icon for server %s", username, server_id)
                     
-                    elif data.get('type') == 'set_notification_mode':
+                    elif msg_type == 'set_notification_mode':
                         # Update user notification mode
                         notification_mode = data.get('notification_mode', 'all')
                         
                         # Validate notification mode
                         if notification_mode not in ['all', 'mentions', 'none']:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid notification mode'
                             }))
@@ -6465,63 +7349,17 @@ async def handler(websocket):
                         if user:
                             db.update_notification_mode(username, notification_mode)
                             
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'notification_mode_updated',
                                 'notification_mode': notification_mode
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'User not found'
                             }))
                     
-                    elif data.get('type') == 'voice_video':
-                        # Toggle video state
-                        video = data.get('video', False)
-                        if username in voice_states:
-                            voice_states[username]['video'] = video
-                            state = voice_states[username]
-                            
-                            # Notify others in the same voice channel OR direct call peer
-                            if state.get('server_id') and state.get('channel_id'):
-                                # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
-                                    'type': 'voice_video_update',
-                                    'username': username,
-                                    'video': video
-                                }))
-                            elif state.get('direct_call_peer'):
-                                # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
-                                    'type': 'voice_video_update',
-                                    'username': username,
-                                    'video': video
-                                }))
-                    
-                    elif data.get('type') == 'voice_screen_share':
-                        # Toggle screen sharing state
-                        screen_sharing = data.get('screen_sharing', False)
-                        if username in voice_states:
-                            voice_states[username]['screen_sharing'] = screen_sharing
-                            state = voice_states[username]
-                            
-                            # Notify others in the same voice channel OR direct call peer
-                            if state.get('server_id') and state.get('channel_id'):
-                                # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
-                                    'type': 'voice_screen_share_update',
-                                    'username': username,
-                                    'screen_sharing': screen_sharing
-                                }))
-                            elif state.get('direct_call_peer'):
-                                # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
-                                    'type': 'voice_screen_share_update',
-                                    'username': username,
-                                    'screen_sharing': screen_sharing
-                                }))
-                    
-                    elif data.get('type') == 'switch_video_source':
+                    elif msg_type == 'switch_video_source':
                         # Forward request to switch video source to the target user,
                         # but only if both users are in the same voice channel OR direct call
                         target_user = data.get('target')
@@ -6549,19 +7387,19 @@ async def handler(websocket):
                             
                             # Allow if in same channel or direct call
                             if in_same_channel or in_direct_call:
-                                await send_to_user(target_user, json.dumps({
+                                await send_to_user(target_user, json_encode({
                                     'type': 'switch_video_source_request',
                                     'from': username,
                                     'show_screen': show_screen
                                 }))
                             else:
                                 # Reject unauthorized switch requests
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Cannot request video source switch: target user is not in the same voice channel or direct call'
                                 }))
                     
-                    elif data.get('type') == 'video_source_changed':
+                    elif msg_type == 'video_source_changed':
                         # Broadcast to others in voice channel OR direct call that video source has changed
                         if username in voice_states:
                             showing_screen = data.get('showing_screen', False)
@@ -6571,62 +7409,63 @@ async def handler(websocket):
                             # Notify others in the same voice channel OR direct call peer
                             if state.get('server_id') and state.get('channel_id'):
                                 # In a server voice channel
-                                await broadcast_to_server(state['server_id'], json.dumps({
+                                await broadcast_to_server(state['server_id'], json_encode({
                                     'type': 'video_source_changed_update',
                                     'username': username,
                                     'showing_screen': showing_screen
                                 }))
                             elif state.get('direct_call_peer'):
                                 # In a direct call
-                                await send_to_user(state['direct_call_peer'], json.dumps({
+                                await send_to_user(state['direct_call_peer'], json_encode({
                                     'type': 'video_source_changed_update',
                                     'username': username,
                                     'showing_screen': showing_screen
                                 }))
                     
                     # WebRTC signaling
-                    elif data.get('type') == 'webrtc_offer':
+                    elif msg_type == 'webrtc_offer':
                         target_user = data.get('target') or data.get('target_username')
                         offer = data.get('offer')
                         context = data.get('context', {})
-                        
-                        if target_user:
-                            await send_to_user(target_user, json.dumps({
+
+                        # Authorization check before any serialization work
+                        if target_user and can_signal(username, target_user):
+                            await send_payload_to_user(target_user, {
                                 'type': 'webrtc_offer',
                                 'from': username,
                                 'from_username': username,
                                 'offer': offer,
                                 'context': context
-                            }))
+                            })
                     
-                    elif data.get('type') == 'webrtc_answer':
+                    elif msg_type == 'webrtc_answer':
                         target_user = data.get('target') or data.get('target_username')
                         answer = data.get('answer')
-                        
-                        if target_user:
-                            await send_to_user(target_user, json.dumps({
+
+                        if target_user and can_signal(username, target_user):
+                            await send_payload_to_user(target_user, {
                                 'type': 'webrtc_answer',
                                 'from': username,
                                 'from_username': username,
                                 'answer': answer
-                            }))
+                            })
                     
-                    elif data.get('type') == 'webrtc_ice_candidate':
+                    elif msg_type == 'webrtc_ice_candidate':
                         target_user = data.get('target') or data.get('target_username')
                         candidate = data.get('candidate')
-                        
-                        if target_user:
-                            await send_to_user(target_user, json.dumps({
+
+                        if target_user and can_signal(username, target_user):
+                            await send_payload_to_user(target_user, {
                                 'type': 'webrtc_ice_candidate',
                                 'from': username,
                                 'from_username': username,
                                 'candidate': candidate
-                            }))
+                            })
                     
                     # Custom emoji handlers
-                    elif data.get('type') == 'upload_custom_emoji':
+                    elif msg_type == 'upload_custom_emoji':
                         if not check_feature_access('custom_emojis'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Custom emojis require a paid license tier.'
                             }))
@@ -6640,7 +7479,7 @@ async def handler(websocket):
                             # Validate emoji name pattern (alphanumeric and underscores only)
                             import re
                             if not re.match(r'^[a-zA-Z0-9_]+$', emoji_name):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Invalid emoji name format'
                                 }))
@@ -6648,7 +7487,7 @@ async def handler(websocket):
                             
                             # Validate name length
                             if len(emoji_name) > 50:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Emoji name too long'
                                 }))
@@ -6656,7 +7495,7 @@ async def handler(websocket):
                             
                             # Validate image data format and MIME type
                             if not image_data.startswith('data:image/'):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Invalid image format'
                                 }))
@@ -6665,7 +7504,7 @@ async def handler(websocket):
                             # Check for allowed image types
                             allowed_types = ['data:image/png', 'data:image/jpeg', 'data:image/gif', 'data:image/webp']
                             if not any(image_data.startswith(t) for t in allowed_types):
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Unsupported image type'
                                 }))
@@ -6677,7 +7516,7 @@ async def handler(websocket):
                                 # Base64 encoding increases size by ~33%, so decode length gives approximate original size
                                 estimated_size = len(base64_data) * 3 / 4
                                 if estimated_size > 262144:  # 256KB
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Image size exceeds limit'
                                     }))
@@ -6686,10 +7525,7 @@ async def handler(websocket):
                             # Verify user is a member of the server
                             server = db.get_server(server_id)
                             if server:
-                                members = db.get_server_members(server_id)
-                                member_usernames = {m['username'] for m in members}
-                                
-                                if username in member_usernames:
+                                if username in get_cached_server_members(server_id):
                                     # Generate emoji ID
                                     emoji_id = f"emoji_{server_id}_{secrets.token_hex(8)}"
                                     
@@ -6699,47 +7535,44 @@ async def handler(websocket):
                                         emoji = db.get_custom_emoji(emoji_id)
                                         
                                         # Broadcast to all server members
-                                        await broadcast_to_server(server_id, json.dumps({
+                                        await broadcast_to_server(server_id, json_encode({
                                             'type': 'custom_emoji_added',
                                             'server_id': server_id,
                                             'emoji': emoji
                                         }))
                                         
                                         # Confirm to uploader
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'emoji_upload_success',
                                             'emoji': emoji
                                         }))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} uploaded emoji '{emoji_name}' to server {server_id}")
+                                        logger.info("%s uploaded emoji '%s' to server %s", username, emoji_name, server_id)
                                     else:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'error',
                                             'message': 'Failed to create emoji'
                                         }))
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Not authorized'
                                     }))
                     
-                    elif data.get('type') == 'get_server_emojis':
+                    elif msg_type == 'get_server_emojis':
                         server_id = data.get('server_id', '')
                         
                         if server_id:
                             server = db.get_server(server_id)
                             if server:
-                                members = db.get_server_members(server_id)
-                                member_usernames = {m['username'] for m in members}
-                                
-                                if username in member_usernames:
+                                if username in get_cached_server_members(server_id):
                                     emojis = db.get_server_emojis(server_id)
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'server_emojis',
                                         'server_id': server_id,
                                         'emojis': emojis
                                     }))
                     
-                    elif data.get('type') == 'delete_custom_emoji':
+                    elif msg_type == 'delete_custom_emoji':
                         emoji_id = data.get('emoji_id', '')
                         
                         if emoji_id:
@@ -6750,29 +7583,29 @@ async def handler(websocket):
                                 if server and (username == server['owner'] or username == emoji['uploader']):
                                     if db.delete_custom_emoji(emoji_id):
                                         # Broadcast to all server members
-                                        await broadcast_to_server(emoji['server_id'], json.dumps({
+                                        await broadcast_to_server(emoji['server_id'], json_encode({
                                             'type': 'custom_emoji_deleted',
                                             'server_id': emoji['server_id'],
                                             'emoji_id': emoji_id
                                         }))
                                         
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'emoji_delete_success',
                                             'emoji_id': emoji_id
                                         }))
-                                        print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} deleted emoji {emoji_id}")
+                                        logger.info("%s deleted emoji %s", username, emoji_id)
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'You do not have permission to delete this emoji'
                                     }))
                     
                     # Soundboard handlers
-                    elif data.get('type') == 'play_soundboard':
+                    elif msg_type == 'play_soundboard':
                         sound_id = data.get('sound_id', '')
                         
                         if not sound_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'sound_id is required'
                             }))
@@ -6780,7 +7613,7 @@ async def handler(websocket):
                         
                         # Check if user is in a voice channel
                         if username not in voice_states:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You must be in a voice channel to play sounds'
                             }))
@@ -6791,16 +7624,16 @@ async def handler(websocket):
                         channel_id = voice_state.get('channel_id')
                         
                         if not server_id or not channel_id:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Invalid voice state'
                             }))
                             continue
                         
                         # Check soundboard is enabled
-                        admin_settings = db.get_admin_settings()
+                        admin_settings = get_cached_admin_settings()
                         if not admin_settings.get('allow_soundboard', False):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Soundboard is disabled'
                             }))
@@ -6809,7 +7642,7 @@ async def handler(websocket):
                         # Verify sound exists
                         sound = db.get_soundboard_sound(sound_id)
                         if not sound:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Sound not found'
                             }))
@@ -6820,7 +7653,7 @@ async def handler(websocket):
                         if username in soundboard_cooldowns:
                             last_play = soundboard_cooldowns[username]
                             if current_time - last_play < 2:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Please wait before playing another sound'
                                 }))
@@ -6833,7 +7666,7 @@ async def handler(websocket):
                         voice_key = f"{server_id}/{channel_id}"
                         if voice_key in voice_members:
                             # Broadcast soundboard play to all voice channel participants
-                            soundboard_msg = json.dumps({
+                            soundboard_msg = json_encode({
                                 'type': 'soundboard_play',
                                 'sound_id': sound_id,
                                 'sound_name': sound.get('name', ''),
@@ -6851,115 +7684,10 @@ async def handler(websocket):
                                         except Exception:
                                             pass
                             
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} played soundboard sound '{sound.get('name')}' in {channel_id}")
-                    
-                    # Message reaction handlers
-                    elif data.get('type') == 'add_reaction':
-                        message_id = data.get('message_id')
-                        emoji = data.get('emoji', '')
-                        emoji_type = data.get('emoji_type', 'standard')  # 'standard' or 'custom'
-                        
-                        if message_id and emoji:
-                            # Get message to verify authorization and determine context
-                            message = db.get_message(message_id)
-                            if not message:
-                                # Message doesn't exist, silently continue
-                                continue
-                            
-                            # Verify user has access to the message
-                            has_access = False
-                            if message['context_type'] == 'server' and message['context_id']:
-                                server_id = message['context_id'].split('/')[0]
-                                members = db.get_server_members(server_id)
-                                member_usernames = {m['username'] for m in members}
-                                has_access = username in member_usernames
-                            elif message['context_type'] == 'dm' and message['context_id']:
-                                dm_users = db.get_user_dms(username)
-                                has_access = any(dm['dm_id'] == message['context_id'] for dm in dm_users)
-                            
-                            if not has_access:
-                                # User doesn't have access, silently continue
-                                continue
-                            
-                            # Add the reaction
-                            reaction_added = db.add_reaction(message_id, username, emoji, emoji_type)
-                            
-                            # Get all reactions for this message (for both new and duplicate cases)
-                            reactions = db.get_message_reactions(message_id)
-                            
-                            reaction_update = {
-                                'type': 'reaction_added',
-                                'message_id': message_id,
-                                'reactions': reactions
-                            }
-                            
-                            # Broadcast to appropriate context (even for duplicates to keep clients in sync)
-                            if message['context_type'] == 'server' and message['context_id']:
-                                server_id = message['context_id'].split('/')[0]
-                                await broadcast_to_server(server_id, json.dumps(reaction_update))
-                            elif message['context_type'] == 'dm' and message['context_id']:
-                                # Get DM participants
-                                dm_users = db.get_user_dms(username)
-                                for dm in dm_users:
-                                    if dm['dm_id'] == message['context_id']:
-                                        participants = [dm['user1'], dm['user2']]
-                                        for participant in participants:
-                                            await send_to_user(participant, json.dumps(reaction_update))
-                                        break
-                            
-                            if reaction_added:
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} added reaction {emoji} to message {message_id}")
-                    
-                    elif data.get('type') == 'remove_reaction':
-                        message_id = data.get('message_id')
-                        emoji = data.get('emoji', '')
-                        
-                        if message_id and emoji:
-                            # Get the message first to verify existence and access
-                            message = db.get_message(message_id)
-                            if not message:
-                                # Message does not exist; do not reveal this to the client
-                                continue
-
-                            # For DMs, ensure the user is a participant in the DM thread
-                            dm_users = None
-                            if message.get('context_type') == 'dm' and message.get('context_id'):
-                                dm_users = db.get_user_dms(username)
-                                if not any(dm.get('dm_id') == message['context_id'] for dm in dm_users):
-                                    # User is not part of this DM; do not allow reaction removal
-                                    continue
-                            
-                            # Remove the reaction only after authorization checks
-                            if db.remove_reaction(message_id, username, emoji):
-                                # Get all reactions for this message
-                                reactions = db.get_message_reactions(message_id)
-                                
-                                reaction_update = {
-                                    'type': 'reaction_removed',
-                                    'message_id': message_id,
-                                    'reactions': reactions
-                                }
-                                
-                                # Broadcast to appropriate context
-                                if message.get('context_type') == 'server' and message.get('context_id'):
-                                    server_id = message['context_id'].split('/')[0]
-                                    await broadcast_to_server(server_id, json.dumps(reaction_update))
-                                elif message.get('context_type') == 'dm' and message.get('context_id'):
-                                    # Get DM participants (reuse if already fetched)
-                                    if dm_users is None:
-                                        dm_users = db.get_user_dms(username)
-                                    for dm in dm_users:
-                                        if dm.get('dm_id') == message['context_id']:
-                                            participants = [dm.get('user1'), dm.get('user2')]
-                                            for participant in participants:
-                                                if participant:
-                                                    await send_to_user(participant, json.dumps(reaction_update))
-                                            break
-                                
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} removed reaction {emoji} from message {message_id}")
+                            logger.info("%s played soundboard sound '%s' in %s", username, sound.get('name'), channel_id)
                     
                     # Server purge settings handlers
-                    elif data.get('type') == 'get_server_purge_settings':
+                    elif msg_type == 'get_server_purge_settings':
                         server_id = data.get('server_id', '')
                         
                         if server_id:
@@ -6968,14 +7696,14 @@ async def handler(websocket):
                                 settings = db.get_server_settings(server_id)
                                 exemptions = db.get_channel_exemptions(server_id)
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_purge_settings',
                                     'server_id': server_id,
                                     'purge_schedule': settings['purge_schedule'] if settings else 0,
                                     'exempted_channels': exemptions
                                 }))
                     
-                    elif data.get('type') == 'update_server_purge_settings':
+                    elif msg_type == 'update_server_purge_settings':
                         server_id = data.get('server_id', '')
                         purge_schedule = data.get('purge_schedule', 0)
                         exempted_channels = data.get('exempted_channels', [])
@@ -6987,7 +7715,7 @@ async def handler(websocket):
                                 try:
                                     purge_schedule = int(purge_schedule)
                                 except (TypeError, ValueError):
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Invalid purge schedule type'
                                     }))
@@ -6995,7 +7723,7 @@ async def handler(websocket):
                                 
                                 valid_schedules = [0, 7, 30, 90, 180, 365]
                                 if purge_schedule not in valid_schedules:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Invalid purge schedule value'
                                     }))
@@ -7017,26 +7745,26 @@ async def handler(websocket):
                                     is_exempted = channel_id in validated_exemptions
                                     db.set_channel_exemption(server_id, channel_id, is_exempted)
                                 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_purge_settings_updated',
                                     'server_id': server_id,
                                     'purge_schedule': purge_schedule
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated purge settings for server {server_id}")
+                                logger.info("%s updated purge settings for server %s", username, server_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Only the server owner can update purge settings'
                                 }))
                     
-                    elif data.get('type') == 'get_server_automation_settings':
+                    elif msg_type == 'get_server_automation_settings':
                         server_id = data.get('server_id', '')
                         if server_id:
                             server = db.get_server(server_id)
                             if server and has_permission(server_id, username, 'manage_server'):
                                 settings = db.get_server_settings(server_id)
                                 roles = db.get_server_roles(server_id)
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'server_automation_settings',
                                     'server_id': server_id,
                                     'auto_role_id': settings.get('auto_role_id') if settings else None,
@@ -7045,12 +7773,12 @@ async def handler(websocket):
                                     'roles': [{'role_id': r['role_id'], 'name': r['name'], 'color': r['color']} for r in roles]
                                 }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Permission denied'
                                 }))
 
-                    elif data.get('type') == 'update_server_automation_settings':
+                    elif msg_type == 'update_server_automation_settings':
                         server_id = data.get('server_id', '')
                         auto_role_id = data.get('auto_role_id') or None
                         rules_enabled = bool(data.get('rules_enabled', False))
@@ -7063,60 +7791,62 @@ async def handler(websocket):
                                 if auto_role_id:
                                     role = db.get_role(auto_role_id)
                                     if not role or role.get('server_id') != server_id:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'error',
                                             'message': 'Invalid role selected'
                                         }))
                                         continue
                                 
                                 db.update_server_automation_settings(server_id, auto_role_id, rules_enabled, rules_text)
-                                await websocket.send_str(json.dumps({
+                                invalidate_server_init(server_id)
+                                await websocket.send_str(json_encode({
                                     'type': 'server_automation_settings_updated',
                                     'server_id': server_id,
                                     'auto_role_id': auto_role_id,
                                     'rules_enabled': rules_enabled,
                                     'rules_text': rules_text
                                 }))
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} updated automation settings for server {server_id}")
+                                logger.info("%s updated automation settings for server %s", username, server_id)
                                 
                                 db.add_audit_log_entry(server_id, 'automation_settings_update', actor=username,
                                                        detail={'auto_role_id': auto_role_id, 'rules_enabled': rules_enabled})
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Only users with manage_server permission can update automation settings'
                                 }))
 
-                    elif data.get('type') == 'accept_server_rules':
+                    elif msg_type == 'accept_server_rules':
                         server_id = data.get('server_id', '')
                         if server_id and db.is_server_member(server_id, username):
                             success = db.accept_server_rules(server_id, username)
+                            invalidate_server_init(server_id, username)
                             if success:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'rules_accepted',
                                     'server_id': server_id
                                 }))
                                 # Broadcast member_joined now that they've fully joined
-                                await broadcast_to_server(server_id, json.dumps({
+                                await broadcast_to_server(server_id, json_encode({
                                     'type': 'member_rules_accepted',
                                     'server_id': server_id,
                                     'username': username
                                 }), exclude=websocket)
-                                print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} accepted rules for server {server_id}")
+                                logger.info("%s accepted rules for server %s", username, server_id)
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to accept server rules'
                                 }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'You are not a member of this server'
                             }))
 
-                    elif data.get('type') == 'start_voice_call':
+                    elif msg_type == 'start_voice_call':
                         if not check_feature_access('voice_chat'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Voice chat requires a paid license tier.'
                             }))
@@ -7124,10 +7854,9 @@ async def handler(websocket):
 
                         # Direct voice call with a friend
                         friend_username = data.get('username', '').strip()
-                        
-                        # Verify mutual friendship
-                        friends = set(db.get_friends(username))
-                        if db.get_user(friend_username) and friend_username in friends:
+
+                        # Verify mutual friendship (cached; checked before any DB hit)
+                        if friend_username in get_allowed_peers(username) and db.get_user(friend_username):
                             # Clean up any existing voice state
                             await cleanup_voice_state(username, 'started new call')
                             
@@ -7135,18 +7864,17 @@ async def handler(websocket):
                             voice_states[username] = create_voice_state(direct_call_peer=friend_username)
                             
                             # Notify the friend about incoming call
-                            await send_to_user(friend_username, json.dumps({
+                            await send_to_user(friend_username, json_encode({
                                 'type': 'incoming_voice_call',
                                 'from': username
                             }))
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} calling {friend_username}")
+                            logger.info("%s calling %s", username, friend_username)
                     
-                    elif data.get('type') == 'accept_voice_call':
+                    elif msg_type == 'accept_voice_call':
                         caller_username = data.get('from', '').strip()
-                        
-                        # Verify caller exists and is a friend
-                        friends = set(db.get_friends(username))
-                        if db.get_user(caller_username) and caller_username in friends:
+
+                        # Verify caller is a friend (cached) and exists
+                        if caller_username in get_allowed_peers(username) and db.get_user(caller_username):
                             # Clean up any existing voice state for callee
                             await cleanup_voice_state(username, 'accepted another call')
                             
@@ -7165,17 +7893,16 @@ async def handler(websocket):
                             voice_states[username] = create_voice_state(direct_call_peer=caller_username)
                             voice_states[caller_username] = create_voice_state(direct_call_peer=username)
                             
-                            await send_to_user(caller_username, json.dumps({
+                            await send_to_user(caller_username, json_encode({
                                 'type': 'voice_call_accepted',
                                 'from': username
                             }))
                     
-                    elif data.get('type') == 'reject_voice_call':
+                    elif msg_type == 'reject_voice_call':
                         caller_username = data.get('from', '').strip()
-                        
-                        # Verify caller exists and is a friend
-                        friends = set(db.get_friends(username))
-                        if db.get_user(caller_username) and caller_username in friends:
+
+                        # Verify caller is a friend (cached) and exists
+                        if caller_username in get_allowed_peers(username) and db.get_user(caller_username):
                             # Clean up caller's voice state (orphaned from unanswered call)
                             if caller_username in voice_states:
                                 caller_state = voice_states[caller_username]
@@ -7183,13 +7910,13 @@ async def handler(websocket):
                                 if caller_state.get('direct_call_peer') == username:
                                     del voice_states[caller_username]
                             
-                            await send_to_user(caller_username, json.dumps({
+                            await send_to_user(caller_username, json_encode({
                                 'type': 'voice_call_rejected',
                                 'from': username
                             }))
 
                     # Automation handlers
-                    elif data.get('type') == 'create_scheduled_message':
+                    elif msg_type == 'create_scheduled_message':
                         server_id = data.get('server_id', '')
                         channel_id = data.get('channel_id', '')
                         content = data.get('content', '').strip()
@@ -7205,7 +7932,7 @@ async def handler(websocket):
                                     # Create scheduled message
                                     msg_id = db.create_scheduled_message(server_id, channel_id, username, content, scheduled_time)
                                     if msg_id:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'scheduled_message_created',
                                             'message_id': msg_id,
                                             'server_id': server_id,
@@ -7213,21 +7940,21 @@ async def handler(websocket):
                                             'scheduled_for': scheduled_time.isoformat()
                                         }))
                                     else:
-                                        await websocket.send_str(json.dumps({
+                                        await websocket.send_str(json_encode({
                                             'type': 'error',
                                             'message': 'Failed to create scheduled message'
                                         }))
                                 except Exception as e:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': f'Invalid scheduled time: {str(e)}'
                                     }))
                     
-                    elif data.get('type') == 'get_scheduled_messages':
+                    elif msg_type == 'get_scheduled_messages':
                         server_id = data.get('server_id', '')
                         if server_id and has_permission(server_id, username, 'manage_server'):
                             messages = db.get_scheduled_messages(server_id)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'scheduled_messages',
                                 'server_id': server_id,
                                 'messages': [{
@@ -7240,22 +7967,22 @@ async def handler(websocket):
                                 } for msg in messages]
                             }))
                     
-                    elif data.get('type') == 'delete_scheduled_message':
+                    elif msg_type == 'delete_scheduled_message':
                         message_id = data.get('message_id')
                         if message_id:
                             success = db.delete_scheduled_message(message_id, username)
                             if success:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'scheduled_message_deleted',
                                     'message_id': message_id
                                 }))
                             else:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': 'Failed to delete scheduled message'
                                 }))
                     
-                    elif data.get('type') == 'create_poll':
+                    elif msg_type == 'create_poll':
                         server_id = data.get('server_id', '')
                         channel_id = data.get('channel_id', '')
                         question = data.get('question', '').strip()
@@ -7283,18 +8010,18 @@ async def handler(websocket):
                                         if poll_data.get('expires_at'):
                                             poll_data['expires_at'] = poll_data['expires_at'].isoformat()
                                         
-                                        await broadcast_to_server(server_id, json.dumps({
+                                        await broadcast_to_server(server_id, json_encode({
                                             'type': 'poll_created',
                                             'poll': poll_data,
                                             'channel_id': channel_id
                                         }))
                                 else:
-                                    await websocket.send_str(json.dumps({
+                                    await websocket.send_str(json_encode({
                                         'type': 'error',
                                         'message': 'Failed to create poll'
                                     }))
                     
-                    elif data.get('type') == 'vote_poll':
+                    elif msg_type == 'vote_poll':
                         poll_id = data.get('poll_id', '')
                         option_id = data.get('option_id', '')
                         
@@ -7309,12 +8036,12 @@ async def handler(websocket):
                                     if poll_data.get('expires_at'):
                                         poll_data['expires_at'] = poll_data['expires_at'].isoformat()
                                     
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'poll_updated',
                                         'poll': poll_data
                                     }))
                     
-                    elif data.get('type') == 'close_poll':
+                    elif msg_type == 'close_poll':
                         poll_id = data.get('poll_id', '')
                         if poll_id:
                             success = db.close_poll(poll_id, username)
@@ -7327,12 +8054,12 @@ async def handler(websocket):
                                     if poll_data.get('expires_at'):
                                         poll_data['expires_at'] = poll_data['expires_at'].isoformat()
                                     
-                                    await broadcast_to_server(server_id, json.dumps({
+                                    await broadcast_to_server(server_id, json_encode({
                                         'type': 'poll_updated',
                                         'poll': poll_data
                                     }))
                     
-                    elif data.get('type') == 'set_welcome_message':
+                    elif msg_type == 'set_welcome_message':
                         server_id = data.get('server_id', '')
                         enabled = data.get('enabled', False)
                         message = data.get('message', '').strip()
@@ -7341,7 +8068,7 @@ async def handler(websocket):
                         if server_id and has_permission(server_id, username, 'manage_server'):
                             success = db.set_welcome_message(server_id, enabled, message, channel_id)
                             if success:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'welcome_message_updated',
                                     'server_id': server_id,
                                     'enabled': enabled,
@@ -7349,27 +8076,27 @@ async def handler(websocket):
                                     'channel_id': channel_id
                                 }))
                     
-                    elif data.get('type') == 'get_welcome_message':
+                    elif msg_type == 'get_welcome_message':
                         server_id = data.get('server_id', '')
                         if server_id and has_permission(server_id, username, 'manage_server'):
                             welcome = db.get_welcome_message(server_id)
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'welcome_message',
                                 'server_id': server_id,
                                 'welcome': welcome if welcome else {'enabled': False, 'message': '', 'channel_id': None}
                             }))
                     
-                    elif data.get('type') == 'delete_welcome_message':
+                    elif msg_type == 'delete_welcome_message':
                         server_id = data.get('server_id', '')
                         if server_id and has_permission(server_id, username, 'manage_server'):
                             success = db.delete_welcome_message(server_id)
                             if success:
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'welcome_message_deleted',
                                     'server_id': server_id
                                 }))
                     
-                    elif data.get('type') == 'get_license_info':
+                    elif msg_type == 'get_license_info':
                         first_user = db.get_first_user()
                         is_admin = (username == first_user)
                         license_data = {
@@ -7394,15 +8121,15 @@ async def handler(websocket):
                             expiry = license_validator.get_expiry()
                             if expiry:
                                 license_data['expires_at'] = expiry
-                        await websocket.send_str(json.dumps({
+                        await websocket.send_str(json_encode({
                             'type': 'license_info',
                             'data': license_data
                         }))
 
-                    elif data.get('type') == 'update_license':
+                    elif msg_type == 'update_license':
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Admin access required'
                             }))
@@ -7426,20 +8153,20 @@ async def handler(websocket):
                                 'limits': {l: license_validator.get_limit(l) for l in DEFAULT_LIMITS},
                                 'is_admin': False,
                             }
-                            await broadcast(json.dumps({
+                            await broadcast(json_encode({
                                 'type': 'license_updated',
                                 'data': broadcast_data
                             }))
                         else:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': result.get('error', 'Invalid license key')
                             }))
 
-                    elif data.get('type') == 'remove_license':
+                    elif msg_type == 'remove_license':
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Admin access required'
                             }))
@@ -7454,17 +8181,17 @@ async def handler(websocket):
                             'limits': dict(DEFAULT_LIMITS),
                             'is_admin': False,
                         }
-                        await broadcast(json.dumps({
+                        await broadcast(json_encode({
                             'type': 'license_updated',
                             'data': broadcast_data
                         }))
 
-                    elif data.get('type') == 'force_license_checkin':
+                    elif msg_type == 'force_license_checkin':
                         from instance_fingerprint import generate_instance_fingerprint
 
                         first_user = db.get_first_user()
                         if username != first_user:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'Admin access required'
                             }))
@@ -7473,7 +8200,7 @@ async def handler(websocket):
                         # Get license key from database
                         stored = db.get_license_key()
                         if not stored or not stored.get('license_key'):
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': 'No license key configured'
                             }))
@@ -7482,12 +8209,13 @@ async def handler(websocket):
                         license_key = stored['license_key']
 
                         # Get or generate instance fingerprint
-                        settings = db.get_admin_settings()
+                        settings = get_cached_admin_settings()
                         instance_fingerprint = settings.get('instance_fingerprint')
 
                         if not instance_fingerprint:
                             instance_fingerprint = generate_instance_fingerprint()
                             db.update_admin_settings({'instance_fingerprint': instance_fingerprint})
+                            invalidate_admin_settings_cache()
 
                         # Perform check-in
                         try:
@@ -7502,8 +8230,9 @@ async def handler(websocket):
                                 db.update_admin_settings({
                                     'last_license_check_at': datetime.now(timezone.utc)
                                 })
+                                invalidate_admin_settings_cache()
 
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'license_checkin_success',
                                     'message': 'License check-in successful',
                                     'data': {
@@ -7513,45 +8242,51 @@ async def handler(websocket):
                                 }))
                             elif checkin_result["success"] and not checkin_result["valid"]:
                                 # License revoked
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': f'License check-in failed: {checkin_result.get("error", "Unknown error")}'
                                 }))
                             else:
                                 # Network error or server issue
-                                await websocket.send_str(json.dumps({
+                                await websocket.send_str(json_encode({
                                     'type': 'error',
                                     'message': f'License check-in failed: {checkin_result.get("error", "Unknown error")}'
                                 }))
                         except Exception as e:
-                            await websocket.send_str(json.dumps({
+                            await websocket.send_str(json_encode({
                                 'type': 'error',
                                 'message': f'License check-in error: {str(e)}'
                             }))
 
-                except json.JSONDecodeError:
-                    print("Invalid JSON received")
-                except Exception as e:
-                    print(f"Error processing message: {e}")
-                    traceback.print_exc()
+                except ValueError:
+                    # Covers json.JSONDecodeError and msgpack decode errors
+                    logger.warning("Invalid message payload received")
+                except Exception:
+                    # Traceback formatting only happens if the level is enabled
+                    logger.exception("Error processing message")
             elif msg.type == web.WSMsgType.ERROR:
-                print(f'WebSocket connection closed with exception {websocket.exception()}')
+                logger.error('WebSocket connection closed with exception %s', websocket.exception())
                 break
                 
     except Exception as e:
-        print(f"Error in handler: {e}")
+        logger.error("Error in handler: %s", e)
     finally:
-        # Unregister client
+        # Unregister client. A socket whose user has already re-authenticated
+        # elsewhere was superseded: the index points at the newer socket, and
+        # the presence/voice teardown below belongs to that live session.
+        superseded = bool(username) and username_to_ws.get(username) is not websocket
         if websocket in clients:
             del clients[websocket]
+        if username and not superseded:
+            del username_to_ws[username]
         
         # Clean up bot client tracking
         if websocket in bot_clients:
             bot_info_cleanup = bot_clients[websocket]
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Bot '{bot_info_cleanup.get('username', '?')}' disconnected")
+            logger.info("Bot '%s' disconnected", bot_info_cleanup.get('username', '?'))
             del bot_clients[websocket]
         
-        if username and authenticated:
+        if username and authenticated and not superseded:
             # Clean up voice state
             if username in voice_states:
                 state = voice_states[username]
@@ -7580,7 +8315,7 @@ async def handler(websocket):
                             })
                         
                         # Notify all server members
-                        await broadcast_to_server(server_id, json.dumps({
+                        await broadcast_to_server(server_id, json_encode({
                             'type': 'voice_state_update',
                             'server_id': server_id,
                             'channel_id': channel_id,
@@ -7590,7 +8325,7 @@ async def handler(websocket):
                         }))
                 elif direct_call_peer:
                     # User was in a direct call - notify peer
-                    await send_to_user(direct_call_peer, json.dumps({
+                    await send_to_user(direct_call_peer, json_encode({
                         'type': 'direct_call_ended',
                         'from': username,
                         'reason': 'disconnected'
@@ -7599,22 +8334,40 @@ async def handler(websocket):
                 del voice_states[username]
             
             # Notify others about user leaving
-            leave_message = json.dumps({
+            leave_message = json_encode({
                 'type': 'system',
                 'content': f'{username} left the chat',
                 'timestamp': datetime.now(timezone.utc).isoformat()
             })
             await broadcast(leave_message)
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] {username} left")
+            logger.info("%s left", username)
 
 
 async def websocket_handler(request):
     """Handle WebSocket upgrade requests."""
-    ws = web.WebSocketResponse(heartbeat=30.0)
+    protocols = (MSGPACK_SUBPROTOCOL,) if MSGPACK_AVAILABLE else ()
+    # compress=False: chat frames are small JSON, so per-message deflate
+    # costs more CPU (and per-connection window state) than the bytes saved
+    ws = web.WebSocketResponse(heartbeat=30.0, max_msg_size=WS_MAX_MSG_SIZE,
+                               compress=False, protocols=protocols)
     await ws.prepare(request)
     
-    # Use the existing handler logic
-    await handler(ws)
+    # Real client address for rate limiting. Only unwrap X-Forwarded-For
+    # when the TCP peer is a configured proxy — the port is reachable
+    # directly, and a spoofed header would bypass the per-IP limits.
+    peer_ip = request.remote
+    if peer_ip in TRUSTED_PROXY_IPS:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        peer_ip = forwarded.split(',')[0].strip() or peer_ip
+    
+    if ws.ws_protocol == MSGPACK_SUBPROTOCOL:
+        binary_sockets.add(ws)
+    
+    try:
+        # Use the existing handler logic
+        await handler(ws, peer_ip)
+    finally:
+        binary_sockets.discard(ws)
     
     return ws
 
@@ -7625,9 +8378,9 @@ async def cleanup_verification_codes_periodically():
         try:
             await asyncio.sleep(CLEANUP_INTERVAL_HOURLY)  # Run every hour
             db.cleanup_expired_verification_codes()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Cleaned up expired verification codes")
+            logger.info("Cleaned up expired verification codes")
         except Exception as e:
-            print(f"Error in periodic cleanup task: {e}")
+            logger.error("Error in periodic cleanup task: %s", e)
 
 
 async def cleanup_old_attachments_periodically():
@@ -7635,16 +8388,16 @@ async def cleanup_old_attachments_periodically():
     while True:
         try:
             await asyncio.sleep(CLEANUP_INTERVAL_DAILY)  # Run once per day
-            admin_settings = db.get_admin_settings()
+            admin_settings = get_cached_admin_settings()
             retention_days = admin_settings.get('attachment_retention_days', 0)
             
             # Only delete if retention policy is set (> 0 days)
             if retention_days > 0:
                 deleted_count = db.delete_old_attachments(retention_days)
                 if deleted_count > 0:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Cleaned up {deleted_count} old attachments (older than {retention_days} days)")
+                    logger.info("Cleaned up %s old attachments (older than %s days)", deleted_count, retention_days)
         except Exception as e:
-            print(f"Error in attachment cleanup task: {e}")
+            logger.error("Error in attachment cleanup task: %s", e)
 
 
 async def cleanup_reset_tokens_periodically():
@@ -7653,9 +8406,9 @@ async def cleanup_reset_tokens_periodically():
         try:
             await asyncio.sleep(3600)  # Run every hour
             db.cleanup_expired_reset_tokens()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Cleaned up expired reset tokens")
+            logger.info("Cleaned up expired reset tokens")
         except Exception as e:
-            print(f"Error in reset token cleanup task: {e}")
+            logger.error("Error in reset token cleanup task: %s", e)
 
 
 async def cleanup_old_messages_periodically():
@@ -7665,12 +8418,12 @@ async def cleanup_old_messages_periodically():
             await asyncio.sleep(CLEANUP_INTERVAL_DAILY)  # Run once per day
             
             # Purge old DM messages
-            admin_settings = db.get_admin_settings()
+            admin_settings = get_cached_admin_settings()
             dm_purge_days = admin_settings.get('dm_purge_schedule', 0)
             if dm_purge_days > 0:
                 deleted_count = db.purge_old_dm_messages(dm_purge_days)
                 if deleted_count > 0:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Purged {deleted_count} DM messages (older than {dm_purge_days} days)")
+                    logger.info("Purged %s DM messages (older than %s days)", deleted_count, dm_purge_days)
             
             # Purge old server messages
             servers_with_schedule = db.get_all_servers_with_purge_schedule()
@@ -7681,9 +8434,9 @@ async def cleanup_old_messages_periodically():
                 
                 deleted_count = db.purge_old_server_messages(server_id, purge_days, exempted_channels)
                 if deleted_count > 0:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Purged {deleted_count} messages from server {server_id} (older than {purge_days} days)")
+                    logger.info("Purged %s messages from server %s (older than %s days)", deleted_count, server_id, purge_days)
         except Exception as e:
-            print(f"Error in message purge task: {e}")
+            logger.error("Error in message purge task: %s", e)
 
 
 async def process_scheduled_messages():
@@ -7724,17 +8477,17 @@ async def process_scheduled_messages():
                     )
                     
                     # Broadcast to server
-                    await broadcast_to_server(server_id, json.dumps(msg_obj))
+                    await broadcast_to_server(server_id, json_encode(msg_obj))
                     
                     # Mark as sent
                     db.mark_scheduled_message_sent(msg['id'])
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Sent scheduled message {msg['id']} to {server_id}/{channel_id}")
+                    logger.info("Sent scheduled message %s to %s/%s", msg['id'], server_id, channel_id)
                     
                 except Exception as e:
-                    print(f"Error sending scheduled message {msg.get('id')}: {e}")
+                    logger.error("Error sending scheduled message %s: %s", msg.get('id'), e)
                     
         except Exception as e:
-            print(f"Error in scheduled message processor: {e}")
+            logger.error("Error in scheduled message processor: %s", e)
 
 
 async def load_license():
@@ -7765,7 +8518,7 @@ async def load_license():
 
     # 2. .license file next to this script
     if not license_key:
-        license_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".license")
+        license_file = os.path.join(SERVER_DIR, ".license")
         try:
             with open(license_file, "r", encoding="utf-8") as f:
                 file_key = f.read().strip()
@@ -7805,6 +8558,7 @@ async def load_license():
                 'license_tier': 'community',
                 'license_expires_at': None
             })
+            invalidate_admin_settings_cache()
         except Exception as e:
             print(f"Warning: Failed to update admin settings: {e}")
         return
@@ -7815,7 +8569,7 @@ async def load_license():
 
     # Step 2: Check if we need to perform server check-in
     try:
-        settings = db.get_admin_settings()
+        settings = get_cached_admin_settings()
         last_check_at = settings.get('last_license_check_at')
         
         # Ensure last_check_at is timezone-aware
@@ -7829,6 +8583,7 @@ async def load_license():
         if not instance_fingerprint:
             instance_fingerprint = generate_instance_fingerprint()
             db.update_admin_settings({'instance_fingerprint': instance_fingerprint})
+            invalidate_admin_settings_cache()
             print(f"Generated instance fingerprint")
 
         # Check if we need to contact the server
@@ -7848,6 +8603,7 @@ async def load_license():
                     db.update_admin_settings({
                         'last_license_check_at': datetime.now(timezone.utc)
                     })
+                    invalidate_admin_settings_cache()
                     print("✓ License server check-in successful - license is valid")
                 else:
                     # License was revoked or invalid
@@ -7863,6 +8619,7 @@ async def load_license():
                         'license_customer_name': '',
                         'license_customer_email': ''
                     })
+                    invalidate_admin_settings_cache()
 
                     # Clear from validator
                     license_validator.clear()
@@ -7892,6 +8649,7 @@ async def load_license():
                         'license_tier': 'community',
                         'license_expires_at': None
                     })
+                    invalidate_admin_settings_cache()
                     license_validator.clear()
         else:
             days_since_check = (
@@ -7916,7 +8674,7 @@ async def main():
     print("=" * 50)
     
     # Generate or load self-signed SSL certificate
-    cert_dir = os.path.join(os.path.dirname(__file__), 'certs')
+    cert_dir = os.path.join(SERVER_DIR, 'certs')
     cert_path, key_path = generate_self_signed_cert(cert_dir=cert_dir)
     ssl_context = create_ssl_context(cert_path, key_path)
     
@@ -7934,7 +8692,7 @@ async def main():
     
     # Initialize database counters from existing data
     init_counters_from_db()
-    print(f"Initialized counters from database (servers: {server_counter}, channels: {channel_counter}, dms: {dm_counter}, roles: {role_counter})")
+    print("Seeded ID counters from existing database records")
 
     # Load and validate license key
     await load_license()
@@ -8007,10 +8765,20 @@ async def main():
     # ─────────────────────────────────────────────────────────────────────────
     setup_api_routes(app, db, verify_jwt_token, broadcast_to_server, send_to_user, get_or_create_dm, get_avatar_data, jwt_generate_func=generate_jwt_token)
     
-    # Run the server with SSL
+    # Run the server with SSL on a pre-configured listening socket:
+    # SO_REUSEPORT (where available) lets additional server processes share
+    # the port for horizontal scaling, TCP_NODELAY keeps small chat frames
+    # from being delayed by Nagle, and a deep backlog absorbs bursts.
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 8765, ssl_context=ssl_context)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(('0.0.0.0', 8765))
+    sock.listen(4096)
+    site = web.SockSite(runner, sock, ssl_context=ssl_context)
     await site.start()
     
     # Start periodic cleanup tasks
@@ -8032,4 +8800,8 @@ async def main():
 
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        # libuv-based event loop: substantially faster epoll handling for
+        # large numbers of WebSocket connections; drop-in when installed
+        uvloop.install()
     asyncio.run(main())